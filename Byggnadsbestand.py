@@ -0,0 +1,115 @@
+import hashlib
+
+import streamlit as st
+import numpy as np
+
+from bestand import byggschema, las_projekt_csv, simulera_bestand
+from export import exportval, nedladdningsknapp, serier
+from matning import matare, visa_panel
+from motor import bild
+from reglage import delat_reglage
+from rendering import hamta_diagram
+
+st.set_page_config(page_title="Klimatbalans för byggnadsbestånd", layout="wide")
+matare.starta_omkorning("Byggnadsbestånd")
+
+st.title("🏘️ Klimatbalans för ett bestånd av trähus")
+st.markdown(
+    "Ladda upp en projektlista för en kommun eller byggherre och se den samlade "
+    "CO₂-lagringen i husen och skogen över tid."
+)
+
+st.sidebar.header("Justera modellparametrar")
+
+virke_per_m2 = delat_reglage(
+    st.sidebar.slider, "Mängd stomvirke (m³/m² BTA)", "virke_per_m2", 0.35, 0.1, 1.0
+)
+bonitet = delat_reglage(
+    st.sidebar.slider, "Bonitet (m³ virke/ha/år)", "bonitet", 8.0, 4.0, 10.0, step=0.1
+)
+rotation = delat_reglage(st.sidebar.slider, "Skogens rotationsperiod (år)", "rotation", 80, 50, 150)
+hus_livslangd = delat_reglage(st.sidebar.slider, "Husets livslängd (år)", "hus_livslangd", 100, 20, 200)
+max_years = st.sidebar.slider("Total tidsperiod (år)", 50, 300, 200)
+
+klimatpåverkan_per_m2 = delat_reglage(
+    st.sidebar.slider, "Husets klimatpåverkan (ton CO₂/m² BTA)", "klimatpåverkan_per_m2",
+    0.250, 0.150, 0.500,
+)
+
+uppladdad = st.file_uploader(
+    "Projektlista (CSV med kolumnerna ar, BTA, virkes_hantering, bygg_igen)", type="csv"
+)
+if uppladdad is None:
+    st.caption("Ingen fil uppladdad – exemplet visar 1 000 m² BTA per år under 30 år.")
+    projekt = {"ar": np.arange(2025, 2055), "BTA": np.full(30, 1000.0)}
+
+try:
+    if uppladdad is not None:
+        projekt = las_projekt_csv(uppladdad)
+    schema, startar = byggschema(
+        projekt["ar"], projekt["BTA"],
+        projekt.get("virkes_hantering", "ateranvandning"), projekt.get("bygg_igen", True),
+        max_years=max_years,
+    )
+except (KeyError, ValueError) as fel:
+    st.error(f"Projektlistan kunde inte användas: {fel}")
+    st.stop()
+with matare.steg("bestand"):
+    res = simulera_bestand(
+        schema, virke_per_m2, bonitet, rotation, hus_livslangd, klimatpåverkan_per_m2, startar
+    )
+
+st.info(
+    f"**{len(projekt['ar'])} projekt** med totalt **{res.byggd_bta[-1]:,.0f} m² BTA** "
+    f"färdigställda {startar}–{startar + max_years}."
+)
+
+
+def forbered_lagring(ax):
+    ax.set_xlabel("År")
+    ax.set_ylabel("Ton CO₂")
+    ax.set_title("CO₂-lagring i beståndets hus och skog")
+    ax.grid(alpha=0.3)
+
+
+def rita_lagring():
+    lagring = hamta_diagram(st.session_state, "bestand_lagring", (8, 4), forbered_lagring)
+    lagring.linje("hus", res.years, res.co2_i_hus, label="Inbyggd CO₂ i trähus (ton)", lw=2)
+    lagring.linje("skog", res.years, res.co2_i_skog, label="Ackumulerad CO₂ i skog (ton)", lw=2)
+    return lagring.png(legend={})
+
+
+def forbered_neutralitet(ax):
+    ax.set_xlabel("År")
+    ax.set_ylabel("Klimatneutralitetsgrad (%)")
+    ax.set_title("Beståndets klimatneutralitet (skogsupptag/klimatpåverkan)")
+    ax.grid(alpha=0.3)
+
+
+def rita_neutralitet():
+    neutralitet = hamta_diagram(st.session_state, "bestand_neutralitet", (8, 4), forbered_neutralitet)
+    neutralitet.linje("klimatneutralitet", res.years, res.klimatneutralitet,
+                      label="Klimatneutralitetsgrad (%)", lw=2, color="purple")
+    neutralitet.hlinje("full_balans", 100, color='gray', linestyle='--', label="100% klimatbalans")
+    neutralitet.ax.set_ylim(0, 150)
+    return neutralitet.png(legend={})
+
+
+# Bilderna cachas per parametrar och byggschema (schemat identifieras med en hash)
+nyckel = (virke_per_m2, bonitet, rotation, hus_livslangd, max_years, klimatpåverkan_per_m2,
+          startar, hashlib.sha1(schema.tobytes()).hexdigest())
+
+st.subheader("CO₂-lagring i beståndet över tid")
+st.image(bild("bestand_lagring", nyckel, rita_lagring), width="stretch")
+st.subheader("Klimatneutralitetsgrad för beståndet över tid")
+st.image(bild("bestand_neutralitet", nyckel, rita_neutralitet), width="stretch")
+
+with st.expander("📥 Exportera data"):
+    ex_format, ex_kompakt = exportval(st, "export")
+    nedladdningsknapp(
+        st, "Ladda ned beståndets serier", "bestand",
+        lambda: serier(ar=res.years, **{namn: getattr(res, namn) for namn in res._fields[1:]}),
+        ex_format, ex_kompakt, "export_bestand",
+    )
+
+visa_panel(matare.avsluta_omkorning())
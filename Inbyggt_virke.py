@@ -1,7 +1,13 @@
 
 import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
+
+from export import exportval, nedladdningsknapp, serier
+from matning import matare, visa_panel
+from produktpool import kolbalans, kolbalans_nedbrytning
+from motor import bild
+from rendering import hamta_diagram
+
+matare.starta_omkorning("Inbyggt virke")
 
 st.title('Dynamisk kolbalans för långlivat virke')
 
@@ -12,38 +18,77 @@ kolinlagring_per_ar = st.slider('Kolinlagring per år i skogen (ton)', 0.1, 5.0,
 andel_kol_i_virke = st.slider('Andel kol i virket', 0.3, 0.6, 0.5, step=0.05)
 tidsperiod = st.slider('Total analysperiod (år)', 50, 200, 150, step=10)
 
+nedbrytning = st.selectbox(
+    'Modell för kolet i produkterna',
+    ['Hela uttaget ligger kvar under produktens livslängd', 'Första ordningens nedbrytning (IPCC)'],
+    help='Båda modellerna lagrar hela det avverkade kolet i produkterna, så kurvorna är jämförbara.',
+)
+if nedbrytning.startswith('Första'):
+    # Andelarna normeras så att hela uttaget fördelas på kategorierna
+    andelar = {
+        'sagade_travaror': st.slider('Andel sågade trävaror', 0.0, 1.0, 0.6, step=0.05),
+        'skivor': st.slider('Andel skivor', 0.0, 1.0, 0.3, step=0.05),
+        'papper': st.slider('Andel papper', 0.0, 1.0, 0.1, step=0.05),
+    }
+    summa_andelar = sum(andelar.values()) or 1.0
+    andelar = {k: v / summa_andelar for k, v in andelar.items()}
+    halveringstider = {
+        'sagade_travaror': st.slider('Halveringstid sågade trävaror (år)', 5, 100, 35),
+        'skivor': st.slider('Halveringstid skivor (år)', 5, 100, 25),
+        'papper': st.slider('Halveringstid papper (år)', 1, 10, 2),
+    }
+
 # Dynamisk kolbalansmodell
-def kolbalans(rotations_period, produkt_livslangd, kolinlagring_per_ar, andel_kol_i_virke, tidsperiod):
-    ar = np.arange(tidsperiod)
-    kol_i_skog = np.zeros(tidsperiod)
-    kol_i_produkt = np.zeros(tidsperiod)
+with matare.steg("kolbalans"):
+    if nedbrytning.startswith('Första'):
+        ar, kol_i_skog, pooler, netto_kolbalans = kolbalans_nedbrytning(
+            rotations_period, kolinlagring_per_ar, andel_kol_i_virke, tidsperiod, andelar, halveringstider)
+        kol_i_produkt = sum(pooler.values())
+    else:
+        pooler = {}
+        ar, kol_i_skog, kol_i_produkt, netto_kolbalans = kolbalans(
+            rotations_period, produkt_livslangd, kolinlagring_per_ar, andel_kol_i_virke, tidsperiod)
 
-    for i in ar:
-        cykel_ar = i % rotations_period
-        kol_i_skog[i] = cykel_ar * kolinlagring_per_ar
+# Skapa grafen
+def forbered_graf(ax):
+    ax.set_xlabel('År')
+    ax.set_ylabel('Kol (ton)')
+    ax.set_title('Dynamisk kolbalans över tid')
+    ax.grid(True)
 
-    for i in ar:
-        if i % rotations_period == 0 and i != 0:
-            kol_uttaget = rotations_period * kolinlagring_per_ar * andel_kol_i_virke
-            slut_ar = min(i + produkt_livslangd, tidsperiod)
-            kol_i_produkt[i:slut_ar] += kol_uttaget / produkt_livslangd
 
-    netto_kolbalans = kol_i_skog + kol_i_produkt
-    return ar, kol_i_skog, kol_i_produkt, netto_kolbalans
+def rita_graf():
+    graf = hamta_diagram(st.session_state, "kolbalans", (10, 5), forbered_graf)
+    graf.linje("skog", ar, kol_i_skog, label='Kol i skog (ton)')
+    graf.linje("produkt", ar, kol_i_produkt, label='Kol i produkt (ton)')
+    graf.linje("netto", ar, netto_kolbalans, label='Netto kolbalans (ton)', linestyle='--', linewidth=2)
+    if pooler:
+        graf.ta_bort("livslangd")
+    else:
+        graf.vlinje("livslangd", produkt_livslangd, color='red', linestyle=':', label='Slut på produktlivslängd')
+    pool_namn = {'sagade_travaror': 'sågade trävaror', 'skivor': 'skivor', 'papper': 'papper'}
+    for kategori, namn in pool_namn.items():
+        if kategori in pooler:
+            graf.linje(kategori, ar, pooler[kategori], label=f'Kol i {namn} (ton)', linewidth=1, alpha=0.7)
+        else:
+            graf.ta_bort(kategori)
+    return graf.png(legend={})
 
-ar, kol_i_skog, kol_i_produkt, netto_kolbalans = kolbalans(
-    rotations_period, produkt_livslangd, kolinlagring_per_ar, andel_kol_i_virke, tidsperiod)
 
-# Skapa grafen
-fig, ax = plt.subplots(figsize=(10, 5))
-ax.plot(ar, kol_i_skog, label='Kol i skog (ton)')
-ax.plot(ar, kol_i_produkt, label='Kol i produkt (ton)')
-ax.plot(ar, netto_kolbalans, label='Netto kolbalans (ton)', linestyle='--', linewidth=2)
-ax.axvline(x=produkt_livslangd, color='red', linestyle=':', label='Slut på produktlivslängd')
-ax.set_xlabel('År')
-ax.set_ylabel('Kol (ton)')
-ax.set_title('Dynamisk kolbalans över tid')
-ax.legend()
-ax.grid(True)
-
-st.pyplot(fig)
+# Bilden cachas per parameterkombination, så ett återbesök på sidan ritar inte om
+nyckel = (rotations_period, produkt_livslangd, kolinlagring_per_ar, andel_kol_i_virke, tidsperiod)
+if pooler:
+    nyckel += tuple(andelar.values()) + tuple(halveringstider.values())
+st.image(bild("kolbalans", nyckel, rita_graf), width="stretch")
+
+with st.expander("📥 Exportera data"):
+    ex_format, ex_kompakt = exportval(st, "export")
+    nedladdningsknapp(
+        st, "Ladda ned kolbalansen", "kolbalans",
+        lambda: serier(ar=ar, kol_i_skog=kol_i_skog, kol_i_produkt=kol_i_produkt,
+                       netto_kolbalans=netto_kolbalans,
+                       **{f"kol_i_{kategori}": pool for kategori, pool in pooler.items()}),
+        ex_format, ex_kompakt, "export_kolbalans",
+    )
+
+visa_panel(matare.avsluta_omkorning())
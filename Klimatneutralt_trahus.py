@@ -1,8 +1,13 @@
 import streamlit as st
 import numpy as np
-import matplotlib.pyplot as plt
+
+from matning import matare, visa_panel
+from motor import bild, simulering
+from reglage import modellreglage
+from rendering import hamta_diagram
 
 st.set_page_config(page_title="Policyjusterad klimatneutralitet", layout="wide")
+matare.starta_omkorning("Policyjusterad klimatneutralitet")
 
 st.title("🌲 Policyjusterad klimatneutralitet för trähus")
 st.markdown(
@@ -11,95 +16,21 @@ st.markdown(
 
 st.sidebar.header("Justerbara modellparametrar")
 
-BTA = st.sidebar.slider("Bostadsyta (BTA), m²", 100, 10000, 150)
-virke_per_m2 = st.sidebar.slider("Mängd stomvirke (m³/m² BTA)", 0.1, 1.0, 0.35)
-bonitet = st.sidebar.slider("Bonitet (m³ virke/ha/år)", 4.0, 10.0, 8.0, 0.1)
-LCA_period = st.sidebar.slider("LCA-period (år, analys)", 30, 100, 50)
-rotation = st.sidebar.slider("Skogens rotationsperiod (år)", 50, 150, 80)
-hus_livslangd = st.sidebar.slider("Husets livslängd (år)", 20, 200, 100)
-max_years = st.sidebar.slider("Total tidsperiod (år)", 50, 200, 200)
-
-klimatpåverkan_per_m2 = st.sidebar.slider(
-    "Husets klimatpåverkan (ton CO₂/m² BTA)", 0.150, 0.500, 0.250
-)
-
-alternativ = {
-    "Återanvänds till nytt hus": "ateranvandning",
-    "Energiåtervinns med bio-CCS (koldioxidlagring)": "bioccs",
-    "Bränns konventionellt (släpper ut all CO₂)": "konventionell"
-}
-valt_svar = st.sidebar.selectbox(
-    "Vad händer med virket efter husets rivning?",
-    options=list(alternativ.keys()),
-    index=0
-)
-virkes_hantering = alternativ[valt_svar]
-bygg_igen = st.sidebar.checkbox("Bygg nytt hus efter livslängd?", value=True)
-
-years = np.arange(max_years+1)
-
-kg_torrsubstans_per_m3 = 750
-kolandel = 0.5
-co2_per_kg_kol = 3.67
-
-virkesvolym_total = BTA * virke_per_m2
-kol_total = virkesvolym_total * kg_torrsubstans_per_m3 * kolandel
-co2_total = kol_total * co2_per_kg_kol / 1000
-co2_per_m3 = kg_torrsubstans_per_m3 * kolandel * co2_per_kg_kol / 1000
+parametrar = modellreglage()
+LCA_period, rotation = parametrar["LCA_period"], parametrar["rotation"]
 
-virke_per_ha_per_rotation = bonitet * rotation
-skogsareal_ha = virkesvolym_total / virke_per_ha_per_rotation
-klimatpåverkan_total = BTA * klimatpåverkan_per_m2
+# --- Simulering av skog och hus ---
+# Resultat och figur cachas per parameterkombination och delas mellan sessioner
+nyckel, res = simulering(**parametrar)
+years = res.years
+skogsareal_ha = res.skogsareal_ha
 
 # --- Policy-faktor ---
 policyfaktor = min(1, LCA_period / rotation)  # Ex: 50/100 år = 0.5
 max_klimatbalansering = np.full_like(years, policyfaktor * 100)
 
-# --- Simulering av skog och hus ---
-co2_i_skog = np.zeros_like(years, dtype=float)
-co2_i_hus = np.zeros_like(years, dtype=float)
-
-for t in years:
-    tid_i_rotation = t % rotation
-    co2_i_skog[t] = skogsareal_ha * bonitet * co2_per_m3 * tid_i_rotation
-
-    if bygg_igen:
-        antal_hus = t // hus_livslangd + 1
-    else:
-        antal_hus = 1 if t < hus_livslangd else 0
-
-    if virkes_hantering == "konventionell":
-        if bygg_igen:
-            tid_i_hus = t % hus_livslangd
-            if tid_i_hus < hus_livslangd:
-                co2_i_hus[t] = co2_total
-            else:
-                co2_i_hus[t] = 0
-        else:
-            if t < hus_livslangd:
-                co2_i_hus[t] = co2_total
-            else:
-                co2_i_hus[t] = 0
-
-    elif virkes_hantering in ("ateranvandning", "bioccs"):
-        if bygg_igen:
-            co2_i_hus[t] = antal_hus * co2_total  # Trappa
-        else:
-            if t < hus_livslangd:
-                co2_i_hus[t] = co2_total  # Block
-            else:
-                co2_i_hus[t] = co2_total  # Block fortsätter
-
-    else:
-        co2_i_hus[t] = 0
-
 # --- Klimatneutralitetsgrad (utan policy) ---
-klimatneutralitet = np.zeros_like(years, dtype=float)
-for t in years:
-    if klimatpåverkan_total > 0:
-        klimatneutralitet[t] = 100 * co2_i_skog[t] / klimatpåverkan_total
-    else:
-        klimatneutralitet[t] = np.nan
+klimatneutralitet = res.klimatneutralitet
 
 # --- Policyjusterad klimatneutralitet ---
 klimatneutralitet_policy = klimatneutralitet * policyfaktor
@@ -109,21 +40,26 @@ st.info(
     f"**{skogsareal_ha:.4f} ha** (givet vald bonitet och rotationsperiod)."
 )
 
-fig, ax = plt.subplots(figsize=(10, 5))
-ax.plot(years, klimatneutralitet_policy, lw=3, color="orange", label="Policyjusterad klimatneutralitet (%)")
-ax.plot(years, klimatneutralitet, lw=1.5, color="blue", alpha=0.6, linestyle="--", label="Teoretisk klimatneutralitet (%)")
-ax.axhline(100, color='gray', linestyle='--', label="100% klimatbalans")
-ax.axvline(LCA_period, color='red', linestyle=':', label='LCA-period slutar')
-ax.axvline(rotation, color='green', linestyle='--', label='En rotationsperiod')
-ax.set_xlabel("Tid (år)")
-ax.set_ylabel("Klimatneutralitetsgrad (%)")
-ax.set_ylim(0, 150)
-ax.set_title("Policyjusterad klimatneutralitet över tid")
-ax.legend()
-ax.grid(alpha=0.3)
+def forbered_policyfigur(ax):
+    ax.set_xlabel("Tid (år)")
+    ax.set_ylabel("Klimatneutralitetsgrad (%)")
+    ax.set_title("Policyjusterad klimatneutralitet över tid")
+    ax.grid(alpha=0.3)
+
+
+def rita_policyfigur():
+    fig = hamta_diagram(st.session_state, "policyfigur", (10, 5), forbered_policyfigur)
+    fig.linje("policy", years, klimatneutralitet_policy, lw=3, color="orange", label="Policyjusterad klimatneutralitet (%)")
+    fig.linje("teoretisk", years, klimatneutralitet, lw=1.5, color="blue", alpha=0.6, linestyle="--", label="Teoretisk klimatneutralitet (%)")
+    fig.hlinje("full_balans", 100, color='gray', linestyle='--', label="100% klimatbalans")
+    fig.vlinje("lca", LCA_period, color='red', linestyle=':', label='LCA-period slutar')
+    fig.vlinje("rotation", rotation, color='green', linestyle='--', label='En rotationsperiod')
+    fig.ax.set_ylim(0, 150)
+    return fig.png(legend={})
+
 
 st.subheader("Policyjusterad klimatneutralitet över tid")
-st.pyplot(fig)
+st.image(bild("policyfigur", nyckel, rita_policyfigur), width="stretch")
 st.markdown(
     f"""Den orange kurvan visar **klimatneutralitetsgraden** multiplicerat med policy-faktorn (LCA-period/rotationsperiod).  
     Den blå streckade kurvan visar klimatneutraliteten om man ignorerar policybegränsning.
@@ -151,3 +87,5 @@ st.markdown(
     "[GitHub repository](https://github.com/Mulmen/klimatbalanserat_trahus).</small>",
     unsafe_allow_html=True
 )
+
+visa_panel(matare.avsluta_omkorning())
@@ -0,0 +1,21 @@
+"""Samlad flersidig app för alla vyer av trähusmodellen.
+
+    streamlit run app.py
+
+Sidorna körs i samma process och delar modellmotorn (motor.py), resultatcachen
+och sessionens tillstånd, så reglagen behåller sina värden mellan sidorna och
+en simulering som redan räknats på en sida återanvänds på en annan. Varje sida
+laddas först när den visas. Sidfilerna går fortfarande att köra var för sig.
+"""
+
+import streamlit as st
+
+st.set_page_config(page_title="Klimatbalanserat trähus", layout="wide")
+
+sidor = st.navigation([
+    st.Page("klimatbalanserat_trahus.py", title="Dynamisk modell", icon="🌲", default=True),
+    st.Page("Klimatneutralt_trahus.py", title="Policyjusterad klimatneutralitet", icon="📜"),
+    st.Page("Inbyggt_virke.py", title="Inbyggt virke", icon="🪵"),
+    st.Page("Byggnadsbestand.py", title="Byggnadsbestånd", icon="🏘️"),
+])
+sidor.run()
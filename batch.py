@@ -0,0 +1,276 @@
+"""Kör klimatbalansmodellen för scenariofiler utan Streamlit.
+
+    python batch.py scenarier.csv resultat.csv
+    python batch.py scenarier.jsonl resultat.parquet --serier --arbetare 8
+
+Indata är CSV eller JSONL med samma parametrar som reglagen i
+klimatbalanserat_trahus.py (BTA, virke_per_m2, bonitet, LCA_period, rotation,
+hus_livslangd, max_years, klimatpåverkan_per_m2, virkes_hantering, bygg_igen).
+Saknade kolumner får reglagens standardvärden och en eventuell kolumn id förs
+vidare till resultatet. ar_till_100_procent är -1 om 100 % klimatneutralitet
+inte nås inom scenariots tidsperiod.
+
+Raderna läses som en generator, delas i block och beräknas vektoriserat i en
+processpool med ett begränsat antal block i arbete åt gången. Resultatet skrivs
+block för block, så minnesåtgången är konstant även för mycket stora filer.
+"""
+
+import argparse
+import collections
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from modell import STANDARDVARDEN, maxandel
+from svep import berakna_block
+
+BLOCKSTORLEK = 10000
+
+# Alternativa kolumnnamn för filer som inte kan innehålla å
+ALIAS = {"klimatpaverkan_per_m2": "klimatpåverkan_per_m2"}
+
+SANT = ("1", "true", "ja", "sant")
+HELTAL = ("LCA_period", "rotation", "hus_livslangd", "max_years")
+FLYTTAL = ("BTA", "virke_per_m2", "bonitet", "klimatpåverkan_per_m2")
+RESULTATKOLUMNER = (
+    "id",
+    "skogsareal_ha",
+    "klimatbalans_maxandel",
+    "klimatneutralitet_vid_LCA",
+    "ar_till_100_procent",
+)
+
+
+def las_block(sokvag, storlek=BLOCKSTORLEK):
+    """Generator som ger block med råa rader ur en CSV- eller JSONL-fil.
+
+    Raderna tolkas först i arbetsprocesserna (tolka_block), så att huvudprocessen
+    bara behöver läsa filen. Varje block är (format, rubrik, rader, första radnummer).
+    """
+    with open(sokvag, newline="", encoding="utf-8") as f:
+        if sokvag.endswith((".jsonl", ".ndjson")):
+            format_, rubrik = "jsonl", None
+        else:
+            format_, rubrik = "csv", next(csv.reader([f.readline()]))
+        nummer = 0
+        for rader in i_block((rad for rad in f if rad.strip()), storlek):
+            yield format_, rubrik, rader, nummer
+            nummer += len(rader)
+
+
+def tolka_block(format_, rubrik, rader, forsta=0):
+    """Tolkar råa rader till en dict med en array per parameter.
+
+    Saknade eller tomma värden får reglagens standardvärden. En CSV-rad med
+    fler eller färre värden än rubriken ger ValueError med radnumret.
+    """
+    if format_ != "csv":
+        return tolka_poster([json.loads(rad) for rad in rader], forsta)
+    falt = list(csv.reader(rader))
+    for i, rad in enumerate(falt):
+        if len(rad) != len(rubrik):
+            raise ValueError(
+                f"Datarad {forsta + i + 1} har {len(rad)} värden men rubriken har "
+                f"{len(rubrik)} kolumner"
+            )
+    return _tolka_kolumner(dict(zip(rubrik, zip(*falt))), len(falt), forsta)
+
+
+def tolka_poster(poster, forsta=0):
+    """Som tolka_block, men för redan avkodade JSON-objekt (en dict per scenario)."""
+    nycklar = set().union(*poster)
+    return _tolka_kolumner({k: [post.get(k) for post in poster] for k in nycklar}, len(poster), forsta)
+
+
+def _tolka_kolumner(kolumner, antal, forsta):
+    kolumner = {ALIAS.get(k, k): v for k, v in kolumner.items()}
+
+    p = {"id": np.array(kolumner.get("id") or np.arange(forsta, forsta + antal)).astype(str)}
+    for namn, standard in STANDARDVARDEN.items():
+        if namn not in kolumner:
+            p[namn] = np.full(antal, standard)
+            continue
+        varden = np.array(
+            [standard if v in (None, "") else v for v in kolumner[namn]], dtype=object
+        )
+        if namn in HELTAL:
+            varden = varden.astype(float).astype(np.int64)
+        elif namn in FLYTTAL:
+            varden = varden.astype(float)
+        elif namn == "bygg_igen":
+            varden = np.array(
+                [v if isinstance(v, bool) else str(v).strip().lower() in SANT for v in varden]
+            )
+        else:
+            varden = varden.astype(str)
+        p[namn] = varden
+    return p
+
+
+def i_block(rader, storlek):
+    block = []
+    for rad in rader:
+        block.append(rad)
+        if len(block) == storlek:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def berakna_scenarier(p, med_serier=False):
+    """Beräknar nyckeltalen för ett block scenarier från tolka_block() och returnerar kolumner."""
+    # Serierna räknas till den längsta horisonten i blocket; varje rad använder
+    # sedan bara sin egen del, eftersom början av serien inte beror på horisonten
+    horisont = int(max(p["max_years"].max(), p["LCA_period"].max()))
+    years = np.arange(horisont + 1)
+    res = berakna_block({n: a[:, None] for n, a in p.items()}, years, ("klimatneutralitet",))
+    klimatneutralitet = res["klimatneutralitet"]
+
+    rader = np.arange(len(p["id"]))
+    inom_horisont = years <= p["max_years"][:, None]
+    balans = (klimatneutralitet >= 100) & inom_horisont
+    ar_till_100 = np.where(balans.any(axis=1), balans.argmax(axis=1), -1)
+
+    kolumner = {
+        "id": p["id"],
+        "skogsareal_ha": res["skogsareal_ha"],
+        "klimatbalans_maxandel": maxandel(p["LCA_period"], p["rotation"]),
+        "klimatneutralitet_vid_LCA": klimatneutralitet[rader, p["LCA_period"]],
+        "ar_till_100_procent": ar_till_100,
+    }
+    if med_serier:
+        kolumner["klimatneutralitet"] = [
+            klimatneutralitet[i, : p["max_years"][i] + 1] for i in rader
+        ]
+    return kolumner
+
+
+def formatera_csv(kolumner):
+    """Formaterar resultatkolumner som CSV-text utan rubrikrad."""
+    if "klimatneutralitet" in kolumner:
+        kolumner = {
+            **kolumner,
+            "klimatneutralitet": [
+                " ".join(f"{v:.6g}" for v in serie) for serie in kolumner["klimatneutralitet"]
+            ],
+        }
+    buf = io.StringIO()
+    csv.writer(buf).writerows(zip(*kolumner.values()))
+    return buf.getvalue()
+
+
+def _kor_block(uppgift):
+    # Körs i arbetsprocessen: tolkning, beräkning och CSV-formatering
+    format_, rubrik, rader, forsta, med_serier, som_csv = uppgift
+    kolumner = berakna_scenarier(tolka_block(format_, rubrik, rader, forsta), med_serier)
+    return len(rader), formatera_csv(kolumner) if som_csv else kolumner
+
+
+def ordnad_pool_map(funktion, block, arbetare, i_arbete=None):
+    """Som map() över en processpool, men med högst i_arbete block åt gången.
+
+    Executor.map() läser hela indata direkt; här fylls kön på allteftersom
+    block blir klara, så att minnet hålls konstant. Ordningen bevaras.
+    """
+    if arbetare <= 1:
+        yield from map(funktion, block)
+        return
+    i_arbete = i_arbete or 2 * arbetare
+    with ProcessPoolExecutor(max_workers=arbetare) as pool:
+        ko = collections.deque()
+        for b in block:
+            ko.append(pool.submit(funktion, b))
+            if len(ko) >= i_arbete:
+                yield ko.popleft().result()
+        while ko:
+            yield ko.popleft().result()
+
+
+class CSVSkrivare:
+    def __init__(self, sokvag, med_serier):
+        self._fil = open(sokvag, "w", newline="", encoding="utf-8")
+        csv.writer(self._fil).writerow(RESULTATKOLUMNER + (("klimatneutralitet",) if med_serier else ()))
+
+    def skriv(self, text):
+        self._fil.write(text)
+
+    def stang(self):
+        self._fil.close()
+
+
+class ParquetSkrivare:
+    def __init__(self, sokvag, med_serier):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as fel:
+            raise SystemExit("Parquet kräver pyarrow: pip install pyarrow") from fel
+        self._pa = pa
+        falt = [
+            pa.field("id", pa.string()),
+            pa.field("skogsareal_ha", pa.float64()),
+            pa.field("klimatbalans_maxandel", pa.float64()),
+            pa.field("klimatneutralitet_vid_LCA", pa.float64()),
+            pa.field("ar_till_100_procent", pa.int64()),
+        ]
+        if med_serier:
+            falt.append(pa.field("klimatneutralitet", pa.list_(pa.float64())))
+        self._schema = pa.schema(falt)
+        self._skrivare = pq.ParquetWriter(sokvag, self._schema)
+
+    def skriv(self, kolumner):
+        self._skrivare.write_batch(
+            self._pa.record_batch([kolumner[f.name] for f in self._schema], schema=self._schema)
+        )
+
+    def stang(self):
+        self._skrivare.close()
+
+
+def kor(indata, utdata, med_serier=False, arbetare=1, blockstorlek=BLOCKSTORLEK, framsteg=sys.stderr):
+    """Kör hela pipelinen och returnerar antalet scenarier."""
+    som_csv = not utdata.endswith(".parquet")
+    skrivare = (CSVSkrivare if som_csv else ParquetSkrivare)(utdata, med_serier)
+    antal = 0
+    start = senast = time.perf_counter()
+    try:
+        uppgifter = (b + (med_serier, som_csv) for b in las_block(indata, blockstorlek))
+        for antal_i_block, resultat in ordnad_pool_map(_kor_block, uppgifter, arbetare):
+            skrivare.skriv(resultat)
+            antal += antal_i_block
+            nu = time.perf_counter()
+            if framsteg and nu - senast >= 1.0:
+                print(f"\r{antal:>12,} scenarier  {antal / (nu - start):>10,.0f} scenarier/s",
+                      end="", file=framsteg, flush=True)
+                senast = nu
+    finally:
+        skrivare.stang()
+    if framsteg:
+        tid = time.perf_counter() - start
+        print(f"\r{antal:>12,} scenarier  {antal / max(tid, 1e-9):>10,.0f} scenarier/s  "
+              f"({tid:.1f} s)", file=framsteg, flush=True)
+    return antal
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kör klimatbalansmodellen för en scenariofil.")
+    parser.add_argument("indata", help="scenarier som CSV eller JSONL")
+    parser.add_argument("utdata", help="resultatfil, .csv eller .parquet")
+    parser.add_argument("--serier", action="store_true", help="ta med hela klimatneutralitetsserien")
+    parser.add_argument("--arbetare", type=int, default=os.cpu_count(), help="antal processer")
+    parser.add_argument("--blockstorlek", type=int, default=BLOCKSTORLEK)
+    parser.add_argument("--tyst", action="store_true", help="visa inte framsteg")
+    args = parser.parse_args(argv)
+    kor(args.indata, args.utdata, args.serier, args.arbetare, args.blockstorlek,
+        framsteg=None if args.tyst else sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""Benchmarks för modellkärnorna: ursprungliga loopar mot vektoriserade vägar.
+
+    python benchmarks/bench.py            # hela sviten
+    python benchmarks/bench.py --snabb    # utan de största storlekarna
+    python benchmarks/bench.py --utan-app # hoppa över omkörningen av Streamlit-appen
+
+Varje rad visar bästa tiden av flera upprepningar. Referensloopen (referens.py)
+körs bara upp till --max-loop år, eftersom den annars dominerar körtiden.
+Kör golden.py först för att kontrollera att de vektoriserade vägarna ger samma
+resultat som loopen.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+KATALOG = os.path.dirname(os.path.abspath(__file__))
+ROT = os.path.dirname(KATALOG)
+sys.path.insert(0, ROT)
+sys.path.insert(0, KATALOG)
+
+from dynamisk_lca import agwp, dynamisk_lca, impulssvar  # noqa: E402
+from export import SKRIVARE, svep_tabell, tillgangliga_format  # noqa: E402
+from gitter import bygg, sla_upp  # noqa: E402
+from livslangd import huspool  # noqa: E402
+from modell import STANDARDVARDEN, VIRKES_HANTERINGAR, simulera  # noqa: E402
+from produktpool import kolbalans  # noqa: E402
+from skogslandskap import jamnarigt, simulera_landskap  # noqa: E402
+from referens import kolbalans_loop, simulera_loop  # noqa: E402
+from svep import rutnat, svep  # noqa: E402
+
+HORISONTER = (200, 1000, 10000, 100000)
+SCENARIOANTAL = (1, 100, 10000, 1000000)
+
+
+def tid(funktion, upprepningar=3):
+    """Bästa tiden per anrop i sekunder, med automatiskt valt antal anrop per mätning."""
+    timer = timeit.Timer(funktion)
+    antal, _ = timer.autorange()
+    return min(timer.repeat(upprepningar, antal)) / antal
+
+
+def formatera_tid(sekunder):
+    if sekunder is None:
+        return "-"
+    for enhet, skala in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if sekunder >= skala:
+            return f"{sekunder / skala:.3g} {enhet}"
+    return f"{sekunder / 1e-9:.3g} ns"
+
+
+def rad(karna, storlek, loop, vektor):
+    uppsnabbning = f"{loop / vektor:,.0f}×" if loop else "-"
+    print(f"{karna:<34} {storlek:>22} {formatera_tid(loop):>10} {formatera_tid(vektor):>12} "
+          f"{uppsnabbning:>12}")
+
+
+def standardparametrar(max_years, virkes_hantering="ateranvandning", bygg_igen=True):
+    p = {n: STANDARDVARDEN[n] for n in ("BTA", "virke_per_m2", "bonitet", "rotation",
+                                        "hus_livslangd", "klimatpåverkan_per_m2")}
+    return dict(p, max_years=max_years, virkes_hantering=virkes_hantering, bygg_igen=bygg_igen)
+
+
+def bench_simulera(max_loop):
+    for max_years in HORISONTER:
+        p = standardparametrar(max_years)
+        loop = tid(lambda: simulera_loop(**p)) if max_years <= max_loop else None
+        rad("simulera", f"T={max_years:,}", loop, tid(lambda: simulera(**p)))
+    for vh in VIRKES_HANTERINGAR:
+        for bi in (True, False):
+            p = standardparametrar(200, vh, bi)
+            rad(f"simulera {vh}/{'bygg_igen' if bi else 'ej bygg_igen'}", "T=200",
+                tid(lambda: simulera_loop(**p)), tid(lambda: simulera(**p)))
+
+
+def bench_svep(max_antal):
+    rng = np.random.default_rng(0)
+    for antal in SCENARIOANTAL:
+        if antal > max_antal:
+            continue
+        parametrar = {
+            "BTA": rng.uniform(100, 10000, antal),
+            "virke_per_m2": rng.uniform(0.1, 1.0, antal),
+            "bonitet": rng.uniform(4.0, 10.0, antal),
+            "rotation": rng.integers(50, 151, antal),
+            "hus_livslangd": rng.integers(20, 201, antal),
+            "klimatpåverkan_per_m2": rng.uniform(0.15, 0.5, antal),
+            "virkes_hantering": rng.choice(VIRKES_HANTERINGAR, antal),
+            "bygg_igen": rng.random(antal) < 0.5,
+        }
+        # Loopen uppskattas från de första 100 scenarierna
+        prov = min(antal, 100)
+
+        def loop():
+            for i in range(prov):
+                simulera_loop(max_years=200, **{n: v[i] for n, v in parametrar.items()})
+
+        loop_tid = tid(loop, 1) * antal / prov
+        if antal >= 1000000:
+            # Hela serierna för 10^6 scenarier tar ~10 GB; mät det vanliga svepet
+            # av klimatneutralitet i float32 i stället
+            vektor = tid(lambda: svep(dtype=np.float32, serier=("klimatneutralitet",), **parametrar), 1)
+            rad("svep (klimatneutralitet, float32)", f"{antal:,} scenarier", loop_tid, vektor)
+        else:
+            rad("svep (alla serier)", f"{antal:,} scenarier", loop_tid, tid(lambda: svep(**parametrar)))
+
+
+def bench_gitter():
+    """Uppslagning i det förberäknade reglagegittret jämfört med modell.simulera."""
+    with tempfile.TemporaryDirectory() as katalog:
+        bygg_tid = tid(lambda: bygg(katalog), 1)
+        print(f"{'gitter byggt':<34} {'':>22} {formatera_tid(bygg_tid):>10}")
+        for vh in VIRKES_HANTERINGAR:
+            p = standardparametrar(200, vh)
+            rad(f"gitter {vh} (mot simulera)", "T=200",
+                tid(lambda: simulera(**p)), tid(lambda: sla_upp(**p, katalog=katalog)))
+
+
+def bench_landskap(max_antal):
+    """Skogslandskap med åldersklasser, T=200, utan referensloop."""
+    rng = np.random.default_rng(0)
+    for antal in (1, 1000, 100000):
+        if antal > max_antal:
+            continue
+        landskap = jamnarigt(rng.uniform(1, 50, antal), rng.uniform(4, 10, antal),
+                             rng.integers(50, 151, antal), rng.integers(0, 150, antal))
+        rad("skogslandskap", f"{antal:,} bestånd", None,
+            tid(lambda: simulera_landskap(landskap, 200), 1))
+
+
+def bench_dynamisk_lca(max_antal):
+    """Dynamisk LCA med FFT mot direkt faltning (np.convolve) per scenario, T=1000."""
+    rng = np.random.default_rng(0)
+    langd = 1001
+    karnor = (impulssvar(np.arange(langd)), agwp(np.arange(langd)))
+    for antal in (1, 1000, 10000):
+        if antal > max_antal:
+            continue
+        flode = rng.normal(size=(antal, langd))
+
+        def direkt():
+            for rad_ in flode:
+                for karna in karnor:
+                    np.convolve(rad_, karna)[:langd]
+
+        loop = tid(direkt, 1) if antal <= 1000 else None
+        rad("dynamisk LCA (mot np.convolve)", f"{antal:,} × T={langd - 1}", loop,
+            tid(lambda: dynamisk_lca(flode), 1))
+
+
+def bench_livslangd(max_antal):
+    """Huspool med Weibullfördelad livslängd: väntevärde via förnyelseekvationen med FFT."""
+    rng = np.random.default_rng(0)
+    for antal, horisont in ((1, 10000), (10000, 200), (100000, 200)):
+        if antal > max_antal:
+            continue
+        p = (rng.uniform(10, 100, (antal, 1)), rng.integers(20, 201, (antal, 1)),
+             np.arange(horisont + 1), rng.choice(VIRKES_HANTERINGAR, (antal, 1)),
+             rng.random((antal, 1)) < 0.5)
+        rad("huspool weibull", f"{antal:,} × T={horisont:,}", None, tid(lambda: huspool(*p, "weibull"), 1))
+
+
+def bench_berakningsgraf(antal=200):
+    """En omräkning efter att ett reglage ändrats: simulera_varianter mot beräkningsgrafen."""
+    import berakningsgraf
+    from modell import simulera_varianter
+
+    grund = {n: v for n, v in standardparametrar(200).items()
+             if n not in ("virkes_hantering", "bygg_igen")}
+    # Varje anrop får ett nytt värde, så att bara de påverkade noderna är cachemissar
+    andringar = {
+        "klimatpåverkan_per_m2": lambda i: {"klimatpåverkan_per_m2": 0.25 + 1e-6 * i},
+        "LCA_period": lambda i: {"LCA_period": 50 + 1e-6 * i},
+        "hus_livslangd": lambda i: {"hus_livslangd": 100 + 1e-6 * i},
+        "max_years +1": lambda i: {"max_years": 200 + i},
+    }
+    for namn, andring in andringar.items():
+        scenarier = [dict(grund, **andring(i)) for i in range(antal + 1)]
+        berakningsgraf.varianter(**scenarier[0])
+        start = time.perf_counter()
+        for p in scenarier[1:]:
+            simulera_varianter(**p)
+        hela = (time.perf_counter() - start) / antal
+        start = time.perf_counter()
+        for p in scenarier[1:]:
+            berakningsgraf.varianter(**p)
+        rad("berakningsgraf", namn, hela, (time.perf_counter() - start) / antal)
+
+
+def bench_export(max_antal):
+    """Strömmande export av ett svep i långt format (scenario × år rader), till /dev/null."""
+    for antal in (100, 10000):
+        if antal > max_antal:
+            continue
+        p = rutnat(BTA=np.linspace(100, 1000, antal // 10), bonitet=np.linspace(4, 10, 10),
+                   virke_per_m2=0.35, rotation=80, hus_livslangd=100, klimatpåverkan_per_m2=0.25)
+        for format_, kompakt in (("csv", False), ("parquet", False), ("parquet", True)):
+            if format_ not in tillgangliga_format():
+                continue
+
+            def kor():
+                with open(os.devnull, "wb") as fil:
+                    SKRIVARE[format_](svep_tabell(200, **p), fil, kompakt)
+
+            namn = f"export {format_}{' kompakt' if kompakt else ''}"
+            rad(namn, f"{antal * 201:,} rader", None, tid(kor, 1))
+
+
+def bench_kolbalans(max_loop):
+    for tidsperiod in HORISONTER:
+        p = (80, 50, 1.5, 0.5, tidsperiod)
+        loop = tid(lambda: kolbalans_loop(*p)) if tidsperiod <= max_loop else None
+        rad("kolbalans", f"T={tidsperiod:,}", loop, tid(lambda: kolbalans(*p, fordelad=True)))
+
+
+def bench_app(omkorningar):
+    """Tid per omkörning av klimatbalanserat_trahus.py inklusive rendering av figurerna."""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print("streamlit saknas – hoppar över omkörningen av appen")
+        return
+    from resultatcache import cache
+
+    os.chdir(ROT)
+    at = AppTest.from_file(os.path.join(ROT, "klimatbalanserat_trahus.py"), default_timeout=60).run()
+    bta = at.sidebar.slider[0]
+
+    def omkorning(varden):
+        start = time.perf_counter()
+        for v in varden:
+            bta.set_value(v)
+            at.run()
+        return (time.perf_counter() - start) / len(varden)
+
+    cache.rensa()
+    kall = omkorning([100 + 7 * i for i in range(omkorningar)])
+    varm = omkorning([100 + 7 * i for i in range(omkorningar)])
+    if at.exception:
+        raise SystemExit(at.exception[0].message)
+    rad("app-omkörning (nya reglagevärden)", f"{omkorningar} omkörningar", None, kall)
+    rad("app-omkörning (cacheträff)", f"{omkorningar} omkörningar", None, varm)
+
+
+SIDOR = ("klimatbalanserat_trahus.py", "Klimatneutralt_trahus.py", "Inbyggt_virke.py",
+         "Byggnadsbestand.py")
+
+
+def kallstart(skript):
+    """Tid för en ny process som importerar Streamlit och kör skriptet en gång."""
+    kod = (
+        "import sys; sys.path.insert(0, sys.argv[1]); "
+        "from streamlit.testing.v1 import AppTest; "
+        "AppTest.from_file(sys.argv[2], default_timeout=120).run()"
+    )
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", kod, ROT, os.path.join(ROT, skript)], check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def bench_sidor():
+    """Kallstart för app.py mot separata processer per sida, och tid för sidbyte."""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print("streamlit saknas – hoppar över sidbytena")
+        return
+    separata = sum(kallstart(sida) for sida in SIDOR)
+    rad("kallstart (en process per sida)", f"{len(SIDOR)} processer", None, separata)
+    rad("kallstart app.py", "1 process", None, kallstart("app.py"))
+
+    os.chdir(ROT)
+    at = AppTest.from_file(os.path.join(ROT, "app.py"), default_timeout=60).run()
+    for varv in ("första besöket", "återbesök"):
+        for sida in SIDOR[1:] + SIDOR[:1]:
+            start = time.perf_counter()
+            at.switch_page(sida).run()
+            rad(f"sidbyte ({varv})", sida, None, time.perf_counter() - start)
+    if at.exception:
+        raise SystemExit(at.exception[0].message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks för modellkärnorna.")
+    parser.add_argument("--snabb", action="store_true", help="hoppa över de största storlekarna")
+    parser.add_argument("--utan-app", action="store_true", help="hoppa över omkörningen av appen")
+    parser.add_argument("--max-loop", type=int, default=10000,
+                        help="största tidsperiod som referensloopen körs för")
+    parser.add_argument("--omkorningar", type=int, default=20)
+    args = parser.parse_args()
+
+    max_loop = min(args.max_loop, 1000) if args.snabb else args.max_loop
+    print(f"{'kärna':<34} {'storlek':>22} {'loop':>10} {'vektoriserad':>12} {'uppsnabbning':>12}")
+    bench_simulera(max_loop)
+    bench_svep(10000 if args.snabb else max(SCENARIOANTAL))
+    bench_gitter()
+    bench_landskap(1000 if args.snabb else 100000)
+    bench_dynamisk_lca(1000 if args.snabb else 10000)
+    bench_livslangd(10000 if args.snabb else 100000)
+    bench_berakningsgraf()
+    bench_export(100 if args.snabb else 10000)
+    bench_kolbalans(max_loop)
+    if not args.utan_app:
+        bench_app(args.omkorningar)
+        bench_sidor()
+
+
+if __name__ == "__main__":
+    main()
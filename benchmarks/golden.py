@@ -0,0 +1,227 @@
+"""Golden-filer för regressionstest av modellkärnorna.
+
+Golden-filerna i benchmarks/golden/ är skapade med de ursprungliga loopar som
+finns bevarade i referens.py. Alla optimerade vägar jämförs mot dem:
+
+- modell.simulera, modell.simulera_varianter, svep.svep,
+  berakningsgraf.varianter (även förlängd eller avkortad från en annan
+  horisont) och produktpool.kolbalans med fordelad=True (referensens
+  ursprungliga skalning) ska vara bit-identiska;
+- bestand.simulera_bestand (FFT-faltning) ska ligga inom relativ tolerans
+  BESTAND_TOLERANS mot summan av husen räknade med referensloopen;
+- gitter.sla_upp ska ligga inom relativ tolerans GITTER_TOLERANS mot
+  referensen för alla scenarier som gittret täcker;
+- batch.berakna_scenarier ska ge exakt samma klimatneutralitet vid LCA-perioden;
+- montecarlo.monte_carlo ska ge samma resultat oberoende av antalet processer.
+
+    python benchmarks/golden.py             # kontrollera
+    python benchmarks/golden.py --skapa     # skapa om golden-filerna från referensen
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+KATALOG = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(KATALOG))
+sys.path.insert(0, KATALOG)
+
+from referens import kolbalans_loop, simulera_loop  # noqa: E402
+
+GOLDEN_KATALOG = os.path.join(KATALOG, "golden")
+BESTAND_TOLERANS = 1e-9
+GITTER_TOLERANS = 1e-12
+
+SERIER = ("co2_i_skog", "co2_i_hus", "klimatneutralitet", "cum_co2_skog", "cum_co2_hus", "cum_co2_summa")
+SKALARER = ("co2_total", "skogsareal_ha")
+
+# BTA, virke_per_m2, bonitet, rotation, hus_livslangd, max_years, klimatpåverkan_per_m2
+PARAMETERUPPSATTNINGAR = [
+    (150, 0.35, 8.0, 80, 100, 200, 0.25),
+    (10000, 1.0, 10.0, 50, 20, 200, 0.5),
+    (100, 0.1, 4.0, 150, 200, 50, 0.15),
+    (2345, 0.77, 6.3, 133, 37, 200, 0.0),
+    (420, 0.42, 7.7, 61, 83, 1000, 0.333),
+]
+VIRKES_HANTERINGAR = ("ateranvandning", "bioccs", "konventionell", "okand")
+
+# rotations_period, produkt_livslangd, kolinlagring_per_ar, andel_kol_i_virke, tidsperiod
+KOLBALANS_UPPSATTNINGAR = [
+    (80, 50, 1.5, 0.5, 150),
+    (50, 100, 5.0, 0.6, 200),
+    (150, 10, 0.1, 0.3, 50),
+    (65, 95, 2.7, 0.45, 1000),
+    (10, 95, 1.3, 0.5, 3000),
+]
+
+
+def modellscenarier():
+    return [
+        dict(zip(("BTA", "virke_per_m2", "bonitet", "rotation", "hus_livslangd", "max_years",
+                  "klimatpåverkan_per_m2"), p), virkes_hantering=vh, bygg_igen=bi)
+        for p in PARAMETERUPPSATTNINGAR
+        for vh in VIRKES_HANTERINGAR
+        for bi in (True, False)
+    ]
+
+
+def skapa():
+    os.makedirs(GOLDEN_KATALOG, exist_ok=True)
+    scenarier = modellscenarier()
+    data = {"parametrar": np.array(json.dumps(scenarier, ensure_ascii=False))}
+    for i, scenario in enumerate(scenarier):
+        for namn, varde in simulera_loop(**scenario).items():
+            data[f"{i}/{namn}"] = varde
+    np.savez_compressed(os.path.join(GOLDEN_KATALOG, "modell.npz"), **data)
+
+    data = {"parametrar": np.array(json.dumps(KOLBALANS_UPPSATTNINGAR))}
+    for i, p in enumerate(KOLBALANS_UPPSATTNINGAR):
+        _, skog, produkt, netto = kolbalans_loop(*p)
+        data[f"{i}/kol_i_skog"], data[f"{i}/kol_i_produkt"], data[f"{i}/netto_kolbalans"] = skog, produkt, netto
+    np.savez_compressed(os.path.join(GOLDEN_KATALOG, "kolbalans.npz"), **data)
+    print(f"Golden-filer skrivna till {GOLDEN_KATALOG}")
+
+
+def _las(namn):
+    with np.load(os.path.join(GOLDEN_KATALOG, namn)) as f:
+        data = dict(f)
+    return json.loads(str(data.pop("parametrar"))), data
+
+
+def kontrollera():
+    import berakningsgraf
+    from bestand import byggschema, simulera_bestand
+    from batch import berakna_scenarier
+    from gitter import bygg, sla_upp
+    from modell import STANDARDVARDEN, simulera, simulera_varianter, valj_variant
+    from montecarlo import monte_carlo
+    from produktpool import kolbalans
+    from resultatcache import cache
+    from svep import svep
+
+    fel = []
+
+    def jamfor(beskrivning, faktiskt, forvantat):
+        if not np.array_equal(np.asarray(faktiskt), np.asarray(forvantat), equal_nan=True):
+            fel.append(beskrivning)
+
+    scenarier, golden = _las("modell.npz")
+    for i, scenario in enumerate(scenarier):
+        res = simulera(**scenario)
+        for namn in SERIER + SKALARER:
+            jamfor(f"simulera {scenario} {namn}", getattr(res, namn), golden[f"{i}/{namn}"])
+
+    # svep: alla scenarier med samma horisont i ett anrop
+    for max_years in sorted({s["max_years"] for s in scenarier}):
+        index = [i for i, s in enumerate(scenarier) if s["max_years"] == max_years]
+        parametrar = {
+            n: np.array([scenarier[i][n] for i in index])
+            for n in scenarier[0] if n != "max_years"
+        }
+        res = svep(max_years=max_years, chunk_storlek=7, **parametrar)
+        for rad, i in enumerate(index):
+            for namn in SERIER + SKALARER:
+                jamfor(f"svep {scenarier[i]} {namn}", res[namn][rad], golden[f"{i}/{namn}"])
+
+    # simulera_varianter: alla slutskeden i ett anrop, ett urval per scenario
+    for i, scenario in enumerate(scenarier):
+        if scenario["virkes_hantering"] == "okand":
+            continue
+        ovriga = {n: v for n, v in scenario.items() if n not in ("virkes_hantering", "bygg_igen")}
+        res = valj_variant(
+            simulera_varianter(**ovriga), scenario["virkes_hantering"], scenario["bygg_igen"]
+        )
+        for namn in SERIER + SKALARER:
+            jamfor(f"simulera_varianter {scenario} {namn}", getattr(res, namn), golden[f"{i}/{namn}"])
+
+    # berakningsgraf: samma resultat när serierna förlängs från en kortare
+    # horisont eller kortas av från en längre som redan finns i cachen
+    for i, scenario in enumerate(scenarier):
+        if scenario["virkes_hantering"] == "okand":
+            continue
+        ovriga = {n: v for n, v in scenario.items() if n not in ("virkes_hantering", "bygg_igen")}
+        for annan in (ovriga["max_years"] // 2, ovriga["max_years"] + 37):
+            cache.rensa()
+            berakningsgraf.varianter(**dict(ovriga, max_years=annan))
+            res = valj_variant(
+                berakningsgraf.varianter(**ovriga), scenario["virkes_hantering"], scenario["bygg_igen"]
+            )
+            for namn in SERIER + SKALARER:
+                jamfor(f"berakningsgraf {scenario} från {annan} år {namn}", getattr(res, namn),
+                       golden[f"{i}/{namn}"])
+    cache.rensa()
+
+    # gitter: normaliserade serier skalade per scenario, så bara inom avrundningsfel
+    with tempfile.TemporaryDirectory() as katalog:
+        bygg(katalog)
+        for i, scenario in enumerate(scenarier):
+            res = sla_upp(**scenario, katalog=katalog)
+            if res is None:
+                continue
+            for namn in SERIER + SKALARER:
+                forvantat = golden[f"{i}/{namn}"]
+                avvikelse = np.abs(getattr(res, namn) - forvantat).max() / max(np.abs(forvantat).max(), 1e-300)
+                if not avvikelse <= GITTER_TOLERANS:
+                    fel.append(f"gitter {scenario} {namn}: relativ avvikelse {avvikelse:.2e}")
+
+    # batch: klimatneutralitet vid LCA-perioden
+    kanda = [s for s in scenarier if s["virkes_hantering"] != "okand"]
+    p = {n: np.array([s.get(n, STANDARDVARDEN[n]) for s in kanda]) for n in STANDARDVARDEN}
+    p["id"] = np.arange(len(kanda)).astype(str)
+    kolumner = berakna_scenarier(p)
+    for rad, s in enumerate(kanda):
+        i = scenarier.index(s)
+        jamfor(f"batch {s}", kolumner["klimatneutralitet_vid_LCA"][rad],
+               golden[f"{i}/klimatneutralitet"][STANDARDVARDEN["LCA_period"]])
+
+    # bestånd: summan av tre hus byggda olika år, räknade med referensloopen
+    projekt = [(0, 150.0, "ateranvandning", True), (7, 900.0, "konventionell", False),
+               (31, 2500.0, "bioccs", True)]
+    schema, _ = byggschema(*map(np.array, zip(*projekt)), startar=0, max_years=200)
+    bestand = simulera_bestand(schema, 0.35, 8.0, 80, 100, 0.25)
+    for namn in ("co2_i_skog", "co2_i_hus", "cum_co2_skog", "cum_co2_hus"):
+        summa = np.zeros(201)
+        for ar, bta, vh, bi in projekt:
+            summa[ar:] += simulera_loop(bta, 0.35, 8.0, 80, 100, 200 - ar, 0.25, vh, bi)[namn]
+        avvikelse = np.abs(getattr(bestand, namn) - summa).max() / np.abs(summa).max()
+        if avvikelse > BESTAND_TOLERANS:
+            fel.append(f"bestand {namn}: relativ avvikelse {avvikelse:.2e}")
+
+    uppsattningar, golden = _las("kolbalans.npz")
+    for i, p in enumerate(uppsattningar):
+        _, skog, produkt, netto = kolbalans(*p, fordelad=True)
+        jamfor(f"kolbalans {p} kol_i_skog", skog, golden[f"{i}/kol_i_skog"])
+        jamfor(f"kolbalans {p} kol_i_produkt", produkt, golden[f"{i}/kol_i_produkt"])
+        jamfor(f"kolbalans {p} netto_kolbalans", netto, golden[f"{i}/netto_kolbalans"])
+
+    centrum = {**STANDARDVARDEN}
+    osakerhet = {"bonitet": ("normal", 0.1), "rotation": ("likformig", 0.2)}
+    en = monte_carlo(centrum, osakerhet, antal=40000, seed=7, arbetare=1)
+    tva = monte_carlo(centrum, osakerhet, antal=40000, seed=7, arbetare=2)
+    for namn in en.percentiler:
+        jamfor(f"monte_carlo {namn} percentiler", en.percentiler[namn], tva.percentiler[namn])
+        jamfor(f"monte_carlo {namn} medel", en.medel[namn], tva.medel[namn])
+
+    return fel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kontrollera eller skapa golden-filerna.")
+    parser.add_argument("--skapa", action="store_true", help="skapa om golden-filerna")
+    args = parser.parse_args()
+    if args.skapa:
+        skapa()
+        return
+    fel = kontrollera()
+    for rad in fel:
+        print("AVVIKELSE:", rad)
+    print("OK" if not fel else f"{len(fel)} avvikelser")
+    sys.exit(1 if fel else 0)
+
+
+if __name__ == "__main__":
+    main()
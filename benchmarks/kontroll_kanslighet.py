@@ -0,0 +1,121 @@
+"""Kontroll av känslighetsanalysen mot funktioner med kända index.
+
+Saltelli-designen, estimatorerna och bootstrap i kanslighet.sobol körs på
+Ishigami-funktionen f = sin x1 + a sin² x2 + b x3⁴ sin x1, x_i ~ U(-π, π),
+vars första ordningens och totala index har slutna uttryck. Morris körs på en
+linjär funktion, där varje elementäreffekt är koefficienten gånger
+parameterns intervallbredd och spridningen noll. Kontrollen:
+
+- Sobol-indexen för Ishigami ska ligga inom SOBOL_TOLERANS från de
+  analytiska och konfidensintervallen ska omsluta skattningarna;
+- Morris mu* för den linjära funktionen ska vara exakt (inom
+  MORRIS_TOLERANS) och sigma noll;
+- i klimatbalansmodellen ska husets livslängd, som inte påverkar
+  klimatneutraliteten, få index och elementäreffekter exakt noll.
+
+Testfunktionerna ersätter kanslighet.utvardera medan kontrollen körs, så att
+samma kod som för modellen används för design och skattning.
+
+    python benchmarks/kontroll_kanslighet.py
+    python benchmarks/kontroll_kanslighet.py --antal 262144
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+KATALOG = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(KATALOG))
+
+import kanslighet  # noqa: E402
+from modell import STANDARDVARDEN  # noqa: E402
+
+ISHIGAMI_A = 7.0
+ISHIGAMI_B = 0.1
+ISHIGAMI_INTERVALL = {n: (-np.pi, np.pi) for n in ("x1", "x2", "x3")}
+SOBOL_TOLERANS = 0.02
+
+LINJAR_KOEFFICIENTER = {"x1": 3.0, "x2": -0.5, "x3": 0.0}
+LINJAR_INTERVALL = {"x1": (0.0, 1.0), "x2": (-2.0, 6.0), "x3": (10.0, 20.0)}
+MORRIS_TOLERANS = 1e-9
+
+
+def ishigami(varierade, centrum=None, utfall=None):
+    x1, x2, x3 = varierade["x1"], varierade["x2"], varierade["x3"]
+    return np.sin(x1) + ISHIGAMI_A * np.sin(x2) ** 2 + ISHIGAMI_B * x3**4 * np.sin(x1)
+
+
+def ishigami_index(a=ISHIGAMI_A, b=ISHIGAMI_B):
+    """Analytiska första ordningens och totala index (S1, ST) för Ishigami."""
+    v1 = 0.5 * (1 + b * np.pi**4 / 5) ** 2
+    v2 = a**2 / 8
+    v13 = b**2 * np.pi**8 * (1 / 18 - 1 / 50)
+    varians = v1 + v2 + v13
+    return np.array([v1, v2, 0.0]) / varians, np.array([v1 + v13, v2, v13]) / varians
+
+
+def linjar(varierade, centrum=None, utfall=None):
+    return sum(c * varierade[n] for n, c in LINJAR_KOEFFICIENTER.items())
+
+
+def _med_utvardering(funktion, analys, *args, **kwargs):
+    # Blocken körs i samma process (arbetare=1), så det räcker att byta modulens funktion
+    ursprunglig = kanslighet.utvardera
+    kanslighet.utvardera = funktion
+    try:
+        return analys(*args, **kwargs)
+    finally:
+        kanslighet.utvardera = ursprunglig
+
+
+def kontrollera(antal=65536, seed=0):
+    fel = []
+
+    res = _med_utvardering(ishigami, kanslighet.sobol, {}, tuple(ISHIGAMI_INTERVALL),
+                           antal=antal, intervall=ISHIGAMI_INTERVALL, seed=seed)
+    s1, st = ishigami_index()
+    for namn, skattat, analytiskt, ki in (("S1", res.S1, s1, res.S1_ki), ("ST", res.ST, st, res.ST_ki)):
+        avvikelse = np.abs(skattat - analytiskt)
+        if np.any(avvikelse > SOBOL_TOLERANS):
+            fel.append(f"Ishigami {namn} = {np.round(skattat, 4)}, analytiskt {np.round(analytiskt, 4)}")
+        if np.any((ki[:, 0] > skattat) | (skattat > ki[:, 1])):
+            fel.append(f"Ishigami {namn}: konfidensintervallen omsluter inte skattningarna")
+
+    parametrar = tuple(LINJAR_INTERVALL)
+    res = _med_utvardering(linjar, kanslighet.morris, {}, parametrar,
+                           intervall=LINJAR_INTERVALL, seed=seed)
+    vantat = np.array([abs(LINJAR_KOEFFICIENTER[n]) * (hog - lag)
+                       for n, (lag, hog) in LINJAR_INTERVALL.items()])
+    if not np.allclose(res.mu_stjarna, vantat, rtol=MORRIS_TOLERANS, atol=MORRIS_TOLERANS):
+        fel.append(f"Morris mu* = {res.mu_stjarna}, väntat {vantat}")
+    if np.any(res.sigma > MORRIS_TOLERANS * vantat.max()):
+        fel.append(f"Morris sigma = {res.sigma}, väntat noll för en linjär funktion")
+
+    # Husets livslängd påverkar inte klimatneutraliteten: AB_i blir identisk med A
+    centrum = dict(STANDARDVARDEN)
+    i = kanslighet.KANSLIGHETSPARAMETRAR.index("hus_livslangd")
+    res = kanslighet.sobol(centrum, antal=4096, seed=seed)
+    if res.S1[i] != 0 or res.ST[i] != 0:
+        fel.append(f"hus_livslangd: S1 = {res.S1[i]}, ST = {res.ST[i]}, väntat noll")
+    res = kanslighet.morris(centrum, trajektorier=200, seed=seed)
+    if res.mu_stjarna[i] != 0:
+        fel.append(f"hus_livslangd: Morris mu* = {res.mu_stjarna[i]}, väntat noll")
+    return fel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kontrollera känslighetsanalysen mot kända index.")
+    parser.add_argument("--antal", type=int, default=65536, help="basrader i Sobol-designen")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    fel = kontrollera(args.antal, args.seed)
+    for rad in fel:
+        print("AVVIKELSE:", rad)
+    print("OK" if not fel else f"{len(fel)} avvikelser")
+    sys.exit(1 if fel else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Kontroll av målsökningen mot en rå sökning över ett tätt rutnät.
+
+För slumpade projekt och alla parametrar i malsokning.MALPARAMETRAR, med och
+utan given skogsareal och för båda villkoren, kontrolleras att:
+
+- minsta och största värde som malsok ger verkligen når målet;
+- heltalsparametrarna (rotation, ar) ger exakt samma gränser och samma
+  möjliga projekt som en genomräkning av alla heltal (för ar bara första
+  året, eftersom största då är intervallets övre gräns);
+- de kontinuerliga parametrarna ger gränser som omsluter de uppfyllda
+  punkterna i ett rutnät med RUTNAT punkter och ligger högst ett rutnätssteg
+  utanför dem. Där rutnätet inte hittar någon uppfylld punkt får malsok bara
+  svara med ett intervall som är smalare än ett rutnätssteg.
+
+    python benchmarks/kontroll_malsokning.py
+    python benchmarks/kontroll_malsokning.py --projekt 2000 --seed 3
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+KATALOG = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(KATALOG))
+
+from malsokning import (  # noqa: E402
+    HELTALSPARAMETRAR,
+    MAL,
+    MALINTERVALL,
+    MALPARAMETRAR,
+    VILLKOR,
+    klimatneutralitet_vid,
+    malsok,
+)
+from modell import REGLAGEINTERVALL  # noqa: E402
+
+RUTNAT = 20001
+# Parametrarna utan övre gräns söks inom ett ändligt intervall, så att rutnätet täcker det
+INTERVALL = {"skogsareal_ha": (0.0, 50.0), "ar": (0, 400)}
+# Relativ marginal för att malsoks gräns ska räknas som innanför en rutnätspunkt
+MARGINAL = 1e-9
+
+
+def projekt(antal, seed=0):
+    """antal slumpade projekt inom reglageintervallen."""
+    rng = np.random.default_rng(seed)
+    p = {}
+    for namn in ("BTA", "virke_per_m2", "bonitet", "klimatpåverkan_per_m2"):
+        p[namn] = rng.uniform(*REGLAGEINTERVALL[namn], antal)
+    for namn in ("rotation", "LCA_period"):
+        lag, hog = REGLAGEINTERVALL[namn]
+        p[namn] = rng.integers(lag, hog + 1, antal)
+    return p, rng.uniform(0.5, 20.0, antal)
+
+
+def _klimatneutralitet(parameter, varde, villkor, p, areal):
+    """Klimatneutraliteten med parameter satt till varde (en extra sista axel per projekt)."""
+    q = {n: np.asarray(v)[:, None] for n, v in p.items() if n != "LCA_period"}
+    ar = np.asarray(p["LCA_period"])[:, None]
+    areal = None if areal is None else np.asarray(areal)[:, None]
+    if parameter == "ar":
+        # Första året då målet nås gäller just det året
+        ar, villkor = varde, "vid"
+    elif parameter == "skogsareal_ha":
+        areal = varde
+    else:
+        q[parameter] = varde
+    return klimatneutralitet_vid(ar, villkor, areal, **q)
+
+
+def _ra_sokning(parameter, villkor, p, areal, antal):
+    """Minsta och största uppfyllda rutnätspunkt per projekt samt rutnätssteget."""
+    lag, hog = INTERVALL.get(parameter, MALINTERVALL[parameter])
+    if parameter in HELTALSPARAMETRAR:
+        rutnat = np.arange(lag, hog + 1)
+    else:
+        rutnat = np.linspace(lag, hog, RUTNAT)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        uppfyllt = _klimatneutralitet(parameter, rutnat, villkor, p, areal) >= MAL
+    uppfyllt = np.broadcast_to(uppfyllt, (antal, len(rutnat)))
+    nagot = uppfyllt.any(axis=1)
+    minsta = np.where(nagot, rutnat[uppfyllt.argmax(axis=1)], np.nan)
+    storsta = np.where(nagot, rutnat[len(rutnat) - 1 - uppfyllt[:, ::-1].argmax(axis=1)], np.nan)
+    return minsta, storsta, rutnat[1] - rutnat[0]
+
+
+def kontrollera(antal=500, seed=0):
+    p, arealer = projekt(antal, seed)
+    fel = []
+    for areal in (None, arealer):
+        for villkor in VILLKOR:
+            for parameter in MALPARAMETRAR:
+                namn = f"{parameter} ({villkor}, {'given areal' if areal is not None else 'beräknad areal'})"
+                extra = {} if areal is None else {"skogsareal_ha": areal}
+                resultat = malsok(parameter, villkor=villkor, intervall=INTERVALL, **p, **extra)
+                mojlig = resultat.mojlig
+
+                granser = [(resultat.minsta, "minsta"), (resultat.storsta, "största")]
+                if parameter == "ar":
+                    # För ar är svaret första året; största är bara intervallets övre gräns
+                    granser = granser[:1]
+                for grans, etikett in granser:
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        varde = _klimatneutralitet(parameter, grans[:, None], villkor, p, areal)[:, 0]
+                    antal_fel = np.count_nonzero(mojlig & ~(varde >= MAL))
+                    if antal_fel:
+                        fel.append(f"{namn}: {etikett} når inte målet för {antal_fel} projekt")
+
+                minsta, storsta, steg = _ra_sokning(parameter, villkor, p, areal, antal)
+                hittad = ~np.isnan(minsta)
+                if parameter in HELTALSPARAMETRAR:
+                    olika = (mojlig != hittad) | (hittad & (resultat.minsta != minsta))
+                    if parameter != "ar":
+                        olika |= hittad & (resultat.storsta != storsta)
+                    if olika.any():
+                        fel.append(f"{namn}: skiljer sig från genomräkningen av alla heltal "
+                                   f"för {np.count_nonzero(olika)} projekt")
+                    continue
+
+                if np.any(hittad & ~mojlig):
+                    fel.append(f"{namn}: rutnätet når målet men malsok inte, "
+                               f"för {np.count_nonzero(hittad & ~mojlig)} projekt")
+                smalt = ~hittad & mojlig & (resultat.storsta - resultat.minsta > steg)
+                if smalt.any():
+                    fel.append(f"{namn}: malsok når målet i ett intervall bredare än rutnätssteget "
+                               f"som rutnätet missar, för {np.count_nonzero(smalt)} projekt")
+                bada = hittad & mojlig
+                marginal = MARGINAL * np.maximum(np.abs(minsta), np.abs(storsta))
+                omsluter = ((resultat.minsta <= minsta + marginal)
+                            & (resultat.storsta >= storsta - marginal))
+                nara = ((minsta - resultat.minsta <= steg) & (resultat.storsta - storsta <= steg))
+                if np.any(bada & ~omsluter):
+                    fel.append(f"{namn}: gränserna omsluter inte rutnätets uppfyllda punkter "
+                               f"för {np.count_nonzero(bada & ~omsluter)} projekt")
+                if np.any(bada & ~nara):
+                    fel.append(f"{namn}: gränserna ligger mer än ett rutnätssteg utanför rutnätets "
+                               f"för {np.count_nonzero(bada & ~nara)} projekt")
+    return fel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kontrollera målsökningen mot rå sökning.")
+    parser.add_argument("--projekt", type=int, default=500, help="antal slumpade projekt")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    fel = kontrollera(args.projekt, args.seed)
+    for rad in fel:
+        print("AVVIKELSE:", rad)
+    print("OK" if not fel else f"{len(fel)} avvikelser")
+    sys.exit(1 if fel else 0)
+
+
+if __name__ == "__main__":
+    main()
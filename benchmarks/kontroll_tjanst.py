@@ -0,0 +1,181 @@
+"""Kontroll av JSON-tjänstens svar på förfrågningsnivå.
+
+Startar tjanst.py som underprocess på en ledig port och kontrollerar att:
+
+- felaktiga förfrågningar ger rätt status: 400 för ogiltig Content-Length,
+  ogiltig JSON, parametrar utanför modellens definitionsområde (t.ex. bonitet
+  0, okända produktkategorier, halveringstid 0, max_years över MAX_AR), 404
+  för okänd sökväg, 405 för GET mot en modell och 413 för för stor kropp;
+- giltiga förfrågningar ger 200;
+- alla svar är giltig JSON utan NaN eller Infinity;
+- samtidiga enskilda förfrågningar samlas i mikrobatcher (enligt
+  /statistik), ger samma svar som /klimatbalans/batch för samma scenarier och
+  att ett felaktigt scenario i en mikrobatch bara fäller sig självt.
+
+    python benchmarks/kontroll_tjanst.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+
+KATALOG = os.path.dirname(os.path.abspath(__file__))
+ROT = os.path.dirname(KATALOG)
+sys.path.insert(0, ROT)
+sys.path.insert(0, KATALOG)
+
+from last import _forfragan, scenarier, vanta_pa_server  # noqa: E402
+from tjanst import MAX_AR, MAX_KROPP  # noqa: E402
+
+VARD = "127.0.0.1"
+SAMTIDIGA = 64
+# Längre fönster än standard så att de samtidiga förfrågningarna säkert hamnar i samma batch
+BATCH_FONSTER_MS = 50
+
+# (beskrivning, metod, sökväg, kropp, väntad status)
+FALL = [
+    ("hälsa", "GET", "/halsa", b"", 200),
+    ("statistik", "GET", "/statistik", b"", 200),
+    ("klimatbalans med standardvärden", "POST", "/klimatbalans", b"{}", 200),
+    ("klimatbalans med serier", "POST", "/klimatbalans", b'{"BTA": 500, "serier": true}', 200),
+    ("klimatbalans batch", "POST", "/klimatbalans/batch",
+     b'{"scenarier": [{"rotation": 60}, {"rotation": 120}]}', 200),
+    ("kolbalans", "POST", "/kolbalans", b'{"tidsperiod": 100}', 200),
+    ("kolbalans med nedbrytning", "POST", "/kolbalans",
+     b'{"andelar": {"sagade_travaror": 0.5, "papper": 0.2}}', 200),
+    ("kolbalans batch", "POST", "/kolbalans/batch", b'[{"rotations_period": 60}]', 200),
+    ("okänd sökväg", "POST", "/finns_inte", b"{}", 404),
+    ("GET mot modell", "GET", "/klimatbalans", b"", 405),
+    ("ogiltig JSON", "POST", "/klimatbalans", b"{", 400),
+    ("scenario som inte är ett objekt", "POST", "/klimatbalans", b"[1]", 400),
+    ("tom batch", "POST", "/klimatbalans/batch", b'{"scenarier": []}', 400),
+    ("bonitet 0", "POST", "/klimatbalans", b'{"bonitet": 0}', 400),
+    ("negativ BTA", "POST", "/klimatbalans", b'{"BTA": -1}', 400),
+    ("max_years över gränsen", "POST", "/klimatbalans",
+     json.dumps({"max_years": 10**9}).encode(), 400),
+    ("LCA_period över gränsen", "POST", "/klimatbalans",
+     json.dumps({"LCA_period": MAX_AR + 1}).encode(), 400),
+    ("okänd virkes_hantering", "POST", "/klimatbalans", b'{"virkes_hantering": "x"}', 400),
+    ("okänd produktkategori", "POST", "/kolbalans", b'{"andelar": {"foo": 1}}', 400),
+    ("andelar som inte är ett objekt", "POST", "/kolbalans", b'{"andelar": [1]}', 400),
+    ("tomma andelar", "POST", "/kolbalans", b'{"andelar": {}}', 400),
+    ("negativ andel", "POST", "/kolbalans", b'{"andelar": {"papper": -1}}', 400),
+    ("halveringstid 0", "POST", "/kolbalans",
+     b'{"andelar": {"papper": 1}, "halveringstider": {"papper": 0}}', 400),
+    ("tidsperiod över gränsen", "POST", "/kolbalans", json.dumps({"tidsperiod": 10**9}).encode(), 400),
+    ("okänd kolbalansparameter", "POST", "/kolbalans", b'{"foo": 1}', 400),
+]
+
+# Rubriker som klienten i last.py inte kan skicka: (beskrivning, rubriker, väntad status)
+RA_FALL = [
+    ("Content-Length med bokstäver", "Content-Length: 1x", 400),
+    ("negativ Content-Length", "Content-Length: -5", 400),
+    ("Content-Length med plustecken", "Content-Length: +5", 400),
+    ("för stor kropp", f"Content-Length: {MAX_KROPP + 1}", 413),
+]
+
+
+def ledig_port():
+    with socket.socket() as s:
+        s.bind((VARD, 0))
+        return s.getsockname()[1]
+
+
+def _tolka(svar):
+    """JSON-svaret, eller ValueError om det inte är strikt JSON (NaN och Infinity avvisas)."""
+    def avvisa(konstant):
+        raise ValueError(f"{konstant} är inte giltig JSON")
+    return json.loads(svar, parse_constant=avvisa)
+
+
+async def _en_forfragan(port, metod, sokvag, kropp):
+    lasare, skrivare = await asyncio.open_connection(VARD, port)
+    try:
+        return await _forfragan(lasare, skrivare, VARD, sokvag, kropp, metod)
+    finally:
+        skrivare.close()
+
+
+async def _ra_forfragan(port, rubrik):
+    lasare, skrivare = await asyncio.open_connection(VARD, port)
+    try:
+        skrivare.write(f"POST /klimatbalans HTTP/1.1\r\nHost: {VARD}\r\n{rubrik}\r\n\r\n".encode())
+        huvud = await lasare.readuntil(b"\r\n\r\n")
+        return int(huvud.split(b" ", 2)[1]), await lasare.read()
+    finally:
+        skrivare.close()
+
+
+async def _kontrollera(port):
+    fel = []
+
+    def granska(beskrivning, status, svar, vantad):
+        if status != vantad:
+            fel.append(f"{beskrivning}: status {status}, väntat {vantad}: {svar[:200]!r}")
+        try:
+            return _tolka(svar)
+        except ValueError as orsak:
+            fel.append(f"{beskrivning}: ogiltig JSON i svaret ({orsak})")
+
+    for beskrivning, metod, sokvag, kropp, vantad in FALL:
+        granska(beskrivning, *await _en_forfragan(port, metod, sokvag, kropp), vantad)
+    for beskrivning, rubrik, vantad in RA_FALL:
+        granska(beskrivning, *await _ra_forfragan(port, rubrik), vantad)
+
+    # Samtidiga unika scenarier (så att svarscachen inte träffas) plus ett felaktigt
+    kroppar = scenarier(SAMTIDIGA, seed=1)
+    felaktig = SAMTIDIGA // 2
+    kroppar[felaktig] = b'{"bonitet": 0}'
+    fore = _tolka((await _en_forfragan(port, "GET", "/statistik", b""))[1])
+    svar = await asyncio.gather(*(
+        _en_forfragan(port, "POST", "/klimatbalans", kropp) for kropp in kroppar
+    ))
+    efter = _tolka((await _en_forfragan(port, "GET", "/statistik", b""))[1])
+    enskilda = [granska(f"samtidig förfrågan {i}", status, kropp, 400 if i == felaktig else 200)
+                for i, (status, kropp) in enumerate(svar)]
+
+    batcher = (efter["mikrobatcher"]["/klimatbalans"]["batcher"]
+               - fore["mikrobatcher"]["/klimatbalans"]["batcher"])
+    if not 1 <= batcher < SAMTIDIGA // 2:
+        fel.append(f"{SAMTIDIGA} samtidiga förfrågningar gav {batcher} mikrobatcher")
+
+    giltiga = [json.loads(k) for i, k in enumerate(kroppar) if i != felaktig]
+    status, batchsvar = await _en_forfragan(
+        port, "POST", "/klimatbalans/batch", json.dumps({"scenarier": giltiga}).encode()
+    )
+    batchsvar = granska("batch med samma scenarier", status, batchsvar, 200)
+    if batchsvar is not None and [s for i, s in enumerate(enskilda) if i != felaktig] != batchsvar:
+        fel.append("mikrobatcherna ger andra svar än /klimatbalans/batch för samma scenarier")
+    return fel
+
+
+def kontrollera():
+    port = ledig_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROT, "tjanst.py"), "--vard", VARD, "--port", str(port),
+         "--batch-fonster-ms", str(BATCH_FONSTER_MS)],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        vanta_pa_server(f"http://{VARD}:{port}", process)
+        return asyncio.run(_kontrollera(port))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    argparse.ArgumentParser(description="Kontrollera tjänstens statuskoder och svar.").parse_args()
+    fel = kontrollera()
+    for rad in fel:
+        print("AVVIKELSE:", rad)
+    print("OK" if not fel else f"{len(fel)} avvikelser")
+    sys.exit(1 if fel else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Lastgenerator för JSON-tjänsten i tjanst.py.
+
+    python benchmarks/last.py --starta                     # startar en egen server
+    python benchmarks/last.py --url http://127.0.0.1:8765  # mot en server som redan kör
+    python benchmarks/last.py --starta --unika 0 --sekunder 10 --anslutningar 128
+
+Klienten håller --anslutningar samtidiga keep-alive-anslutningar som skickar
+enskilda scenarier till /klimatbalans så fort svaren kommer. Scenarierna dras
+slumpmässigt ur reglageintervallen. Med --unika N återanvänds N olika scenarier,
+så att svarscachen träffas; med --unika 0 är alla förfrågningar nya och varje
+svar beräknas i en mikrobatch. Resultatet är förfrågningar per sekund och
+svarstidernas percentiler, plus tjänstens egen statistik.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+KATALOG = os.path.dirname(os.path.abspath(__file__))
+ROT = os.path.dirname(KATALOG)
+sys.path.insert(0, ROT)
+
+from modell import REGLAGEINTERVALL, VIRKES_HANTERINGAR  # noqa: E402
+
+HELTAL = ("LCA_period", "rotation", "hus_livslangd", "max_years")
+
+
+def scenarier(antal, seed=0):
+    """antal slumpade scenarier som JSON-kroppar."""
+    rng = np.random.default_rng(seed)
+    kolumner = {
+        namn: (rng.integers(lag, hog + 1, antal) if namn in HELTAL else rng.uniform(lag, hog, antal))
+        for namn, (lag, hog) in REGLAGEINTERVALL.items()
+    }
+    kolumner["virkes_hantering"] = rng.choice(VIRKES_HANTERINGAR, antal)
+    kolumner["bygg_igen"] = rng.random(antal) < 0.5
+    return [
+        json.dumps({n: v[i].item() for n, v in kolumner.items()}).encode("utf-8")
+        for i in range(antal)
+    ]
+
+
+async def _forfragan(lasare, skrivare, vard, sokvag, kropp, metod="POST"):
+    skrivare.write(
+        f"{metod} {sokvag} HTTP/1.1\r\nHost: {vard}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(kropp)}\r\n\r\n".encode("latin-1") + kropp
+    )
+    huvud = await lasare.readuntil(b"\r\n\r\n")
+    status = int(huvud.split(b" ", 2)[1])
+    langd = 0
+    for rad in huvud.split(b"\r\n"):
+        if rad.lower().startswith(b"content-length:"):
+            langd = int(rad.split(b":", 1)[1])
+    return status, await lasare.readexactly(langd)
+
+
+async def _klient(vard, port, kroppar, stopp, tider, fel, index):
+    lasare, skrivare = await asyncio.open_connection(vard, port)
+    try:
+        while time.perf_counter() < stopp:
+            kropp = kroppar[next(index) % len(kroppar)]
+            start = time.perf_counter()
+            status, _ = await _forfragan(lasare, skrivare, vard, "/klimatbalans", kropp)
+            tider.append(time.perf_counter() - start)
+            if status != 200:
+                fel.append(status)
+    finally:
+        skrivare.close()
+
+
+async def kor_last(url, anslutningar, sekunder, kroppar):
+    delar = urlsplit(url)
+    vard, port = delar.hostname, delar.port or 80
+    tider, fel = [], []
+    index = iter(range(10**12))
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _klient(vard, port, kroppar, start + sekunder, tider, fel, index)
+        for _ in range(anslutningar)
+    ))
+    varaktighet = time.perf_counter() - start
+
+    lasare, skrivare = await asyncio.open_connection(vard, port)
+    _, statistik = await _forfragan(lasare, skrivare, vard, "/statistik", b"", "GET")
+    skrivare.close()
+    return np.array(tider), fel, varaktighet, json.loads(statistik)
+
+
+def vanta_pa_server(url, process, tidsgrans=30.0):
+    delar = urlsplit(url)
+    slut = time.monotonic() + tidsgrans
+    while time.monotonic() < slut:
+        if process.poll() is not None:
+            raise SystemExit("Servern avslutades innan den började lyssna")
+        try:
+            async def prova():
+                _, skrivare = await asyncio.open_connection(delar.hostname, delar.port)
+                skrivare.close()
+            asyncio.run(prova())
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit("Servern svarade inte")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--starta", action="store_true", help="starta tjanst.py som underprocess")
+    parser.add_argument("--arbetare", type=int, default=1, help="arbetare för den startade servern")
+    parser.add_argument("--anslutningar", type=int, default=64)
+    parser.add_argument("--sekunder", type=float, default=5.0)
+    parser.add_argument("--unika", type=int, default=0,
+                        help="antal olika scenarier som återanvänds (0 = alla unika)")
+    args = parser.parse_args()
+
+    process = None
+    if args.starta:
+        port = urlsplit(args.url).port
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(ROT, "tjanst.py"), "--port", str(port),
+             "--arbetare", str(args.arbetare)],
+            stdout=subprocess.DEVNULL,
+        )
+        vanta_pa_server(args.url, process)
+    try:
+        # Med alla unika dras fler scenarier än som hinner skickas
+        antal = args.unika or max(200000, int(20000 * args.sekunder))
+        kroppar = scenarier(antal)
+        tider, fel, varaktighet, statistik = asyncio.run(
+            kor_last(args.url, args.anslutningar, args.sekunder, kroppar)
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    p50, p95, p99 = np.percentile(tider, (50, 95, 99)) * 1000
+    print(f"{len(tider):,} förfrågningar på {varaktighet:.1f} s: {len(tider) / varaktighet:,.0f} förfrågningar/s")
+    print(f"svarstid p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms; fel: {len(fel)}")
+    batch = statistik["mikrobatcher"]["/klimatbalans"]
+    cache = statistik["svarscache"]
+    print(f"mikrobatcher: {batch['batcher']:,}, medelstorlek {batch['medelstorlek']:.1f}; "
+          f"svarscache: träffgrad {cache['träffgrad']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
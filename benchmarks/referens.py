@@ -0,0 +1,115 @@
+"""Ursprungliga år-för-år-loopar, bevarade som referens för golden-filerna och benchmarks.
+
+Koden är flyttad oförändrad från klimatbalanserat_trahus.py (samma loopar fanns
+i Klimatneutralt_trahus.py och klimatneutrala_trahuset.py) och från
+kolbalans() i Inbyggt_virke.py, före vektoriseringen.
+"""
+
+import numpy as np
+
+
+def simulera_loop(BTA, virke_per_m2, bonitet, rotation, hus_livslangd, max_years,
+                  klimatpåverkan_per_m2, virkes_hantering, bygg_igen):
+    years = np.arange(max_years+1)
+
+    kg_torrsubstans_per_m3 = 750
+    kolandel = 0.5
+    co2_per_kg_kol = 3.67
+
+    virkesvolym_total = BTA * virke_per_m2
+    kol_total = virkesvolym_total * kg_torrsubstans_per_m3 * kolandel
+    co2_total = kol_total * co2_per_kg_kol / 1000
+    co2_per_m3 = kg_torrsubstans_per_m3 * kolandel * co2_per_kg_kol / 1000
+
+    virke_per_ha_per_rotation = bonitet * rotation
+    skogsareal_ha = virkesvolym_total / virke_per_ha_per_rotation
+    klimatpåverkan_total = BTA * klimatpåverkan_per_m2
+
+    co2_i_skog = np.zeros_like(years, dtype=float)
+    co2_i_hus = np.zeros_like(years, dtype=float)
+
+    for t in years:
+        tid_i_rotation = t % rotation
+        co2_i_skog[t] = skogsareal_ha * bonitet * co2_per_m3 * tid_i_rotation
+
+        if bygg_igen:
+            antal_hus = t // hus_livslangd + 1
+        else:
+            antal_hus = 1 if t < hus_livslangd else 0
+
+        if virkes_hantering == "konventionell":
+            if bygg_igen:
+                tid_i_hus = t % hus_livslangd
+                if tid_i_hus < hus_livslangd:
+                    co2_i_hus[t] = co2_total
+                else:
+                    co2_i_hus[t] = 0
+            else:
+                if t < hus_livslangd:
+                    co2_i_hus[t] = co2_total
+                else:
+                    co2_i_hus[t] = 0
+
+        elif virkes_hantering in ("ateranvandning", "bioccs"):
+            if bygg_igen:
+                co2_i_hus[t] = antal_hus * co2_total  # TRAPPA
+            else:
+                if t < hus_livslangd:
+                    co2_i_hus[t] = co2_total  # BLOCK
+                else:
+                    co2_i_hus[t] = co2_total  # Blocket fortsätter
+
+        else:
+            co2_i_hus[t] = 0
+
+    klimatneutralitet = np.zeros_like(years, dtype=float)
+    for t in years:
+        if klimatpåverkan_total > 0:
+            klimatneutralitet[t] = 100 * co2_i_skog[t] / klimatpåverkan_total
+        else:
+            klimatneutralitet[t] = np.nan
+
+    cum_co2_skog = np.zeros_like(years, dtype=float)
+    cum_co2_hus = np.zeros_like(years, dtype=float)
+    cum_co2_summa = np.zeros_like(years, dtype=float)
+    for t in years:
+        if t == 0:
+            cum_co2_skog[t] = co2_i_skog[t]
+            cum_co2_hus[t] = co2_i_hus[t]
+        else:
+            if t % rotation == 0 and t != 0:
+                cum_co2_skog[t] = cum_co2_skog[t-1] + co2_i_skog[t]
+            else:
+                cum_co2_skog[t] = cum_co2_skog[t-1] + (co2_i_skog[t] - co2_i_skog[t-1])
+            cum_co2_hus[t] = cum_co2_hus[t-1] + (co2_i_hus[t] - co2_i_hus[t-1])
+        cum_co2_summa[t] = cum_co2_skog[t] + cum_co2_hus[t]
+
+    return {
+        "co2_i_skog": co2_i_skog,
+        "co2_i_hus": co2_i_hus,
+        "klimatneutralitet": klimatneutralitet,
+        "cum_co2_skog": cum_co2_skog,
+        "cum_co2_hus": cum_co2_hus,
+        "cum_co2_summa": cum_co2_summa,
+        "co2_total": np.float64(co2_total),
+        "skogsareal_ha": np.float64(skogsareal_ha),
+    }
+
+
+def kolbalans_loop(rotations_period, produkt_livslangd, kolinlagring_per_ar, andel_kol_i_virke, tidsperiod):
+    ar = np.arange(tidsperiod)
+    kol_i_skog = np.zeros(tidsperiod)
+    kol_i_produkt = np.zeros(tidsperiod)
+
+    for i in ar:
+        cykel_ar = i % rotations_period
+        kol_i_skog[i] = cykel_ar * kolinlagring_per_ar
+
+    for i in ar:
+        if i % rotations_period == 0 and i != 0:
+            kol_uttaget = rotations_period * kolinlagring_per_ar * andel_kol_i_virke
+            slut_ar = min(i + produkt_livslangd, tidsperiod)
+            kol_i_produkt[i:slut_ar] += kol_uttaget / produkt_livslangd
+
+    netto_kolbalans = kol_i_skog + kol_i_produkt
+    return ar, kol_i_skog, kol_i_produkt, netto_kolbalans
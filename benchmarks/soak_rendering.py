@@ -0,0 +1,91 @@
+"""Soaktest för figurrenderingen: kör om ritningen många gånger och följ RSS.
+
+    python benchmarks/soak_rendering.py --omkorningar 10000
+
+Med --pyplot körs det gamla mönstret (plt.subplots utan plt.close) som jämförelse.
+RSS ska ligga stilla med rendering.Diagram men växa med --pyplot. Med
+--per-session N byts sessionen efter N omkörningar: den gamla sessionens
+tillstånd släpps som när Streamlit avslutar en session, och diagrammen ska då
+frigöras av skräpsamlingen utan att RSS växer.
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modell import simulera  # noqa: E402
+from rendering import hamta_diagram  # noqa: E402
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # ru_maxrss är toppvärdet (kB på Linux, byte på macOS), men räcker för trenden
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rita_med_diagram(session, res, LCA_period, rotation):
+    fig = hamta_diagram(session, "fig1", (8, 4))
+    fig.linje("hus", res.years, res.co2_i_hus, lw=2)
+    fig.linje("skog", res.years, res.co2_i_skog, lw=2)
+    fig.vlinje("lca", LCA_period, color="red", linestyle=":")
+    fig.vlinjer("rotationer", range(0, len(res.years) - 1, rotation), color="green", alpha=0.2)
+    return fig.png()
+
+
+def rita_med_pyplot(res, LCA_period, rotation):
+    import io
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 4))
+    ax.plot(res.years, res.co2_i_hus, lw=2)
+    ax.plot(res.years, res.co2_i_skog, lw=2)
+    ax.axvline(LCA_period, color="red", linestyle=":")
+    for n in range(0, len(res.years) - 1, rotation):
+        ax.axvline(n, color="green", linestyle="--", alpha=0.2)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=200, bbox_inches="tight")
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--omkorningar", type=int, default=10000)
+    parser.add_argument("--rapportera-var", type=int, default=500)
+    parser.add_argument("--pyplot", action="store_true", help="gamla mönstret utan plt.close")
+    parser.add_argument("--per-session", type=int, default=0,
+                        help="omkörningar per session innan en ny startas (0 = en session)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    session = {}
+    start = time.perf_counter()
+    for i in range(1, args.omkorningar + 1):
+        rotation = int(rng.integers(50, 151))
+        LCA_period = int(rng.integers(30, 101))
+        res = simulera(150, 0.35, float(rng.uniform(4, 10)), rotation, 100, 200, 0.25)
+        if args.pyplot:
+            rita_med_pyplot(res, LCA_period, rotation)
+        else:
+            if args.per_session and i % args.per_session == 0:
+                session = {}
+            rita_med_diagram(session, res, LCA_period, rotation)
+        if i % args.rapportera_var == 0:
+            print(f"{i:>7} omkörningar  RSS {rss_mb():8.1f} MB  "
+                  f"{i / (time.perf_counter() - start):6.1f} omkörningar/s", flush=True)
+
+
+if __name__ == "__main__":
+    main()
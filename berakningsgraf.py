@@ -0,0 +1,318 @@
+"""Beroendegraf för inkrementell omräkning av trähusmodellen.
+
+De flesta interaktioner ändrar ett enda reglage, men modell.simulera_varianter
+räknar om alla serier. Här är modellen i stället uppdelad i noder som var och
+en bara beror på några parametrar och andra noder:
+
+    grund              co2_total och skogsareal_ha
+    klimatpaverkan     klimatpåverkan_total
+    skog               co2_i_skog (och cum_co2_skog för ett skogslandskap)
+    hus                co2_i_hus för alla slutskeden
+    klimatneutralitet  skog / klimatpaverkan
+    kumulativa         cum_co2_skog, cum_co2_hus, cum_co2_summa
+    varianter          allt ovan som ett modell.Resultat
+
+Varje nod cachas i den delade resultatcachen under en nyckel med bara de
+parametrar den beror på, direkt eller via sina beroenden. En ändrad
+klimatpåverkan räknar därför bara om klimatpaverkan, klimatneutralitet och
+varianter; skog, hus och de kumulativa serierna är cacheträffar. En ändrad
+LCA-period påverkar bara varianter, som sätter ihop de cachade serierna.
+
+Noder som beror på max_years har tiden som sista axel. Början av en serie
+beror inte på horisonten, så vid en cachemiss söks samma nod med en annan
+horisont: en längre serie kortas av och en kortare förlängs med bara de nya
+åren, om noden har en förlängningsfunktion. Det görs bara där resultatet blir
+bitidentiskt med simulera_varianter; husserierna med spridd livslängd räknas
+med FFT över hela perioden och räknas därför om.
+
+Varje nod mäts som ett steg "nod:<namn>" i matning.py med utfallet träff,
+miss, avkortad eller förlängd.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+
+from matning import matare
+from modell import (
+    SLUTSKEDEN,
+    STANDARDVARDEN,
+    Resultat,
+    grundstorheter,
+    husserie,
+    klimatneutralitetsserie,
+    kumulativa_serier,
+    skogsserie,
+)
+from resultatcache import cache, normaliserad_nyckel
+
+HORISONT = "max_years"
+HORISONT_INDEX = 4096
+
+# Slutskedet väljs först ur varianter, så virkes_hantering och bygg_igen ingår inte
+GRAFSTANDARD = {
+    **{n: v for n, v in STANDARDVARDEN.items() if n not in ("virkes_hantering", "bygg_igen")},
+    "aldersstruktur": "jamnarig",
+    "tillvaxtmodell": "linjar",
+    "livslangd": "fast",
+}
+
+
+class Nod(NamedTuple):
+    parametrar: tuple                   # parametrar som noden läser direkt
+    beroenden: tuple                    # noder vars värden skickas till berakna
+    berakna: Callable                   # berakna(p, *beroenden) -> värde
+    forlang: Optional[Callable] = None  # forlang(kort, p, *beroenden) -> värde eller None
+    avkortbar: Optional[Callable] = None  # avkortbar(p) -> om början är oberoende av horisonten
+
+
+def _avkorta(varde, langd):
+    # Första langd åren av varje array med tiden som sista axel
+    if isinstance(varde, np.ndarray):
+        return varde[..., :langd] if varde.ndim else varde
+    if isinstance(varde, tuple):
+        avkortat = [_avkorta(v, langd) for v in varde]
+        return type(varde)(*avkortat) if hasattr(varde, "_fields") else tuple(avkortat)
+    return varde
+
+
+class Graf:
+    """Noder i topologisk ordning som räknas vid behov och cachas per delnyckel."""
+
+    def __init__(self, noder, horisont=HORISONT, standard=None, resultatcache=cache):
+        self.noder = dict(noder)
+        self.horisont = horisont
+        self.standard = dict(standard or {})
+        self.cache = resultatcache
+        self._beror_pa = {}
+        for namn, nod in self.noder.items():
+            self._beror_pa[namn] = frozenset(nod.parametrar).union(
+                *(self._beror_pa[b] for b in nod.beroenden)
+            )
+        self._sorterade = {namn: tuple(sorted(p)) for namn, p in self._beror_pa.items()}
+        # Längsta beräknade horisont per nod och nyckel utan horisont
+        self._horisonter = OrderedDict()
+        self._las = threading.Lock()
+
+    def beror_pa(self, *noder):
+        """Parametrarna som noderna beror på, direkt eller via andra noder."""
+        return frozenset().union(*(self._beror_pa[n] for n in noder))
+
+    def parametrar(self, **parametrar):
+        """Parametrarna kompletterade med standardvärden."""
+        return {**self.standard, **parametrar}
+
+    def nyckel(self, noder, parametrar, *extra):
+        """Cachenyckel för noderna och parametrarna i extra, t.ex. för en figur."""
+        p = self.parametrar(**parametrar)
+        namn = self.beror_pa(*noder) | set(extra)
+        return normaliserad_nyckel(**{n: p[n] for n in namn})
+
+    def berakna(self, namn, **parametrar):
+        """Nodens värde; bara noder vars parametrar ändrats räknas om."""
+        p = self.parametrar(**parametrar)
+        # Parametrarna normaliseras en gång och varje nod väljer ut sina ur dem
+        return self._hamta(namn, p, dict(normaliserad_nyckel(**p)))
+
+    def _nyckel(self, namn, normerade, utan_horisont=False):
+        return ("graf", namn) + tuple(
+            (n, normerade[n]) for n in self._sorterade[namn]
+            if not (utan_horisont and n == self.horisont)
+        )
+
+    def _hamta(self, namn, p, normerade):
+        with matare.steg(f"nod:{namn}"):
+            utfall = []
+            varde = self.cache.hamta(
+                self._nyckel(namn, normerade), lambda: self._rakna(namn, p, normerade, utfall)
+            )
+            matare.notera(utfall[0] if utfall else "träff")
+            return varde
+
+    def _rakna(self, namn, p, normerade, utfall):
+        nod = self.noder[namn]
+        if self.horisont in self._beror_pa[namn]:
+            varde = self._annan_horisont(namn, nod, p, normerade, utfall)
+            if varde is not None:
+                return varde
+        utfall.append("miss")
+        return nod.berakna(p, *(self._hamta(b, p, normerade) for b in nod.beroenden))
+
+    def _avkortbar(self, namn, p):
+        nod = self.noder[namn]
+        return (nod.avkortbar is None or nod.avkortbar(p)) and all(
+            self._avkortbar(b, p) for b in nod.beroenden
+        )
+
+    def _annan_horisont(self, namn, nod, p, normerade, utfall):
+        # Samma nod med en annan horisont, avkortad eller förlängd, eller None
+        horisont = normerade[self.horisont]
+        utan = self._nyckel(namn, normerade, utan_horisont=True)
+        with self._las:
+            annan = self._horisonter.get(utan)
+            self._horisonter[utan] = max(horisont, annan or 0)
+            self._horisonter.move_to_end(utan)
+            if len(self._horisonter) > HORISONT_INDEX:
+                self._horisonter.popitem(last=False)
+        if annan is None or annan == horisont or not self._avkortbar(namn, p):
+            return None
+        if annan < horisont and nod.forlang is None:
+            return None
+        # Uppslaget räknades redan som miss i _hamta och räknas inte igen
+        tidigare = self.cache.hamta_om_finns(
+            self._nyckel(namn, {**normerade, self.horisont: annan}), rakna=False
+        )
+        if tidigare is None:
+            return None
+        if annan > horisont:
+            utfall.append("avkortad")
+            return _avkorta(tidigare, int(horisont) + 1)
+        varde = nod.forlang(tidigare, p, *(self._hamta(b, p, normerade) for b in nod.beroenden))
+        if varde is not None:
+            utfall.append("förlängd")
+        return varde
+
+
+def _years(p, forsta=0):
+    return np.arange(forsta, int(p["max_years"]) + 1)
+
+
+def _jamnarig(p):
+    return isinstance(p["aldersstruktur"], str) and p["aldersstruktur"] == "jamnarig"
+
+
+def _grund(p):
+    co2_total, skogsareal_ha, _ = grundstorheter(
+        p["BTA"], p["virke_per_m2"], p["bonitet"], p["rotation"], 0.0, p["tillvaxtmodell"]
+    )
+    return co2_total, skogsareal_ha
+
+
+def _klimatpaverkan(p):
+    return p["BTA"] * p["klimatpåverkan_per_m2"]
+
+
+def _skog(p, grund, forsta=0):
+    if not _jamnarig(p):
+        from skogslandskap import aldersfordelat, simulera_landskap
+
+        landskap = simulera_landskap(
+            aldersfordelat(grund[1], p["bonitet"], p["rotation"], p["aldersstruktur"]),
+            p["max_years"], p["tillvaxtmodell"],
+        )
+        return landskap.co2_i_skog, landskap.cum_co2_skog
+    co2_i_skog = skogsserie(grund[1], p["bonitet"], p["rotation"], _years(p, forsta), p["tillvaxtmodell"])
+    return co2_i_skog.astype(float), None
+
+
+def _forlang_skog(kort, p, grund):
+    # Skogslandskapet stegas år för år och räknas om från början
+    if not _jamnarig(p):
+        return None
+    return np.concatenate([kort[0], _skog(p, grund, forsta=len(kort[0]))[0]]), None
+
+
+def _hus(p, grund, forsta=0):
+    hantering, bygg = zip(*SLUTSKEDEN)
+    return husserie(
+        grund[0], p["hus_livslangd"], _years(p, forsta), np.array(hantering)[:, None],
+        np.array(bygg)[:, None], p["livslangd"],
+    )
+
+
+def _fast_livslangd(p):
+    # Spridda livslängder löser förnyelseekvationen med FFT över hela perioden,
+    # så serien kan skilja sig i sista decimalen mellan olika horisonter
+    return isinstance(p["livslangd"], str) and p["livslangd"] == "fast"
+
+
+def _forlang_hus(kort, p, grund):
+    if not _fast_livslangd(p):
+        return None
+    return np.concatenate([kort, _hus(p, grund, forsta=kort.shape[-1])], axis=-1)
+
+
+def _klimatneutralitet(p, skog, klimatpaverkan):
+    return klimatneutralitetsserie(skog[0], klimatpaverkan)
+
+
+def _forlang_klimatneutralitet(kort, p, skog, klimatpaverkan):
+    return np.concatenate([kort, klimatneutralitetsserie(skog[0][len(kort):], klimatpaverkan)])
+
+
+def _kumulativa(p, skog, hus):
+    co2_i_skog, cum_co2_skog = skog
+    kumulativa = kumulativa_serier(co2_i_skog, hus, p["rotation"], _years(p))
+    if cum_co2_skog is None:
+        return kumulativa
+    return cum_co2_skog, kumulativa[1], cum_co2_skog + kumulativa[1]
+
+
+def _fortsatt_summa(kort, steg):
+    # np.cumsum summerar sekventiellt, så att fortsätta från det sista värdet
+    # ger samma flyttal som att summera hela serien
+    forts = np.cumsum(np.concatenate([kort[..., -1:], steg], axis=-1), axis=-1)[..., 1:]
+    return np.concatenate([kort, forts], axis=-1)
+
+
+def _forlang_kumulativa(kort, p, skog, hus):
+    co2_i_skog, landskapets_cum = skog
+    n = kort[0].shape[-1]
+    years = _years(p)
+    ny_rotation = (years[n:] % p["rotation"]) == 0
+    hus_steg = hus[..., n:] - hus[..., n - 1:-1]
+    cum_co2_hus = _fortsatt_summa(kort[1], hus_steg)
+    if landskapets_cum is not None:
+        return landskapets_cum, cum_co2_hus, landskapets_cum + cum_co2_hus
+    skog_steg = np.where(ny_rotation, co2_i_skog[n:], co2_i_skog[n:] - co2_i_skog[n - 1:-1])
+    cum_co2_skog = _fortsatt_summa(kort[0], skog_steg)
+    return cum_co2_skog, cum_co2_hus, cum_co2_skog + cum_co2_hus
+
+
+def _varianter(p, grund, klimatpaverkan, skog, hus, klimatneutralitet, kumulativa):
+    return Resultat(
+        years=_years(p),
+        co2_i_skog=skog[0],
+        co2_i_hus=hus,
+        klimatneutralitet=klimatneutralitet,
+        cum_co2_skog=kumulativa[0],
+        cum_co2_hus=kumulativa[1],
+        cum_co2_summa=kumulativa[2],
+        co2_total=grund[0],
+        skogsareal_ha=grund[1],
+        klimatpåverkan_total=klimatpaverkan,
+        klimatbalans_maxandel=min(100 * p["LCA_period"] / p["rotation"], 100),
+    )
+
+
+MODELLGRAF = Graf(
+    {
+        "grund": Nod(("BTA", "virke_per_m2", "bonitet", "rotation", "tillvaxtmodell"), (), _grund),
+        "klimatpaverkan": Nod(("BTA", "klimatpåverkan_per_m2"), (), _klimatpaverkan),
+        "skog": Nod(
+            ("bonitet", "rotation", "max_years", "aldersstruktur", "tillvaxtmodell"), ("grund",),
+            _skog, _forlang_skog,
+        ),
+        "hus": Nod(
+            ("hus_livslangd", "max_years", "livslangd"), ("grund",), _hus, _forlang_hus,
+            _fast_livslangd,
+        ),
+        "klimatneutralitet": Nod(
+            (), ("skog", "klimatpaverkan"), _klimatneutralitet, _forlang_klimatneutralitet,
+        ),
+        "kumulativa": Nod(("rotation", "max_years"), ("skog", "hus"), _kumulativa, _forlang_kumulativa),
+        "varianter": Nod(
+            ("LCA_period",),
+            ("grund", "klimatpaverkan", "skog", "hus", "klimatneutralitet", "kumulativa"),
+            _varianter,
+        ),
+    },
+    standard=GRAFSTANDARD,
+)
+
+
+def varianter(**parametrar):
+    """Som modell.simulera_varianter, men räknar bara om noderna som påverkas av ändringen."""
+    return MODELLGRAF.berakna("varianter", **parametrar)
@@ -0,0 +1,153 @@
+"""Byggnadsbestånd: klimatbalans för en hel portfölj av trähus.
+
+Modellen är linjär i BTA, så ett bestånd kan beräknas som en faltning av
+byggschemat (m² BTA färdigställt per år och slutskedesklass) med responsen för
+ett hus på 1 m². Varje klass (virkes_hantering × bygg_igen) faltas för sig och
+summeras. Faltningen görs med FFT, så även långa horisonter och tiotusentals
+projekt beräknas på bråkdelen av en sekund.
+"""
+
+import csv
+import io
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+from modell import VIRKES_HANTERINGAR, simulera
+
+KLASSER = tuple((vh, bi) for vh in VIRKES_HANTERINGAR for bi in (True, False))
+
+# Serier som är linjära i BTA och därför kan faltas direkt
+LINJARA_SERIER = ("co2_i_skog", "co2_i_hus", "cum_co2_skog", "cum_co2_hus")
+
+
+class Bestandsresultat(NamedTuple):
+    years: np.ndarray  # kalenderår
+    co2_i_skog: np.ndarray
+    co2_i_hus: np.ndarray
+    klimatneutralitet: np.ndarray
+    cum_co2_skog: np.ndarray
+    cum_co2_hus: np.ndarray
+    cum_co2_summa: np.ndarray
+    byggd_bta: np.ndarray  # ackumulerad BTA, m²
+    klimatpåverkan_total: np.ndarray  # ackumulerad klimatpåverkan, ton CO₂
+
+
+def fft_faltning(a, b, langd):
+    """Faltar a och b längs sista axeln och returnerar de första langd värdena."""
+    n = a.shape[-1] + b.shape[-1] - 1
+    nfft = 1 << (n - 1).bit_length()
+    resultat = np.fft.irfft(np.fft.rfft(a, nfft) * np.fft.rfft(b, nfft), nfft)[..., :langd]
+    # Avrundningsbrus från FFT kring noll nollställs
+    brus = 1e-12 * np.abs(resultat).max(axis=-1, keepdims=True)
+    resultat[np.abs(resultat) <= brus] = 0.0
+    return resultat
+
+
+def las_projekt_csv(kalla):
+    """Läser projekt från CSV med kolumnerna ar, BTA, virkes_hantering och bygg_igen.
+
+    kalla är en sökväg eller en öppen fil (text eller binär, t.ex. en
+    uppladdad fil i Streamlit). virkes_hantering och bygg_igen är valfria och
+    får standardvärdena "ateranvandning" respektive sant. Saknas ar eller BTA,
+    eller är ett värde ogiltigt, blir det ValueError med radnumret.
+    """
+    if isinstance(kalla, (str, os.PathLike)):
+        with open(kalla, newline="", encoding="utf-8") as f:
+            return las_projekt_csv(f)
+    if not isinstance(kalla, io.TextIOBase):
+        kalla = io.TextIOWrapper(kalla, encoding="utf-8", newline="")
+
+    ar, bta, hantering, bygg = [], [], [], []
+    lasare = csv.DictReader(kalla)
+    saknas = [k for k in ("ar", "BTA") if k not in (lasare.fieldnames or ())]
+    if saknas:
+        raise ValueError(f"Kolumner saknas: {', '.join(saknas)}")
+    for nummer, rad in enumerate(lasare, start=2):
+        try:
+            ar.append(int(rad["ar"]))
+            bta.append(float(rad["BTA"]))
+        except (TypeError, ValueError) as fel:
+            raise ValueError(f"Rad {nummer}: {fel}") from None
+        hantering.append(rad.get("virkes_hantering") or "ateranvandning")
+        bygg.append((rad.get("bygg_igen") or "1").strip().lower() in ("1", "true", "ja", "sant"))
+    return {
+        "ar": np.array(ar, dtype=np.int64),
+        "BTA": np.array(bta),
+        "virkes_hantering": np.array(hantering),
+        "bygg_igen": np.array(bygg, dtype=bool),
+    }
+
+
+def byggschema(ar, BTA, virkes_hantering="ateranvandning", bygg_igen=True, startar=None,
+               max_years=200):
+    """Summerar projekt till m² BTA per år och klass, en array med formen (klass × år).
+
+    Projekt före startar eller efter horisonten tas inte med. Utan startar
+    börjar schemat med det första projektets år, och en tom projektlista ger
+    då ValueError.
+    """
+    ar = np.asarray(ar, dtype=np.int64)
+    BTA = np.asarray(BTA, dtype=float)
+    virkes_hantering = np.broadcast_to(np.asarray(virkes_hantering), ar.shape)
+    bygg_igen = np.broadcast_to(np.asarray(bygg_igen, dtype=bool), ar.shape)
+    if startar is None:
+        if ar.size == 0:
+            raise ValueError("Projektlistan är tom; ange minst ett projekt eller startar")
+        startar = int(ar.min())
+
+    okanda = set(np.unique(virkes_hantering)) - set(VIRKES_HANTERINGAR)
+    if okanda:
+        raise ValueError(f"Okänd virkes_hantering: {', '.join(sorted(okanda))}")
+    klass = np.zeros(ar.shape, dtype=np.int64)
+    for i, (vh, bi) in enumerate(KLASSER):
+        klass[(virkes_hantering == vh) & (bygg_igen == bi)] = i
+
+    relativt_ar = ar - startar
+    med = (relativt_ar >= 0) & (relativt_ar <= max_years)
+    schema = np.bincount(
+        klass[med] * (max_years + 1) + relativt_ar[med],
+        weights=BTA[med],
+        minlength=len(KLASSER) * (max_years + 1),
+    )
+    return schema.reshape(len(KLASSER), max_years + 1), startar
+
+
+def simulera_bestand(schema, virke_per_m2, bonitet, rotation, hus_livslangd,
+                     klimatpåverkan_per_m2, startar=0):
+    """Beräknar aggregerade serier för ett byggschema från byggschema()."""
+    max_years = schema.shape[-1] - 1
+    respons = np.stack([
+        np.stack([
+            getattr(res, serie) for serie in LINJARA_SERIER
+        ])
+        for res in (
+            simulera(1, virke_per_m2, bonitet, rotation, hus_livslangd, max_years,
+                     klimatpåverkan_per_m2, vh, bi)
+            for vh, bi in KLASSER
+        )
+    ])  # (klass × serie × år), per m² BTA
+
+    aktiva = schema.any(axis=-1)
+    serier = fft_faltning(schema[aktiva, None, :], respons[aktiva], max_years + 1).sum(axis=0)
+    co2_i_skog, co2_i_hus, cum_co2_skog, cum_co2_hus = serier
+
+    byggd_bta = np.cumsum(schema.sum(axis=0))
+    klimatpåverkan_total = byggd_bta * klimatpåverkan_per_m2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        klimatneutralitet = np.where(
+            klimatpåverkan_total > 0, 100 * co2_i_skog / klimatpåverkan_total, np.nan
+        )
+
+    return Bestandsresultat(
+        years=startar + np.arange(max_years + 1),
+        co2_i_skog=co2_i_skog,
+        co2_i_hus=co2_i_hus,
+        klimatneutralitet=klimatneutralitet,
+        cum_co2_skog=cum_co2_skog,
+        cum_co2_hus=cum_co2_hus,
+        cum_co2_summa=cum_co2_skog + cum_co2_hus,
+        byggd_bta=byggd_bta,
+        klimatpåverkan_total=klimatpåverkan_total,
+    )
@@ -0,0 +1,158 @@
+"""Dynamisk LCA: strålningsdrivning och tidsberoende GWP för modellens CO₂-flöden.
+
+Klimatneutraliteten jämför förråd av CO₂ utan hänsyn till när utsläpp och
+upptag sker. Här följs i stället varje års nettoflöde till atmosfären med
+en impulssvarsfunktion för CO₂ (Bern-modellen med IPCC AR5:s parametrar,
+Joos m.fl. 2013). Andelen av en puls som finns kvar i atmosfären efter t år är
+
+    g(t) = a0 + Σ a_i · exp(-t / τ_i)
+
+och den tillskjutna strålningsdrivningen är STRALNINGSEFFEKT · g(t) per ton.
+För en flödesserie e(s) (ton CO₂ år s, positivt = utsläpp) blir:
+
+- CO₂ i atmosfären: C(t) = Σ_s e(s) · g(t - s);
+- strålningsdrivningen: F(t) = STRALNINGSEFFEKT · C(t) (W/m²);
+- den kumulativa strålningsdrivningen: Σ_s e(s) · AGWP(t - s) (W·år/m²),
+  där AGWP(t) är integralen av drivningen från en puls på ett ton;
+- den tidsberoende GWP:n: den kumulativa drivningen delad med AGWP(t) för
+  en puls år 0, dvs. hur många ton CO₂ som släppta år 0 ger samma
+  uppvärmningseffekt fram till år t (ton CO₂-ekv).
+
+Summorna är faltningar längs tiden. De räknas med FFT i O(T log T) per
+scenario i stället för O(T²). Kärnornas spektra cachas per FFT-längd.
+Flödesserierna kan ha godtyckliga ledande axlar (ett scenario per rad) och
+räknas i block om BLOCKSTORLEK rader så att minnet hålls begränsat även för
+stora svep med långa horisonter.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+# Bern-modellens impulssvar för CO₂ (IPCC AR5 WG1 kap. 8, tabell 8.SM.10)
+BERN_A0 = 0.2173
+BERN_A = (0.2240, 0.2824, 0.2763)
+BERN_TAU = (394.4, 36.54, 4.304)
+# Strålningseffekt för CO₂ (W/m² per ton): 1,37e-5 W/m² per ppb enligt AR5,
+# där 1 ppb CO₂ motsvarar 7,80e6 ton
+STRALNINGSEFFEKT = 1.37e-5 / 7.80e6
+TIDSHORISONT = 100
+BLOCKSTORLEK = 4096
+KARN_CACHE = 32
+
+
+class DynamiskLCA(NamedTuple):
+    years: np.ndarray
+    flode: np.ndarray                  # nettoflöde till atmosfären, ton CO₂ per år
+    co2_i_atmosfar: np.ndarray         # kvarvarande tillskott i atmosfären, ton CO₂
+    stralningsdrivning: np.ndarray     # W/m²
+    kumulativ_drivning: np.ndarray     # W·år/m²
+    tidsberoende_gwp: np.ndarray       # ton CO₂-ekv för analys fram till varje år
+    gwp_tidshorisont: np.ndarray       # ton CO₂-ekv vid tidshorisonten
+    statisk_gwp: np.ndarray            # summan av flödena, som i en statisk LCA
+
+
+def impulssvar(t):
+    """Andelen av en CO₂-puls som finns kvar i atmosfären efter t år."""
+    t = np.asarray(t, dtype=float)
+    return BERN_A0 + sum(a * np.exp(-t / tau) for a, tau in zip(BERN_A, BERN_TAU))
+
+
+def agwp(t):
+    """Integrerad strålningsdrivning (W·år/m²) t år efter en puls på ett ton CO₂."""
+    t = np.asarray(t, dtype=float)
+    integral = BERN_A0 * t + sum(
+        a * tau * -np.expm1(-t / tau) for a, tau in zip(BERN_A, BERN_TAU)
+    )
+    return STRALNINGSEFFEKT * integral
+
+
+@lru_cache(maxsize=KARN_CACHE)
+def _spektrum(karna, langd, fft_langd):
+    t = np.arange(langd)
+    serie = impulssvar(t) if karna == "impulssvar" else agwp(t)
+    spektrum = np.fft.rfft(serie, fft_langd)
+    spektrum.flags.writeable = False
+    return spektrum
+
+
+def faltning(flode, *karnor):
+    """Σ_s flode(s) · karna(t - s) längs sista axeln för varje karna, med FFT.
+
+    Kärnorna är "impulssvar" eller "agwp". Flödets spektrum räknas en gång och
+    delas av kärnorna. Returnerar en array per kärna med samma form som flode.
+    """
+    flode = np.asarray(flode, dtype=float)
+    langd = flode.shape[-1]
+    # Nollutfyllnad till minst 2T - 1 så att den cirkulära faltningen blir linjär
+    fft_langd = 1 << max(2 * langd - 2, 1).bit_length()
+    spektra = [_spektrum(karna, langd, fft_langd) for karna in karnor]
+    rader = flode.reshape(-1, langd)
+    ut = [np.empty_like(rader) for _ in karnor]
+    for start in range(0, len(rader), BLOCKSTORLEK):
+        del_ = slice(start, start + BLOCKSTORLEK)
+        block = np.fft.rfft(rader[del_], fft_langd)
+        for resultat, spektrum in zip(ut, spektra):
+            resultat[del_] = np.fft.irfft(block * spektrum, fft_langd)[:, :langd]
+    return [resultat.reshape(flode.shape) for resultat in ut]
+
+
+def flodesserie(cum_co2_skog, co2_i_hus, klimatpåverkan_total):
+    """Nettoflödet till atmosfären per år (ton CO₂) ur modellens serier.
+
+    - Husets klimatpåverkan släpps ut år 0.
+    - Skogens upptag är ökningen i cum_co2_skog; avverkningen är en
+      överföring till produkter och inget utsläpp, som i kumulativa_serier.
+    - När förrådet i huset minskar, t.ex. när virket bränns
+      konventionellt vid rivning, släpps det kolet ut.
+
+    Serierna har tiden som sista axel; klimatpåverkan_total broadcastas mot de
+    ledande axlarna.
+    """
+    cum_co2_skog = np.asarray(cum_co2_skog, dtype=float)
+    co2_i_hus = np.asarray(co2_i_hus, dtype=float)
+    upptag = np.diff(cum_co2_skog, axis=-1, prepend=cum_co2_skog[..., :1])
+    frislappt = np.maximum(-np.diff(co2_i_hus, axis=-1, prepend=co2_i_hus[..., :1]), 0.0)
+    flode = frislappt - upptag
+    flode[..., 0] += klimatpåverkan_total
+    return flode
+
+
+def dynamisk_lca(flode, tidshorisont=TIDSHORISONT, horisont=None):
+    """Dynamisk LCA för flödesserier (ton CO₂ per år, tiden som sista axel).
+
+    horisont förlänger analysen till år horisont med flödet noll efter seriens
+    slut; tidshorisont är året som gwp_tidshorisont avläses vid.
+    """
+    flode = np.asarray(flode, dtype=float)
+    horisont = max(horisont or 0, tidshorisont, flode.shape[-1] - 1)
+    if flode.shape[-1] < horisont + 1:
+        utfyllnad = [(0, 0)] * (flode.ndim - 1) + [(0, horisont + 1 - flode.shape[-1])]
+        flode = np.pad(flode, utfyllnad)
+    years = np.arange(horisont + 1)
+
+    co2_i_atmosfar, kumulativ_drivning = faltning(flode, "impulssvar", "agwp")
+    referens = agwp(years)
+    tidsberoende_gwp = np.empty_like(kumulativ_drivning)
+    tidsberoende_gwp[..., 1:] = kumulativ_drivning[..., 1:] / referens[1:]
+    # Gränsvärdet när t går mot 0 är flödet år 0
+    tidsberoende_gwp[..., 0] = flode[..., 0]
+    return DynamiskLCA(
+        years=years,
+        flode=flode,
+        co2_i_atmosfar=co2_i_atmosfar,
+        stralningsdrivning=STRALNINGSEFFEKT * co2_i_atmosfar,
+        kumulativ_drivning=kumulativ_drivning,
+        tidsberoende_gwp=tidsberoende_gwp,
+        gwp_tidshorisont=tidsberoende_gwp[..., tidshorisont],
+        statisk_gwp=flode[..., :tidshorisont + 1].sum(axis=-1),
+    )
+
+
+def for_resultat(res, tidshorisont=TIDSHORISONT, horisont=None):
+    """Dynamisk LCA för ett modell.Resultat."""
+    return dynamisk_lca(
+        flodesserie(res.cum_co2_skog, res.co2_i_hus, res.klimatpåverkan_total),
+        tidshorisont, horisont,
+    )
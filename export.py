@@ -0,0 +1,293 @@
+"""Export av tidsserier och scenarioresultat till CSV, Parquet och Excel.
+
+En tabell är en generator av block: dictar med en 1-D-array per kolumn, lika
+långa inom blocket och med samma kolumner i alla block. Skrivarna går igenom
+blocken ett i taget och skriver dem direkt till filen. Hela tabellen byggs
+alltså aldrig upp i minnet, och miljontals rader kan strömmas från ett svep
+eller en Monte Carlo-körning.
+
+- serier(): ett block med serierna från en enskild körning (en rad per år);
+- langt_format(): matriser (scenario × år) i långt format, en rad per scenario
+  och år, med scenariots parametrar upprepade på varje rad;
+- svep_tabell(): som langt_format() men direkt från svep.svep_chunkar(), så att
+  bara ett block scenarier i taget räknas och hålls i minnet;
+- montecarlo_tabell(): Monte Carlo-analysens enskilda stickprov, block för block.
+
+Med kompakt=True sparas flyttal som float32. I Parquet dictionary-kodas dessutom
+alla övriga kolumner (scenarionummer, år, virkeshantering, …), som upprepas
+på många rader. CSV skrivs med kortaste decimalform för respektive precision.
+Excel-filen (.xlsx) skrivs med zipfile ur standardbiblioteket i ett enda
+kalkylblad, så den rymmer högst EXCEL_MAX_RADER rader inklusive rubrikraden.
+"""
+
+import csv
+import importlib.util
+import io
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+BLOCKSTORLEK = 65536
+EXCEL_MAX_RADER = 1048576
+# Streamlit håller nedladdningar i minnet, så appen erbjuder bara mindre tabeller
+APP_MAX_RADER = 5000000
+
+FORMAT = {
+    "csv": ("CSV", "text/csv"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet"),
+    "xlsx": ("Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def serier(**kolumner):
+    """Generator med ett block ur lika långa serier, t.ex. serier(ar=years, co2_i_hus=...)."""
+    yield {namn: np.asarray(varden) for namn, varden in kolumner.items()}
+
+
+def langt_format(years, matriser, scenarier=None, forsta=0, blockstorlek=BLOCKSTORLEK):
+    """Generator med block i långt format ur matriser med formen (scenario × år).
+
+    scenarier innehåller en array per scenario (parametrar, etiketter) som
+    upprepas för varje år. Serier som är lika för alla scenarier kan ges som
+    1-D-arrayer. Utan en kolumn "scenario" numreras scenarierna från forsta.
+    Varje block har högst blockstorlek rader, men minst ett scenario.
+    """
+    years = np.asarray(years)
+    scenarier = dict(scenarier or {})
+    antal = max([len(np.atleast_2d(m)) for m in matriser.values()]
+                + [np.size(v) for v in scenarier.values()])
+    matriser = {n: np.broadcast_to(m, (antal, len(years))) for n, m in matriser.items()}
+    if "scenario" not in scenarier:
+        scenarier = {"scenario": np.arange(forsta, forsta + antal), **scenarier}
+    per_block = max(1, blockstorlek // len(years))
+    for start in range(0, antal, per_block):
+        del_ = slice(start, min(start + per_block, antal))
+        block = {
+            namn: np.repeat(np.broadcast_to(varden, (antal,))[del_], len(years))
+            for namn, varden in scenarier.items()
+        }
+        block["ar"] = np.tile(years, del_.stop - start)
+        block.update({namn: np.asarray(m)[del_].ravel() for namn, m in matriser.items()})
+        yield block
+
+
+def svep_tabell(max_years=200, serier=None, blockstorlek=BLOCKSTORLEK, **parametrar):
+    """Kör svep.svep_chunkar() och ger resultatet som block i långt format.
+
+    Parametrarna är desamma som för svep.svep(); de som varierar mellan
+    scenarierna tas med som kolumner. Andra namn, t.ex. LCA_period i appens
+    parametrar eller modell.STANDARDVARDEN, påverkar inte serierna och hoppas över.
+    """
+    from svep import PARAMETRAR, SERIER, _parametrar, modellval, svep_chunkar
+
+    scenarier = {n: v for n, v in parametrar.items() if n in PARAMETRAR}
+    p = _parametrar(scenarier)
+    varierar = {n: a for n, a in p.items() if len(np.unique(a)) > 1}
+    years = np.arange(max_years + 1)
+    for del_, block in svep_chunkar(
+        max_years, serier=serier or SERIER, **modellval(parametrar), **scenarier
+    ):
+        yield from langt_format(
+            years,
+            {n: block[n] for n in (serier or SERIER)},
+            {n: a[del_] for n, a in varierar.items()},
+            forsta=del_.start,
+            blockstorlek=blockstorlek,
+        )
+
+
+def montecarlo_tabell(centrum, osakerhet, antal=10000, max_years=200, seed=0,
+                      blockstorlek=BLOCKSTORLEK):
+    """De enskilda stickproven från montecarlo.stickprov() som block i långt format.
+
+    Varje rad är ett stickprov och ett år, med de dragna parametrarna som kolumner.
+    """
+    from montecarlo import stickprov
+
+    years = np.arange(max_years + 1)
+    for del_, dragna, matriser in stickprov(centrum, osakerhet, antal, max_years, seed):
+        yield from langt_format(years, matriser, dragna, forsta=del_.start, blockstorlek=blockstorlek)
+
+
+def _csv_text(kolumn, kompakt):
+    # Kolumnens värden som CSV-fält; flyttal i kortaste decimalform för precisionen
+    kolumn = np.asarray(kolumn)
+    if kolumn.dtype.kind == "f":
+        if kompakt:
+            return kolumn.astype(np.float32).astype(str).tolist()
+        return list(map(repr, kolumn.tolist()))
+    if kolumn.dtype.kind in "biu":
+        return list(map(str, kolumn.tolist()))
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows([v] for v in kolumn.tolist())
+    return buf.getvalue().splitlines()
+
+
+def skriv_csv(block, fil, kompakt=False):
+    """Skriver blocken som CSV med rubrikrad till en binär fil."""
+    rubrik = None
+    for b in block:
+        if rubrik is None:
+            rubrik = list(b)
+            fil.write(",".join(_csv_text(np.array(rubrik), False)).encode("utf-8") + b"\r\n")
+        rader = zip(*(_csv_text(b[namn], kompakt) for namn in rubrik))
+        fil.write(("".join(",".join(rad) + "\r\n" for rad in rader)).encode("utf-8"))
+
+
+def skriv_parquet(block, fil, kompakt=False):
+    """Skriver blocken som Parquet, en radgrupp per block."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as fel:
+        raise SystemExit("Parquet kräver pyarrow: pip install pyarrow") from fel
+
+    def kolumn(varden):
+        varden = np.asarray(varden)
+        if not kompakt:
+            return pa.array(varden)
+        if varden.dtype.kind == "f":
+            return pa.array(varden.astype(np.float32))
+        return pa.array(varden).dictionary_encode()
+
+    skrivare = None
+    try:
+        for b in block:
+            tabell = pa.table({namn: kolumn(varden) for namn, varden in b.items()})
+            if skrivare is None:
+                skrivare = pq.ParquetWriter(fil, tabell.schema)
+            skrivare.write_table(tabell.cast(skrivare.schema))
+    finally:
+        if skrivare is not None:
+            skrivare.close()
+
+
+_XLSX_FILER = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Data" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _celler(kolumn, kompakt=False):
+    # XML för en kolumns celler; NaN och oändligheter blir tomma celler
+    kolumn = np.asarray(kolumn)
+    if kolumn.dtype.kind == "b":
+        return ['<c t="b"><v>1</v></c>' if v else '<c t="b"><v>0</v></c>' for v in kolumn.tolist()]
+    if kolumn.dtype.kind in "iuf":
+        celler = [f"<c><v>{v}</v></c>" for v in _csv_text(kolumn, kompakt)]
+        if kolumn.dtype.kind == "f" and not np.isfinite(kolumn).all():
+            for i in np.flatnonzero(~np.isfinite(kolumn)).tolist():
+                celler[i] = "<c/>"
+        return celler
+    return [f'<c t="inlineStr"><is><t>{escape(str(v))}</t></is></c>' for v in kolumn.tolist()]
+
+
+def skriv_excel(block, fil, kompakt=False):
+    """Skriver blocken som ett kalkylblad i en .xlsx-fil.
+
+    Cellerna skrivs direkt till zipfilen block för block. ValueError om
+    tabellen inte ryms i ett kalkylblad.
+    """
+    with zipfile.ZipFile(fil, "w", zipfile.ZIP_DEFLATED) as arkiv:
+        for namn, innehall in _XLSX_FILER.items():
+            arkiv.writestr(namn, innehall)
+        with arkiv.open("xl/worksheets/sheet1.xml", "w") as blad:
+            blad.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetData>'
+            )
+            rader = 0
+            for b in block:
+                if rader == 0:
+                    blad.write(("<row>" + "".join(_celler(list(b))) + "</row>").encode("utf-8"))
+                    rader = 1
+                rader += len(next(iter(b.values())))
+                if rader > EXCEL_MAX_RADER:
+                    raise ValueError(
+                        f"Excel rymmer högst {EXCEL_MAX_RADER:,} rader, välj CSV eller Parquet"
+                    )
+                kolumner = [_celler(v, kompakt) for v in b.values()]
+                blad.write("".join(
+                    "<row>" + "".join(rad) + "</row>" for rad in zip(*kolumner)
+                ).encode("utf-8"))
+            blad.write(b"</sheetData></worksheet>")
+
+
+SKRIVARE = {"csv": skriv_csv, "parquet": skriv_parquet, "xlsx": skriv_excel}
+
+
+def skriv(block, sokvag, format_=None, kompakt=False):
+    """Skriver tabellen till sokvag; formatet tas från filändelsen om det inte anges."""
+    format_ = format_ or sokvag.rsplit(".", 1)[-1].lower()
+    if format_ not in SKRIVARE:
+        raise ValueError(f"Okänt exportformat: {format_!r}, välj bland {tuple(SKRIVARE)}")
+    with open(sokvag, "wb") as fil:
+        SKRIVARE[format_](block, fil, kompakt)
+
+
+def som_bytes(block, format_="csv", kompakt=False):
+    """Skriver tabellen till minnet och returnerar filens innehåll."""
+    fil = io.BytesIO()
+    SKRIVARE[format_](block, fil, kompakt)
+    return fil.getvalue()
+
+
+def tillgangliga_format():
+    """Exportformaten som går att skriva här (Parquet kräver pyarrow)."""
+    return [f for f in FORMAT if f != "parquet" or importlib.util.find_spec("pyarrow")]
+
+
+def exportval(plats, nyckel):
+    """Reglage för format och kompakt lagring i Streamlit; returnerar (format_, kompakt)."""
+    kol1, kol2 = plats.columns(2)
+    format_ = kol1.radio(
+        "Format", tillgangliga_format(), horizontal=True, format_func=lambda f: FORMAT[f][0],
+        key=f"{nyckel}_format",
+    )
+    kompakt = kol2.checkbox(
+        "Kompakt (float32, dictionary-kodade scenariokolumner)", key=f"{nyckel}_kompakt",
+    )
+    return format_, kompakt
+
+
+def nedladdningsknapp(plats, etikett, filnamn, tabell, format_, kompakt, nyckel):
+    """Nedladdningsknapp i Streamlit för tabellen som tabell() ger.
+
+    Filen skrivs först när knappen klickas, så en omkörning kostar ingenting.
+    """
+    plats.download_button(
+        etikett, lambda: som_bytes(tabell(), format_, kompakt), f"{filnamn}.{format_}",
+        FORMAT[format_][1], key=nyckel, on_click="ignore",
+    )
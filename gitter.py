@@ -0,0 +1,215 @@
+"""Förberäknat, minnesmappat gitter med modellens serier för alla reglagelägen.
+
+Alla serier i modellen är proportionella mot virkesvolymen BTA · virke_per_m2,
+och boniteten tar ut sig i skogsserien eftersom skogsarealen är omvänt
+proportionell mot den. Normaliserade per m³ virke beror serierna därför bara på
+rotationen (skogen) respektive husets livslängd, virkeshantering och nybygge
+(huset). Hela reglagegittret ryms då i några MB:
+
+- skog.npy (2, rotation, år): co2_i_skog och cum_co2_skog per m³ virke;
+- hus.npy (2, virkes_hantering, bygg_igen, hus_livslangd, år): co2_i_hus och
+  cum_co2_hus per m³ virke;
+- index.json: gittrets axlar och modellens konstanter.
+
+Filerna öppnas minnesmappade, så en uppslagning läser raderna direkt ur
+operativsystemets sidcache utan att kopiera dem, och alla serverprocesser på
+samma maskin delar samma minne. Kvar per interaktion är en skalning av några
+hundra värden, oavsett parametrar. BTA, virke_per_m2, bonitet och
+klimatpåverkan_per_m2 skalas kontinuerligt och behöver inte ligga på
+reglagens steg.
+
+    python gitter.py [katalog]      # bygg gittret
+
+Katalogen sätts med miljövariabeln KLIMAT_GITTER (standard gitter/ bredvid
+modulen). Saknas gittret, eller ligger parametrarna utanför det, returnerar
+sla_upp() None och motor.py räknar som vanligt med modell.simulera. Serierna
+stämmer med modell.simulera på avrundningsfelet när (relativt ~1e-15).
+"""
+
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+
+from modell import (
+    REGLAGEINTERVALL,
+    VIRKES_HANTERINGAR,
+    Resultat,
+    co2_per_m3,
+    grundstorheter,
+    husserie,
+    kumulativa_serier,
+    maxandel,
+    skogsserie,
+)
+
+VERSION = 1
+KATALOG = os.environ.get(
+    "KLIMAT_GITTER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gitter")
+)
+MAX_AR = REGLAGEINTERVALL["max_years"][1]
+BYGG_IGEN = (False, True)
+
+_oppnade = {}
+_las = threading.Lock()
+
+
+def _index():
+    return {
+        "version": VERSION,
+        "co2_per_m3": co2_per_m3,
+        "max_years": MAX_AR,
+        "rotation": list(REGLAGEINTERVALL["rotation"]),
+        "hus_livslangd": list(REGLAGEINTERVALL["hus_livslangd"]),
+        "virkes_hantering": list(VIRKES_HANTERINGAR),
+        "bygg_igen": list(BYGG_IGEN),
+    }
+
+
+def bygg(katalog=KATALOG):
+    """Beräknar gittret och skriver det till katalog; returnerar filstorleken i byte."""
+    index = _index()
+    years = np.arange(MAX_AR + 1)
+    rotationer = np.arange(index["rotation"][0], index["rotation"][1] + 1)[:, None]
+    livslangder = np.arange(index["hus_livslangd"][0], index["hus_livslangd"][1] + 1)
+
+    # Enhetshus: BTA = virke_per_m2 = 1 ger 1 m³ virke, bonitet = 1
+    co2_total, skogsareal, _ = grundstorheter(1.0, 1.0, 1.0, rotationer, 1.0)
+    co2_i_skog = skogsserie(skogsareal, 1.0, rotationer, years).astype(float)
+    cum_co2_skog = kumulativa_serier(co2_i_skog, np.zeros_like(co2_i_skog), rotationer, years)[0]
+
+    hantering, bygg_igen, livslangd = np.meshgrid(
+        np.array(VIRKES_HANTERINGAR), np.array(BYGG_IGEN), livslangder, indexing="ij"
+    )
+    co2_i_hus = husserie(
+        co2_total, livslangd[..., None], years, hantering[..., None], bygg_igen[..., None]
+    )
+    # Samma summering som kumulativa_serier: första värdet och sedan årsförändringarna
+    cum_co2_hus = np.cumsum(np.diff(co2_i_hus, axis=-1, prepend=0.0), axis=-1)
+
+    os.makedirs(katalog, exist_ok=True)
+    filer = {"skog.npy": np.stack([co2_i_skog, cum_co2_skog]),
+             "hus.npy": np.stack([co2_i_hus, cum_co2_hus])}
+    # Filerna byts atomärt och index.json sist, så att processer som läser
+    # samtidigt aldrig ser ett halvskrivet gitter
+    for namn, data in filer.items():
+        tillfallig = os.path.join(katalog, namn + ".tmp")
+        with open(tillfallig, "wb") as f:
+            np.save(f, data)
+        os.replace(tillfallig, os.path.join(katalog, namn))
+    tillfallig = os.path.join(katalog, "index.json.tmp")
+    with open(tillfallig, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tillfallig, os.path.join(katalog, "index.json"))
+    with _las:
+        _oppnade.pop(katalog, None)
+    return sum(os.path.getsize(os.path.join(katalog, namn)) for namn in filer)
+
+
+def oppna(katalog=KATALOG):
+    """Öppnar gittret minnesmappat; None om det saknas eller är byggt för en annan modell."""
+    with _las:
+        if katalog in _oppnade:
+            return _oppnade[katalog]
+    try:
+        with open(os.path.join(katalog, "index.json"), encoding="utf-8") as f:
+            index = json.load(f)
+        skog = np.load(os.path.join(katalog, "skog.npy"), mmap_mode="r")
+        hus = np.load(os.path.join(katalog, "hus.npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        # Försöks igen vid nästa anrop, så ett gitter som byggs medan appen kör tas i bruk
+        return None
+    if index != _index():
+        return None
+    gitter = (skog, hus)
+    with _las:
+        _oppnade[katalog] = gitter
+    return gitter
+
+
+def _position(varde, intervall):
+    """Radindex för ett heltalsvärde inom intervallet, annars None."""
+    varde = float(varde)
+    if not varde.is_integer() or not intervall[0] <= varde <= intervall[1]:
+        return None
+    return int(varde) - intervall[0]
+
+
+def sla_upp(
+    BTA,
+    virke_per_m2,
+    bonitet,
+    rotation,
+    hus_livslangd,
+    max_years,
+    klimatpåverkan_per_m2,
+    virkes_hantering="ateranvandning",
+    bygg_igen=True,
+    LCA_period=50,
+    aldersstruktur="jamnarig",
+    tillvaxtmodell="linjar",
+    livslangd="fast",
+    katalog=KATALOG,
+):
+    """Samma Resultat som modell.simulera, läst ur gittret; None om gittret inte täcker parametrarna."""
+    gitter = oppna(katalog)
+    if gitter is None or virkes_hantering not in VIRKES_HANTERINGAR:
+        return None
+    if not (isinstance(aldersstruktur, str) and aldersstruktur == "jamnarig"):
+        # Skogslandskap med åldersklasser finns inte i gittret
+        return None
+    if tillvaxtmodell != "linjar":
+        # Med icke-linjära kurvor räknas modellen via de cachade tillväxttabellerna
+        return None
+    if not (isinstance(livslangd, str) and livslangd == "fast"):
+        # Spridda livslängder räknas med överlevnadskurvorna i livslangd.py
+        return None
+    if not (BTA > 0 and virke_per_m2 >= 0 and bonitet > 0 and klimatpåverkan_per_m2 > 0):
+        # Nollor och negativa värden ger NaN i modellen och räknas som vanligt
+        return None
+    r = _position(rotation, REGLAGEINTERVALL["rotation"])
+    h = _position(hus_livslangd, REGLAGEINTERVALL["hus_livslangd"])
+    t = _position(max_years, (0, MAX_AR))
+    if r is None or h is None or t is None:
+        return None
+
+    skog, hus = gitter
+    antal = t + 1
+    # Vyer in i de minnesmappade filerna; inget kopieras förrän de skalas nedan
+    skog = skog[:, r, :antal]
+    hus = hus[:, VIRKES_HANTERINGAR.index(virkes_hantering), int(bool(bygg_igen)), h, :antal]
+
+    co2_total, skogsareal_ha, klimatpåverkan_total = grundstorheter(
+        BTA, virke_per_m2, bonitet, rotation, klimatpåverkan_per_m2
+    )
+    virkesvolym = BTA * virke_per_m2
+    co2_i_skog = virkesvolym * skog[0]
+    cum_co2_skog = virkesvolym * skog[1]
+    cum_co2_hus = virkesvolym * hus[1]
+    return Resultat(
+        years=np.arange(antal),
+        co2_i_skog=co2_i_skog,
+        co2_i_hus=virkesvolym * hus[0],
+        klimatneutralitet=co2_i_skog * (100 / klimatpåverkan_total),
+        cum_co2_skog=cum_co2_skog,
+        cum_co2_hus=cum_co2_hus,
+        cum_co2_summa=cum_co2_skog + cum_co2_hus,
+        co2_total=co2_total,
+        skogsareal_ha=skogsareal_ha,
+        klimatpåverkan_total=klimatpåverkan_total,
+        klimatbalans_maxandel=float(maxandel(LCA_period, rotation)),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bygg det förberäknade reglagegittret.")
+    parser.add_argument("katalog", nargs="?", default=KATALOG)
+    args = parser.parse_args()
+    storlek = bygg(args.katalog)
+    print(f"Gitter skrivet till {args.katalog} ({storlek / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
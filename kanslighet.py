@@ -0,0 +1,248 @@
+"""Global känslighetsanalys (Sobol och Morris) av klimatbalansmodellen.
+
+Utfallet är en serie från svep.berakna_block() avläst vid LCA-periodens slut,
+som standard klimatneutraliteten. Parametrarna varieras över hela
+reglageintervallen (modell.REGLAGEINTERVALL); övriga parametrar hålls fasta
+på centrumvärdena, dvs. reglagens aktuella värden. Modellvalen i centrum
+(tillväxtkurva, husens livslängd och skogens åldersstruktur, se
+svep.MODELLVAL) gäller alla körningar.
+
+- Sobol: Saltelli-design med matriserna A, B och AB_i, totalt N·(k+2)
+  modellkörningar. Första ordningens index skattas enligt Saltelli m.fl. (2010)
+  och totala index enligt Jansen (1999). Konfidensintervallen tas fram med
+  bootstrap över de N basraderna.
+- Morris: r slumpade trajektorier på ett rutnät med p nivåer, totalt r·(k+1)
+  körningar. Elementäreffekterna anges i enhetskubens skala, dvs. per hela
+  reglageintervallet, så att parametrarna är direkt jämförbara.
+
+Designerna dras blockvis med en egen slumpgenerator per block (härledd ur
+fröet) och blocken kan köras i en processpool. Resultatet blir därmed identiskt
+oavsett antalet processer, på samma sätt som i montecarlo.py.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from modell import REGLAGEINTERVALL
+from svep import PARAMETRAR, STANDARDVARDEN, berakna_block, modellval
+
+KANSLIGHET_CHUNK = 16384
+BOOTSTRAP = 200
+
+KANSLIGHETSPARAMETRAR = (
+    "bonitet",
+    "rotation",
+    "virke_per_m2",
+    "klimatpåverkan_per_m2",
+    "hus_livslangd",
+    "LCA_period",
+)
+HELTALSPARAMETRAR = ("rotation", "hus_livslangd", "LCA_period")
+
+
+class SobolResultat(NamedTuple):
+    parametrar: tuple
+    S1: np.ndarray
+    S1_ki: np.ndarray  # (k, 2), undre och övre gräns
+    ST: np.ndarray
+    ST_ki: np.ndarray
+    varians: float
+    antal_korningar: int
+
+
+class MorrisResultat(NamedTuple):
+    parametrar: tuple
+    mu: np.ndarray
+    mu_stjarna: np.ndarray
+    mu_stjarna_ki: np.ndarray  # (k, 2)
+    sigma: np.ndarray
+    antal_korningar: int
+
+
+def till_parametrar(enhet, parametrar, intervall=None):
+    """Skalar punkter i enhetskuben (..., k) till parametervärden i reglageintervallen."""
+    intervall = {**REGLAGEINTERVALL, **(intervall or {})}
+    ut = {}
+    for i, namn in enumerate(parametrar):
+        lag, hog = intervall[namn]
+        varden = lag + enhet[..., i] * (hog - lag)
+        ut[namn] = np.rint(varden).astype(np.int64) if namn in HELTALSPARAMETRAR else varden
+    return ut
+
+
+def utvardera(varierade, centrum, utfall="klimatneutralitet"):
+    """Kör modellen för ett block och returnerar utfallet vid LCA-periodens slut.
+
+    varierade mappar parameternamn till 1-D arrayer; centrum ger övriga värden.
+    """
+    antal = len(next(iter(varierade.values())))
+    p = {n: centrum.get(n, STANDARDVARDEN.get(n)) for n in PARAMETRAR + ("LCA_period",)}
+    p.update(varierade)
+    p = {n: np.broadcast_to(np.asarray(v), (antal,)) for n, v in p.items()}
+    lca = p.pop("LCA_period").astype(np.intp)
+    p = {n: a[:, None] for n, a in p.items()}
+    val = modellval(centrum)
+    if utfall in ("klimatneutralitet", "co2_i_skog"):
+        # Skogsserien beror bara på året självt, så varje rad räknas för sitt eget år
+        return berakna_block(p, lca[:, None], (utfall,), **val)[utfall][:, 0]
+    # Serier som kräver hela förloppet räknas fram till den längsta LCA-perioden i blocket
+    serie = berakna_block(p, np.arange(int(lca.max()) + 1), (utfall,), **val)[utfall]
+    return serie[np.arange(antal), lca]
+
+
+def _sobol_block(uppgift):
+    frö, antal, parametrar, centrum, utfall, intervall = uppgift
+    rng = np.random.default_rng(frö)
+    k = len(parametrar)
+    a = rng.random((antal, k))
+    b = rng.random((antal, k))
+    # Alla k+2 matriser utvärderas i ett anrop: A, B och AB_i (A med kolumn i från B)
+    ab = np.repeat(a[None], k, axis=0)
+    index = np.arange(k)
+    ab[index, :, index] = b[:, index].T
+    design = np.concatenate([a[None], b[None], ab]).reshape(-1, k)
+    f = utvardera(till_parametrar(design, parametrar, intervall), centrum, utfall)
+    return f.reshape(k + 2, antal)
+
+
+def _morris_block(uppgift):
+    frö, antal, parametrar, centrum, utfall, intervall, nivaer = uppgift
+    rng = np.random.default_rng(frö)
+    k = len(parametrar)
+    delta = nivaer / (2 * (nivaer - 1))
+    # Startpunkt på rutnätet så att ett steg ±delta stannar inom [0, 1]
+    startnivaer = np.arange(nivaer) / (nivaer - 1)
+    startnivaer = startnivaer[startnivaer <= 1 - delta + 1e-12]
+    bas = rng.choice(startnivaer, (antal, k))
+    riktning = rng.choice([-1.0, 1.0], (antal, k))
+    start = bas + delta * (riktning < 0)
+    ordning = np.argsort(rng.random((antal, k)), axis=1)
+
+    steg = np.zeros((antal, k, k))
+    rader = np.arange(antal)[:, None]
+    steg[rader, np.arange(k), ordning] = np.take_along_axis(riktning, ordning, axis=1) * delta
+    punkter = start[:, None, :] + np.concatenate(
+        [np.zeros((antal, 1, k)), np.cumsum(steg, axis=1)], axis=1
+    )
+    f = utvardera(till_parametrar(punkter.reshape(-1, k), parametrar, intervall), centrum, utfall)
+    f = f.reshape(antal, k + 1)
+
+    # Elementäreffekt för parametern som ändras i varje steg, sorterad tillbaka per parameter
+    effekt = np.diff(f, axis=1) / (np.take_along_axis(riktning, ordning, axis=1) * delta)
+    ut = np.empty_like(effekt)
+    np.put_along_axis(ut, ordning, effekt, axis=1)
+    return ut
+
+
+def _kor_block(funktion, uppgifter, arbetare):
+    pool = ProcessPoolExecutor(max_workers=arbetare) if arbetare > 1 else None
+    try:
+        # map() ger resultaten i blockordning även när de räknas parallellt
+        return list((pool.map if pool else map)(funktion, uppgifter))
+    finally:
+        if pool:
+            pool.shutdown()
+
+
+def _block(antal, seed):
+    frön = np.random.SeedSequence(seed).spawn(-(-antal // KANSLIGHET_CHUNK))
+    return [(frö, min(KANSLIGHET_CHUNK, antal - i * KANSLIGHET_CHUNK)) for i, frö in enumerate(frön)]
+
+
+def sobol_index(f_a, f_b, f_ab, vikter=None):
+    """Första ordningens och totala Sobol-index ur utfallen för A, B (N,) och AB_i (k, N).
+
+    Estimatorerna är medelvärden över basraderna. Med vikter (R, N), antalet
+    gånger varje rad dras i R bootstrap-urval, blir varje medelvärde en
+    matrisprodukt och resultatet får formen (R, k).
+    """
+    k, antal = f_ab.shape
+    # Centrering minskar variansen i Saltelli-estimatorn utan att ändra väntevärdet
+    medel = (f_a.mean() + f_b.mean()) / 2
+    f_a, f_b, f_ab = f_a - medel, f_b - medel, f_ab - medel
+    termer = np.concatenate([
+        f_b * (f_ab - f_a),
+        0.5 * (f_a - f_ab) ** 2,
+        np.stack([f_a, f_b, f_a**2, f_b**2]),
+    ])
+    m = termer.mean(axis=1) if vikter is None else vikter @ termer.T / antal
+    varians = (m[..., 2 * k + 2] + m[..., 2 * k + 3]) / 2 - ((m[..., 2 * k] + m[..., 2 * k + 1]) / 2) ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return m[..., :k] / varians[..., None], m[..., k:2 * k] / varians[..., None]
+
+
+def _bootstrap_rng(seed):
+    # Egen slumpström för bootstrap, skild från blockens SeedSequence(seed).spawn()
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(2**32 - 1,)))
+
+
+def _bootstrapvikter(rng, antal, bootstrap):
+    """Ger (R, antal)-matriser med hur många gånger varje rad dras per bootstrap-urval."""
+    # Urvalen dras i omgångar så att matriserna hålls små
+    omgang = max(1, min(bootstrap, 2**22 // max(antal, 1)))
+    for start in range(0, bootstrap, omgang):
+        n = min(omgang, bootstrap - start)
+        urval = rng.integers(0, antal, (n, antal)) + antal * np.arange(n)[:, None]
+        yield np.bincount(urval.ravel(), minlength=n * antal).reshape(n, antal).astype(float)
+
+
+def _konfidensintervall(bootstrapvarden, konfidensniva):
+    granser = 100 * np.array([(1 - konfidensniva) / 2, (1 + konfidensniva) / 2])
+    return np.percentile(bootstrapvarden, granser, axis=0).T
+
+
+def sobol(centrum, parametrar=KANSLIGHETSPARAMETRAR, antal=8192, utfall="klimatneutralitet",
+          intervall=None, bootstrap=BOOTSTRAP, konfidensniva=0.95, seed=0, arbetare=1):
+    """Sobol-analys med antal basrader, dvs. antal·(k+2) modellkörningar.
+
+    intervall kan ersätta reglageintervallen för enskilda parametrar,
+    t.ex. {"rotation": (60, 100)}.
+    """
+    parametrar = tuple(parametrar)
+    k = len(parametrar)
+    uppgifter = [b + (parametrar, centrum, utfall, intervall) for b in _block(antal, seed)]
+    f = np.concatenate(_kor_block(_sobol_block, uppgifter, arbetare), axis=1)
+    f_a, f_b, f_ab = f[0], f[1], f[2:]
+    s1, st = sobol_index(f_a, f_b, f_ab)
+
+    s1_boot, st_boot = zip(*(
+        sobol_index(f_a, f_b, f_ab, vikter)
+        for vikter in _bootstrapvikter(_bootstrap_rng(seed), antal, bootstrap)
+    ))
+    return SobolResultat(
+        parametrar=parametrar,
+        S1=s1,
+        S1_ki=_konfidensintervall(np.concatenate(s1_boot), konfidensniva),
+        ST=st,
+        ST_ki=_konfidensintervall(np.concatenate(st_boot), konfidensniva),
+        varians=float(np.var(np.concatenate([f_a, f_b]))),
+        antal_korningar=antal * (k + 2),
+    )
+
+
+def morris(centrum, parametrar=KANSLIGHETSPARAMETRAR, trajektorier=1000, nivaer=4,
+           utfall="klimatneutralitet", intervall=None, bootstrap=BOOTSTRAP,
+           konfidensniva=0.95, seed=0, arbetare=1):
+    """Morris elementäreffekter med trajektorier·(k+1) modellkörningar."""
+    parametrar = tuple(parametrar)
+    k = len(parametrar)
+    uppgifter = [
+        b + (parametrar, centrum, utfall, intervall, nivaer) for b in _block(trajektorier, seed)
+    ]
+    effekt = np.concatenate(_kor_block(_morris_block, uppgifter, arbetare))
+
+    abs_effekt = np.abs(effekt)
+    mu_stjarna_boot = np.concatenate([
+        vikter @ abs_effekt / trajektorier
+        for vikter in _bootstrapvikter(_bootstrap_rng(seed), trajektorier, bootstrap)
+    ])
+    return MorrisResultat(
+        parametrar=parametrar,
+        mu=effekt.mean(axis=0),
+        mu_stjarna=abs_effekt.mean(axis=0),
+        mu_stjarna_ki=_konfidensintervall(mu_stjarna_boot, konfidensniva),
+        sigma=effekt.std(axis=0, ddof=1) if trajektorier > 1 else np.zeros(k),
+        antal_korningar=trajektorier * (k + 1),
+    )
@@ -1,8 +1,16 @@
+import os
+
 import streamlit as st
 import numpy as np
-import matplotlib.pyplot as plt
+
+from matning import matare, visa_panel
+from motor import bild, delnyckel, simulering, varianter
+from reglage import VIRKES_ALTERNATIV, modellreglage
+from rendering import hamta_diagram
+from resultatcache import cache, normaliserad_nyckel
 
 st.set_page_config(page_title="Klimatbalanserat trähus", layout="wide")
+matare.starta_omkorning("Dynamisk modell")
 
 st.title("🌲 Klimatbalanserat trähus – dynamisk modell. Ver 1.8")
 st.markdown(
@@ -12,124 +20,197 @@ st.markdown(
 
 st.sidebar.header("Justera modellparametrar")
 
-BTA = st.sidebar.slider("Bostadsyta (BTA), m²", 100, 10000, 150)
-virke_per_m2 = st.sidebar.slider("Mängd stomvirke (m³/m² BTA)", 0.1, 1.0, 0.35)
-bonitet = st.sidebar.slider("Bonitet (m³ virke/ha/år)", 4.0, 10.0, 8.0, 0.1)
-LCA_period = st.sidebar.slider("LCA-period (år, analys)", 30, 100, 50)
-rotation = st.sidebar.slider("Skogens rotationsperiod (år)", 50, 150, 80)
-hus_livslangd = st.sidebar.slider("Husets livslängd (år)", 20, 200, 100)
-max_years = st.sidebar.slider("Total tidsperiod (år)", 50, 200, 200)
-
-klimatpåverkan_per_m2 = st.sidebar.slider(
-    "Husets klimatpåverkan (ton CO₂/m² BTA)", 0.150, 0.500, 0.250
+parametrar = modellreglage()
+LCA_period, rotation, hus_livslangd, max_years = (
+    parametrar[n] for n in ("LCA_period", "rotation", "hus_livslangd", "max_years")
 )
 
-alternativ = {
-    "Återanvänds till nytt hus": "ateranvandning",
-    "Energiåtervinns med bio-CCS (koldioxidlagring)": "bioccs",
-    "Bränns konventionellt (släpper ut all CO₂)": "konventionell"
-}
-valt_svar = st.sidebar.selectbox(
-    "Vad händer med virket efter husets rivning?",
-    options=list(alternativ.keys()),
-    index=0
-)
-virkes_hantering = alternativ[valt_svar]
-bygg_igen = st.sidebar.checkbox("Bygg nytt hus efter livslängd?", value=True)
-
-years = np.arange(max_years+1)
-
-kg_torrsubstans_per_m3 = 750
-kolandel = 0.5
-co2_per_kg_kol = 3.67
-
-virkesvolym_total = BTA * virke_per_m2
-kol_total = virkesvolym_total * kg_torrsubstans_per_m3 * kolandel
-co2_total = kol_total * co2_per_kg_kol / 1000
-co2_per_m3 = kg_torrsubstans_per_m3 * kolandel * co2_per_kg_kol / 1000
-
-virke_per_ha_per_rotation = bonitet * rotation
-skogsareal_ha = virkesvolym_total / virke_per_ha_per_rotation
-klimatpåverkan_total = BTA * klimatpåverkan_per_m2
-
-# --- Policy-grafen ---
-klimatbalans_maxandel = min(100 * LCA_period / rotation, 100)
-procentandel = np.full_like(years, klimatbalans_maxandel)
-fig0, ax0 = plt.subplots(figsize=(8, 3))
-ax0.plot(years, procentandel, color='darkorange', lw=3, label="Max klimatbalanserbar andel (%)")
-ax0.set_xlabel("Tid (år)")
-ax0.set_ylabel("Max klimatbalansering (%)")
-ax0.set_title("Maximal klimatbalanserbar andel av inbyggd CO₂ enligt policy")
-ax0.set_ylim(0, 110)
-ax0.grid(alpha=0.3)
-ax0.axvline(LCA_period, color='red', linestyle=':', label='LCA-period slutar')
-ax0.axvline(rotation, color='green', linestyle='--', label='En rotationsperiod')
-ax0.legend(loc="upper right")
+st.sidebar.header("Osäkerhetsanalys")
+visa_osakerhet = st.sidebar.checkbox("Visa osäkerhetsband (Monte Carlo)", value=False)
+if visa_osakerhet:
+    # montecarlo laddas först när osäkerhetsanalysen slås på
+    from montecarlo import FORDELNINGAR, monte_carlo
+
+    mc_antal = st.sidebar.select_slider(
+        "Antal stickprov", options=[1000, 10000, 100000, 1000000], value=10000
+    )
+    mc_fordelning = st.sidebar.selectbox("Fördelning kring valda värden", FORDELNINGAR)
+    mc_spridning = {
+        "bonitet": st.sidebar.slider("Osäkerhet bonitet (±%)", 0, 50, 10),
+        "virke_per_m2": st.sidebar.slider("Osäkerhet stomvirke (±%)", 0, 50, 10),
+        "klimatpåverkan_per_m2": st.sidebar.slider("Osäkerhet klimatpåverkan (±%)", 0, 50, 10),
+        "rotation": st.sidebar.slider("Osäkerhet rotationsperiod (±%)", 0, 50, 10),
+        "hus_livslangd": st.sidebar.slider("Osäkerhet livslängd (±%)", 0, 50, 10),
+    }
+    mc_seed = st.sidebar.number_input("Slumpfrö", min_value=0, value=0, step=1)
+
+st.sidebar.header("Känslighetsanalys")
+visa_kanslighet = st.sidebar.checkbox("Visa känslighetsanalys (Sobol/Morris)", value=False)
+if visa_kanslighet:
+    from kanslighet import KANSLIGHETSPARAMETRAR, morris, sobol
+
+    ks_metod = st.sidebar.selectbox("Metod", ["Sobol", "Morris"])
+    ks_antal = st.sidebar.select_slider(
+        "Antal basrader (Sobol) eller trajektorier (Morris)",
+        options=[1024, 8192, 65536, 131072], value=8192,
+    )
 
 # --- Simulering ---
-co2_i_skog = np.zeros_like(years, dtype=float)
-co2_i_hus = np.zeros_like(years, dtype=float)
+# Resultat och figurer cachas per parameterkombination och delas mellan sessioner
+nyckel, res = simulering(**parametrar)
+years = res.years
+skogsareal_ha = res.skogsareal_ha
+co2_i_skog, co2_i_hus = res.co2_i_skog, res.co2_i_hus
+klimatneutralitet = res.klimatneutralitet
+cum_co2_skog, cum_co2_hus, cum_co2_summa = res.cum_co2_skog, res.cum_co2_hus, res.cum_co2_summa
 
-for t in years:
-    tid_i_rotation = t % rotation
-    co2_i_skog[t] = skogsareal_ha * bonitet * co2_per_m3 * tid_i_rotation
+mc_nyckel = ()
+if visa_osakerhet:
+    mc_parametrar = dict(
+        centrum={n: v for n, v in parametrar.items() if n not in ("LCA_period", "max_years")},
+        osakerhet={
+            namn: (mc_fordelning, procent / 100)
+            for namn, procent in mc_spridning.items() if procent > 0
+        },
+        antal=mc_antal,
+        max_years=max_years,
+        seed=int(mc_seed),
+    )
+    mc_nyckel = normaliserad_nyckel(**mc_parametrar)
+    with matare.steg("monte_carlo"):
+        mc = cache.hamta(
+            ("monte_carlo",) + mc_nyckel,
+            lambda: monte_carlo(
+                **mc_parametrar, arbetare=os.cpu_count() if mc_antal >= 100000 else 1
+            ),
+        )
 
-    if bygg_igen:
-        antal_hus = t // hus_livslangd + 1
-    else:
-        antal_hus = 1 if t < hus_livslangd else 0
-
-    if virkes_hantering == "konventionell":
-        if bygg_igen:
-            tid_i_hus = t % hus_livslangd
-            if tid_i_hus < hus_livslangd:
-                co2_i_hus[t] = co2_total
-            else:
-                co2_i_hus[t] = 0
-        else:
-            if t < hus_livslangd:
-                co2_i_hus[t] = co2_total
-            else:
-                co2_i_hus[t] = 0
-
-    elif virkes_hantering in ("ateranvandning", "bioccs"):
-        if bygg_igen:
-            co2_i_hus[t] = antal_hus * co2_total  # TRAPPA
-        else:
-            if t < hus_livslangd:
-                co2_i_hus[t] = co2_total  # BLOCK
-            else:
-                co2_i_hus[t] = co2_total  # Blocket fortsätter
+if visa_kanslighet:
+    # Parametrarna varieras över hela reglageintervallen; övriga hålls på reglagens värden
+    ks_centrum = {n: v for n, v in parametrar.items() if n != "max_years"}
+    ks_nyckel = normaliserad_nyckel(metod=ks_metod, antal=ks_antal, **ks_centrum)
+    with matare.steg("kanslighet"):
+        ks = cache.hamta(
+            ("kanslighet",) + ks_nyckel,
+            lambda: (sobol(ks_centrum, antal=ks_antal) if ks_metod == "Sobol"
+                     else morris(ks_centrum, trajektorier=ks_antal)),
+        )
+
+klimatbalans_maxandel = res.klimatbalans_maxandel
+
+
+# --- Figurer ---
+# Varje session har egna förbyggda figurer där bara data uppdateras vid omkörning
+def forbered_fig0(ax0):
+    ax0.set_xlabel("Tid (år)")
+    ax0.set_ylabel("Max klimatbalansering (%)")
+    ax0.set_title("Maximal klimatbalanserbar andel av inbyggd CO₂ enligt policy")
+    ax0.grid(alpha=0.3)
+
+
+def rita_fig0():
+    procentandel = np.full_like(years, klimatbalans_maxandel)
+    fig0 = hamta_diagram(st.session_state, "fig0", (8, 3), forbered_fig0)
+    fig0.linje("andel", years, procentandel, color='darkorange', lw=3, label="Max klimatbalanserbar andel (%)")
+    fig0.vlinje("lca", LCA_period, color='red', linestyle=':', label='LCA-period slutar')
+    fig0.vlinje("rotation", rotation, color='green', linestyle='--', label='En rotationsperiod')
+    fig0.ax.set_ylim(0, 110)
+    return fig0.png(legend=dict(loc="upper right"))
+
+
+def forbered_fig1(ax1):
+    ax1.set_xlabel("Tid (år)")
+    ax1.set_ylabel("Ton CO₂")
+    ax1.set_title("CO₂-lagring i hus och skog")
+    ax1.grid(alpha=0.3)
+
+
+def rita_fig1():
+    fig1 = hamta_diagram(st.session_state, "fig1", (8, 4), forbered_fig1)
+    fig1.linje("hus", years, co2_i_hus, label="Inbyggd CO₂ i trähus (ton)", lw=2)
+    fig1.linje("skog", years, co2_i_skog, label="Ackumulerad CO₂ i skog (ton)", lw=2)
+    fig1.vlinje("lca", LCA_period, color='red', linestyle=':', label='LCA-period slutar')
+    fig1.vlinjer("rotationer", range(0, max_years, rotation), color='green', linestyle='--', alpha=0.2)
+    fig1.vlinjer("hus_byten", range(0, max_years, hus_livslangd), color='brown', linestyle=':', alpha=0.2)
+    return fig1.png(legend={})
 
-    else:
-        co2_i_hus[t] = 0
 
-klimatneutralitet = np.zeros_like(years, dtype=float)
-for t in years:
-    if klimatpåverkan_total > 0:
-        klimatneutralitet[t] = 100 * co2_i_skog[t] / klimatpåverkan_total
+def forbered_fig2(ax2):
+    ax2.set_xlabel("Tid (år)")
+    ax2.set_ylabel("Klimatneutralitetsgrad (%)")
+    ax2.set_title("Klimatneutralitet över tid (skogsupptag/klimatpåverkan)")
+    ax2.grid(alpha=0.3)
+
+
+def rita_fig2():
+    fig2 = hamta_diagram(st.session_state, "fig2", (8, 4), forbered_fig2)
+    fig2.linje("klimatneutralitet", years, klimatneutralitet, label="Klimatneutralitetsgrad (%)", lw=2, color="purple")
+    if visa_osakerhet:
+        p5, p50, p95 = mc.percentiler["klimatneutralitet"]
+        fig2.band("p5_p95", years, p5, p95, color="purple", alpha=0.15, label="P5–P95 (Monte Carlo)")
+        fig2.linje("p50", years, p50, color="purple", lw=1, linestyle="--", label="P50 (Monte Carlo)")
     else:
-        klimatneutralitet[t] = np.nan
-
-# --- Summerat CO₂-upptag (NY GRAF) ---
-# Kumulativt skogsupptag (summerat över rotationerna) och summerat CO2 i hus
-cum_co2_skog = np.zeros_like(years, dtype=float)
-cum_co2_hus = np.zeros_like(years, dtype=float)
-cum_co2_summa = np.zeros_like(years, dtype=float)
-for t in years:
-    if t == 0:
-        cum_co2_skog[t] = co2_i_skog[t]
-        cum_co2_hus[t] = co2_i_hus[t]
+        fig2.ta_bort("p5_p95")
+        fig2.ta_bort("p50")
+    fig2.hlinje("full_balans", 100, color='gray', linestyle='--', label="100% klimatbalans")
+    fig2.vlinje("lca", LCA_period, color='red', linestyle=':', label='LCA-period slutar')
+    fig2.ax.set_ylim(0, 150)
+    return fig2.png(legend={})
+
+
+def forbered_fig4(ax4):
+    ax4.set_xlabel("Tid (år)")
+    ax4.set_ylabel("Ackumulerat CO₂ (ton)")
+    ax4.set_title("Summerat CO₂-upptag (skogsupptag och inlagrat CO₂)")
+    ax4.grid(alpha=0.3)
+
+
+def rita_fig4():
+    fig4 = hamta_diagram(st.session_state, "fig4", (8, 4), forbered_fig4)
+    fig4.linje("skog", years, cum_co2_skog, label="Summerat CO₂-upptag i skog (ton)", lw=2)
+    fig4.linje("hus", years, cum_co2_hus, label="Summerat lagrat CO₂ i hus (ton)", lw=2)
+    fig4.linje("summa", years, cum_co2_summa, label="Totalt summerat CO₂-upptag (skog + hus)", lw=3, linestyle='--')
+    return fig4.png(legend={})
+
+
+KANSLIGHETSETIKETTER = {
+    "bonitet": "Bonitet",
+    "rotation": "Rotationsperiod",
+    "virke_per_m2": "Stomvirke per m²",
+    "klimatpåverkan_per_m2": "Klimatpåverkan per m²",
+    "hus_livslangd": "Husets livslängd",
+    "LCA_period": "LCA-period",
+}
+
+
+def forbered_tornado(ax):
+    ax.grid(alpha=0.3, axis="x")
+
+
+def rita_tornado():
+    tornado = hamta_diagram(st.session_state, "tornado", (8, 3.5), forbered_tornado)
+    if ks_metod == "Sobol":
+        storheter = [("huvud", ks.ST, ks.ST_ki, "Totalt index (ST)", 0.6, "tab:orange"),
+                     ("S1", ks.S1, ks.S1_ki, "Första ordningens index (S1)", 0.3, "tab:purple")]
+        tornado.ax.set_xlabel("Sobol-index (andel av variansen)")
     else:
-        # Vid varje ny rotation lägg till ett "varv" till totala ackumulerade
-        if t % rotation == 0 and t != 0:
-            # Skogen återplanteras, börja om, men summera med föregående ackumulerade
-            cum_co2_skog[t] = cum_co2_skog[t-1] + co2_i_skog[t]
-        else:
-            cum_co2_skog[t] = cum_co2_skog[t-1] + (co2_i_skog[t] - co2_i_skog[t-1])
-        # Ackumulerat i hus är summan över tid (CO2 "försvinner" om huset rivs och CO2 släpps ut)
-        cum_co2_hus[t] = cum_co2_hus[t-1] + (co2_i_hus[t] - co2_i_hus[t-1])
-    cum_co2_summa[t] = cum_co2_skog[t] + cum_co2_hus[t]
+        storheter = [("huvud", ks.mu_stjarna, ks.mu_stjarna_ki, "μ* (medelabsolut elementäreffekt)",
+                      0.6, "tab:orange")]
+        tornado.ax.set_xlabel("μ* (procentenheter per hela reglageintervallet)")
+        tornado.ta_bort("S1")
+    # Störst påverkan överst
+    ordning = np.argsort(storheter[0][1])
+    y = np.arange(len(ordning))
+    for namn, varden, ki, etikett, hojd, farg in storheter:
+        v = varden[ordning]
+        fel = np.clip([v - ki[ordning, 0], ki[ordning, 1] - v], 0, None)
+        tornado.staplar(namn, y, v, height=hojd, xerr=fel, color=farg, label=etikett,
+                        error_kw=dict(ecolor="black", capsize=3, lw=1))
+    tornado.ax.set_yticks(y, [KANSLIGHETSETIKETTER.get(ks.parametrar[i], ks.parametrar[i])
+                              for i in ordning])
+    tornado.ax.set_title(f"{ks_metod}: klimatneutralitet vid LCA-periodens slut ({LCA_period} år)")
+    return tornado.png(legend=dict(loc="lower right"))
+
 
 st.info(
     f"**Total skogsareal som krävs för att producera virket till huset är:**\n"
@@ -137,7 +218,7 @@ st.info(
 )
 
 st.subheader("Maximal klimatbalanserbar andel av inbyggd CO₂")
-st.pyplot(fig0)
+st.image(bild("fig0", (max_years, LCA_period, rotation), rita_fig0), width="stretch")
 st.markdown(
     f"""**Enligt denna logik (LCA-period ÷ rotationsperiod) får du klimatbalansera maximalt:**
     **{klimatbalans_maxandel:.1f}%** av inbyggd CO₂ i huset.<br>
@@ -145,47 +226,319 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-fig1, ax1 = plt.subplots(figsize=(8, 4))
-ax1.plot(years, co2_i_hus, label="Inbyggd CO₂ i trähus (ton)", lw=2)
-ax1.plot(years, co2_i_skog, label="Ackumulerad CO₂ i skog (ton)", lw=2)
-ax1.axvline(LCA_period, color='red', linestyle=':', label='LCA-period slutar')
-for n in range(0, max_years, rotation):
-    ax1.axvline(n, color='green', linestyle='--', alpha=0.2)
-for n in range(0, max_years, hus_livslangd):
-    ax1.axvline(n, color='brown', linestyle=':', alpha=0.2)
-ax1.set_xlabel("Tid (år)")
-ax1.set_ylabel("Ton CO₂")
-ax1.set_title("CO₂-lagring i hus och skog")
-ax1.legend()
-ax1.grid(alpha=0.3)
-
-fig2, ax2 = plt.subplots(figsize=(8, 4))
-ax2.plot(years, klimatneutralitet, label="Klimatneutralitetsgrad (%)", lw=2, color="purple")
-ax2.axhline(100, color='gray', linestyle='--', label="100% klimatbalans")
-ax2.axvline(LCA_period, color='red', linestyle=':', label='LCA-period slutar')
-ax2.set_xlabel("Tid (år)")
-ax2.set_ylabel("Klimatneutralitetsgrad (%)")
-ax2.set_ylim(0, 150)
-ax2.set_title("Klimatneutralitet över tid (skogsupptag/klimatpåverkan)")
-ax2.legend()
-ax2.grid(alpha=0.3)
-
-fig4, ax4 = plt.subplots(figsize=(8, 4))
-ax4.plot(years, cum_co2_skog, label="Summerat CO₂-upptag i skog (ton)", lw=2)
-ax4.plot(years, cum_co2_hus, label="Summerat lagrat CO₂ i hus (ton)", lw=2)
-ax4.plot(years, cum_co2_summa, label="Totalt summerat CO₂-upptag (skog + hus)", lw=3, linestyle='--')
-ax4.set_xlabel("Tid (år)")
-ax4.set_ylabel("Ackumulerat CO₂ (ton)")
-ax4.set_title("Summerat CO₂-upptag (skogsupptag och inlagrat CO₂)")
-ax4.legend()
-ax4.grid(alpha=0.3)
-
+# Figurerna nycklas bara på parametrarna som deras noder i beräkningsgrafen och
+# de vertikala linjerna beror på, så t.ex. en ändrad klimatpåverkan ritar bara om fig2
+SLUTSKEDE = ("virkes_hantering", "bygg_igen")
 st.subheader("CO₂-lagring i trähus och produktiv skog över tid")
-st.pyplot(fig1)
+st.image(bild("fig1", delnyckel(("skog", "hus"), parametrar, "LCA_period", *SLUTSKEDE), rita_fig1),
+         width="stretch")
 st.subheader("Klimatneutralitetsgrad för trähus över tid (skogsupptag/klimatpåverkan)")
-st.pyplot(fig2)
+st.image(bild("fig2", delnyckel(("klimatneutralitet",), parametrar, "LCA_period") + mc_nyckel, rita_fig2),
+         width="stretch")
 st.subheader("Summerat CO₂-upptag (skogsupptag och inlagrat CO₂)")
-st.pyplot(fig4)
+st.image(bild("fig4", delnyckel(("kumulativa",), parametrar, *SLUTSKEDE), rita_fig4), width="stretch")
+
+with st.expander("📥 Exportera data"):
+    from export import APP_MAX_RADER, EXCEL_MAX_RADER, exportval, montecarlo_tabell, nedladdningsknapp
+    from export import serier as exportserier
+
+    ex_format, ex_kompakt = exportval(st, "export")
+    kolumner = st.columns(4)
+    nedladdningsknapp(
+        kolumner[0], "Klimatbalanserbar andel", "klimatbalanserbar_andel",
+        lambda: exportserier(
+            ar=years, max_klimatbalanserbar_andel=np.full(len(years), klimatbalans_maxandel)
+        ),
+        ex_format, ex_kompakt, "export_fig0",
+    )
+    nedladdningsknapp(
+        kolumner[1], "CO₂-lagring", "co2_lagring",
+        lambda: exportserier(ar=years, co2_i_hus=co2_i_hus, co2_i_skog=co2_i_skog),
+        ex_format, ex_kompakt, "export_fig1",
+    )
+    nedladdningsknapp(
+        kolumner[2], "Klimatneutralitetsgrad", "klimatneutralitet",
+        lambda: exportserier(ar=years, klimatneutralitet=klimatneutralitet, **({
+            f"klimatneutralitet_p{q}": p for q, p in zip(mc.q, mc.percentiler["klimatneutralitet"])
+        } if visa_osakerhet else {})),
+        ex_format, ex_kompakt, "export_fig2",
+    )
+    nedladdningsknapp(
+        kolumner[3], "Summerat CO₂-upptag", "summerat_upptag",
+        lambda: exportserier(ar=years, cum_co2_skog=cum_co2_skog, cum_co2_hus=cum_co2_hus,
+                             cum_co2_summa=cum_co2_summa),
+        ex_format, ex_kompakt, "export_fig4",
+    )
+    if visa_osakerhet:
+        mc_rader = mc_antal * (max_years + 1)
+        if mc_rader <= APP_MAX_RADER and (ex_format != "xlsx" or mc_rader < EXCEL_MAX_RADER):
+            nedladdningsknapp(
+                st, f"Alla {mc_antal:,} Monte Carlo-stickprov ({mc_rader:,} rader)", "monte_carlo",
+                lambda: montecarlo_tabell(
+                    mc_parametrar["centrum"], mc_parametrar["osakerhet"], mc_antal, max_years,
+                    mc_parametrar["seed"],
+                ),
+                ex_format, ex_kompakt, "export_mc",
+            )
+        else:
+            st.caption(
+                f"Stickproven ({mc_rader:,} rader) är för många för en nedladdning här; "
+                "använd export.montecarlo_tabell() i ett skript."
+            )
+    st.caption(
+        "Filen skrivs när knappen klickas. Med Monte Carlo påslaget innehåller "
+        "klimatneutraliteten även percentilbanden, och stickproven kan laddas ned "
+        "med de dragna parametrarna, en rad per stickprov och år."
+    )
+
+SLUTSKEDESETIKETTER = {v: k.split(" (")[0] for k, v in VIRKES_ALTERNATIV.items()}
+JAMFORELSESERIER = {
+    "CO₂ i trähus": "co2_i_hus",
+    "Lagrad CO₂ i hus och skog": "lagrat",
+    "Summerat CO₂-upptag (skog + hus)": "cum_co2_summa",
+}
+
+
+def slutskedesetikett(virkes_hantering, bygg_igen):
+    return f"{SLUTSKEDESETIKETTER[virkes_hantering]}, {'nytt hus' if bygg_igen else 'inget nytt hus'}"
+
+
+def jamforelseserie(namn):
+    if namn == "lagrat":
+        return alla.co2_i_skog + alla.co2_i_hus
+    return getattr(alla, namn)
+
+
+def forbered_jamforelse(ax):
+    ax.set_xlabel("Tid (år)")
+    ax.set_ylabel("Ton CO₂")
+    ax.grid(alpha=0.3)
+
+
+def rita_jamforelse():
+    figur = hamta_diagram(st.session_state, "jamforelse", (8, 4), forbered_jamforelse)
+    serie = jamforelseserie(JAMFORELSESERIER[jf_serie])
+    for i, (vh, bi) in enumerate(SLUTSKEDEN):
+        figur.linje(f"variant{i}", years, serie[i], lw=2, color=f"C{i // 2}",
+                    linestyle="-" if bi else "--", label=slutskedesetikett(vh, bi))
+    figur.vlinje("lca", LCA_period, color="red", linestyle=":", label="LCA-period slutar")
+    figur.ax.set_title(jf_serie)
+    return figur.png(legend=dict(fontsize="small"))
+
+
+def rita_liten_multipel(i):
+    vh, bi = SLUTSKEDEN[i]
+    serie = jamforelseserie(JAMFORELSESERIER[jf_serie])
+    figur = hamta_diagram(st.session_state, f"jamforelse{i}", (4, 3), forbered_jamforelse)
+    figur.linje("variant", years, serie[i], lw=2, color=f"C{i // 2}", linestyle="-" if bi else "--")
+    figur.vlinje("lca", LCA_period, color="red", linestyle=":")
+    # Samma skala i alla små diagram så att de går att jämföra
+    figur.ax.set_ylim(min(0.0, np.nanmin(serie)), 1.05 * np.nanmax(serie))
+    figur.ax.set_title(slutskedesetikett(vh, bi), fontsize="medium")
+    return figur.png()
+
+
+with st.expander("♻️ Jämför alla alternativ vid rivning"):
+    from modell import SLUTSKEDEN, sammanfatta_varianter
+    from dynamisk_lca import dynamisk_lca, flodesserie
+
+    # Alla sex slutskeden räknas i ett anrop och cachas utan valt slutskede, så
+    # att byta vy, serie eller alternativ i sidopanelen bara är cacheträffar
+    v_nyckel, alla = varianter(**parametrar)
+    kol1, kol2 = st.columns(2)
+    jf_vy = kol1.radio("Visning", ["Överlagrat", "Små multiplar"], horizontal=True)
+    jf_serie = kol2.selectbox("Serie", list(JAMFORELSESERIER))
+    if jf_vy == "Överlagrat":
+        st.image(bild("jamforelse", v_nyckel + (jf_serie,), rita_jamforelse), width="stretch")
+    else:
+        for rad_start in range(0, len(SLUTSKEDEN), 3):
+            for i, kolumn in zip(range(rad_start, rad_start + 3), st.columns(3)):
+                kolumn.image(
+                    bild(f"jamforelse{i}", v_nyckel + (jf_serie,), lambda i=i: rita_liten_multipel(i)),
+                    width="stretch",
+                )
+    with matare.steg("sammanfattning"):
+        sammanfattning = cache.hamta(
+            ("sammanfattning", LCA_period) + v_nyckel,
+            lambda: dict(
+                sammanfatta_varianter(alla, LCA_period),
+                gwp_dynamisk=dynamisk_lca(
+                    flodesserie(alla.cum_co2_skog, alla.co2_i_hus, alla.klimatpåverkan_total)
+                ).gwp_tidshorisont,
+            ),
+        )
+    st.dataframe(
+        {
+            "Virket vid rivning": [SLUTSKEDESETIKETTER[vh] for vh, _ in SLUTSKEDEN],
+            "Nytt hus": ["ja" if bi else "nej" for _, bi in SLUTSKEDEN],
+            f"Klimatneutralitet år {LCA_period} (%)": sammanfattning["klimatneutralitet_lca"].round(1),
+            "Max CO₂ i hus (ton)": sammanfattning["max_co2_i_hus"].round(1),
+            "Max lagrad CO₂ i hus och skog (ton)": sammanfattning["max_co2_lagrat"].round(1),
+            f"Summerat upptag år {LCA_period} (ton)": sammanfattning["cum_co2_summa_lca"].round(1),
+            f"Summerat upptag år {max_years} (ton)": sammanfattning["cum_co2_summa_slut"].round(1),
+            "Dynamisk GWP 100 år (ton CO₂-ekv)": sammanfattning["gwp_dynamisk"].round(1),
+        },
+        hide_index=True,
+    )
+    from export import langt_format
+
+    nedladdningsknapp(
+        st, "Ladda ned alla alternativ", "slutskeden",
+        lambda: langt_format(
+            years,
+            {n: getattr(alla, n) for n in (
+                "co2_i_hus", "co2_i_skog", "klimatneutralitet", "cum_co2_skog", "cum_co2_hus",
+                "cum_co2_summa",
+            )},
+            {"virkes_hantering": np.array([vh for vh, _ in SLUTSKEDEN]),
+             "bygg_igen": np.array([bi for _, bi in SLUTSKEDEN])},
+        ),
+        ex_format, ex_kompakt, "export_slutskeden",
+    )
+    st.caption(
+        "Klimatneutraliteten räknas på skogens upptag och är därför densamma för alla "
+        "alternativ; det som skiljer är hur länge kolet ligger kvar i husen. Heldragna "
+        "linjer bygger nytt hus efter livslängden, streckade gör det inte."
+    )
+
+
+def forbered_dlca(ax):
+    ax.set_xlabel("Analysperiod (år)")
+    ax.set_ylabel("Ton CO₂-ekv")
+    ax.set_title("Tidsberoende GWP: nettoflödenas uppvärmningseffekt fram till varje år")
+    ax.grid(alpha=0.3)
+
+
+def rita_dlca():
+    figur = hamta_diagram(st.session_state, "dlca", (8, 4), forbered_dlca)
+    figur.linje("dynamisk", dlca.years, dlca.tidsberoende_gwp, lw=2, color="firebrick",
+                label="Dynamisk LCA (Bern-modellen)")
+    figur.linje("statisk", dlca.years, np.cumsum(dlca.flode), lw=1.5, linestyle="--",
+                color="gray", label="Statisk LCA (summerade flöden)")
+    figur.hlinje("noll", 0, color="black", lw=0.8)
+    figur.vlinje("tidshorisont", dlca_tidshorisont, color="red", linestyle=":", label="Tidshorisont")
+    return figur.png(legend={})
+
+
+with st.expander("🌡️ Dynamisk LCA: spelar det roll när utsläpp och upptag sker?"):
+    from dynamisk_lca import for_resultat
+
+    dlca_tidshorisont = st.number_input("Tidshorisont (år)", 20, 1000, 100, 10)
+    with matare.steg("dynamisk_lca"):
+        dlca = cache.hamta(
+            ("dynamisk_lca", dlca_tidshorisont) + nyckel,
+            lambda: for_resultat(res, dlca_tidshorisont),
+        )
+    kol1, kol2 = st.columns(2)
+    kol1.metric(f"Dynamisk GWP efter {dlca_tidshorisont} år", f"{dlca.gwp_tidshorisont:.1f} ton CO₂-ekv")
+    kol2.metric(f"Statisk summa efter {dlca_tidshorisont} år", f"{dlca.statisk_gwp:.1f} ton CO₂")
+    st.image(bild("dlca", nyckel + (dlca_tidshorisont,), rita_dlca), width="stretch")
+    st.caption(
+        "Husets klimatpåverkan släpps ut år 0 och skogens återväxt tar upp CO₂ under "
+        "följande år. Med Bern-modellens impulssvar väger tidiga flöden tyngre än sena "
+        "inom tidshorisonten, vilket en statisk summa inte fångar. Virke som bränns "
+        "konventionellt vid rivning räknas som utsläpp. Efter den totala tidsperioden "
+        "antas flödena vara noll. Se dynamisk_lca.py."
+    )
+
+
+MALETIKETTER = {
+    "virke_per_m2": "Stomvirke (m³/m² BTA)",
+    "klimatpåverkan_per_m2": "Klimatpåverkan (ton CO₂/m² BTA)",
+    "rotation": "Rotationsperiod (år)",
+    "bonitet": "Bonitet (m³ virke/ha/år)",
+    "BTA": "Bostadsyta, BTA (m²)",
+    "skogsareal_ha": "Skogsareal (ha)",
+    "ar": "Första år då målet nås",
+}
+
+
+def formatera_malvarde(varde, namn):
+    if np.isnan(varde):
+        return "ej möjligt"
+    if np.isinf(varde):
+        return "obegränsat"
+    return f"{varde:.0f}" if namn in ("rotation", "ar", "BTA") else f"{varde:.4g}"
+
+
+with st.expander("🎯 Målsökning: vad krävs för 100 % klimatbalans?"):
+    import csv
+    import io
+
+    from batch import tolka_block
+    from malsokning import MALPARAMETRAR, malsok_tabell
+    from svep import MODELLVAL
+
+    kol1, kol2, kol3 = st.columns(3)
+    ms_mal = kol1.number_input("Mål för klimatneutralitet (%)", 1.0, 1000.0, 100.0, 5.0)
+    ms_ar = kol2.number_input("Målår", 1, 1000, LCA_period)
+    ms_villkor = kol3.radio(
+        "Villkor", ["senast", "vid"], horizontal=True,
+        format_func={"senast": "senast målåret", "vid": "just målåret"}.get,
+    )
+    ms_areal = st.number_input(
+        "Tillgänglig skogsareal (ha); 0 = arealen som krävs för husets virke", 0.0, value=0.0
+    )
+    # De slutna uttrycken gäller linjär tillväxt i ett jämnårigt bestånd, så
+    # modellvalen skickas inte med och panelen säger till om de skiljer sig
+    ms_parametrar = {n: v for n, v in parametrar.items() if n not in MODELLVAL}
+    ms_parametrar.update({"skogsareal_ha": ms_areal} if ms_areal > 0 else {})
+    if any(parametrar[n] != MODELLVAL[n] for n in ("tillvaxtmodell", "aldersstruktur")):
+        st.warning(
+            "Målsökningen räknar med linjär tillväxt och ett jämnårigt bestånd, inte "
+            "med vald tillväxtkurva och åldersstruktur, så svaren gäller den modellen."
+        )
+    with matare.steg("malsokning"):
+        ms = malsok_tabell(ms_parametrar, ar=ms_ar, mal=ms_mal, villkor=ms_villkor)
+    nuvarande = {**parametrar, "skogsareal_ha": ms_areal or skogsareal_ha, "ar": ms_ar}
+    st.dataframe(
+        {
+            "Parameter": [MALETIKETTER[n] for n in MALPARAMETRAR],
+            "Valt värde": [formatera_malvarde(float(nuvarande[n]), n) for n in MALPARAMETRAR],
+            "Minsta": [formatera_malvarde(float(ms[f"{n}_min"]), n) for n in MALPARAMETRAR],
+            "Största": [formatera_malvarde(float(ms[f"{n}_max"]), n) for n in MALPARAMETRAR],
+        },
+        hide_index=True,
+    )
+    st.caption(
+        "Varje rad löser ut en parameter med övriga på valda värden. Parametrarna "
+        "hålls inom reglagens intervall. Om skogsarealen räknas fram ur husets "
+        "virkesbehov tar bonitet och BTA ut varandra, så de påverkar inte "
+        "klimatneutraliteten. Med villkoret just målåret kan rotationerna som når "
+        "målet ligga i flera skilda intervall; minsta och största är då de yttre gränserna."
+    )
+
+    projektfil = st.file_uploader(
+        "Projekttabell (CSV med samma kolumner som batch.py; målåret är varje projekts LCA_period)",
+        type="csv",
+    )
+    if projektfil is not None:
+        rader = projektfil.getvalue().decode("utf-8").splitlines(keepends=True)
+        try:
+            projekt = tolka_block(
+                "csv", next(csv.reader(rader[:1])), [r for r in rader[1:] if r.strip()]
+            )
+        except ValueError as fel:
+            st.error(f"Projekttabellen kunde inte läsas: {fel}")
+        else:
+            resultat = malsok_tabell(projekt, mal=ms_mal, villkor=ms_villkor)
+            st.dataframe(resultat, hide_index=True)
+            buf = io.StringIO()
+            skrivare = csv.writer(buf)
+            skrivare.writerow(resultat)
+            skrivare.writerows(zip(*resultat.values()))
+            st.download_button(
+                "Ladda ned resultatet (CSV)", buf.getvalue(), "malsokning.csv", "text/csv"
+            )
+
+if visa_kanslighet:
+    st.subheader("Känslighetsanalys: vad styr klimatneutraliteten vid LCA-periodens slut?")
+    st.image(bild("tornado", ks_nyckel, rita_tornado), width="stretch")
+    st.caption(
+        f"{ks.antal_korningar:,} modellkörningar. Parametrarna varieras över hela "
+        "reglageintervallen, övriga hålls på valda värden. Felstaplarna är 95 % "
+        "bootstrap-konfidensintervall."
+    )
 
 with st.expander("Vetenskaplig bakgrund & källor"):
     st.markdown(
@@ -198,6 +551,10 @@ with st.expander("Vetenskaplig bakgrund & källor"):
         - Klimatneutralitetsgrad = (ackumulerad CO₂ i skog / husets totala klimatpåverkan) × 100.
         - Netto = skillnad år för år mellan ackumulerat upptag i skog och lagrat i hus.
         - Ackumulerad CO₂ i skog nollställs vid varje ny skogsrotation.
+        - Som normalskog är arealen jämnt fördelad över åldersklasserna; förrådet är då
+          konstant och det summerade upptaget är den årliga tillväxten.
+        - Med en livslängdsfördelning rivs husen utspritt kring den valda livslängden;
+          CO₂ i husen är då väntevärdet och går mjukt i stället för i trappsteg.
         - Hantering av virke vid rivning styr fortsatt kolinlagring (se IVL/SLU-rapporter).
         """
     )
@@ -207,3 +564,8 @@ st.markdown(
     "[GitHub repository](https://github.com/Mulmen/klimatbalanserat_trahus).</small>",
     unsafe_allow_html=True
 )
+
+with st.expander("Cache-statistik"):
+    st.json(cache.statistik())
+
+visa_panel(matare.avsluta_omkorning())
@@ -0,0 +1,252 @@
+"""Målsökning: vilka parametervärden krävs för att nå 100 % klimatneutralitet?
+
+Klimatneutraliteten år t är 100 · skogsareal · bonitet · co2_per_m3 · (t mod
+rotation) / (BTA · klimatpåverkan_per_m2), dvs. linjär i tiden inom varje
+rotation. Det ger slutna uttryck för de flesta parametrar:
+
+- virke_per_m2, skogsareal_ha och bonitet ingår proportionellt och
+  klimatpåverkan_per_m2 och BTA omvänt proportionellt (när skogsarealen
+  beräknas ur virkesbehovet tar bonitet och BTA ut varandra och påverkar inte
+  klimatneutraliteten alls);
+- första året då målet nås ges direkt av tiden in i rotationen.
+
+Rotationen påverkar både lutningen och när skogen avverkas och är inte
+monoton. Den, och övriga parametrar som saknar slutet uttryck, löses med en
+vektoriserad rutnätssökning: exakt över alla heltal för heltalsparametrar och
+med bisektion mellan rutnätspunkterna för kontinuerliga parametrar.
+
+Alla funktioner tar arrayer, så en hel projekttabell löses i ett anrop.
+
+Uttrycken gäller modellens standardval: linjär tillväxt och ett jämnårigt
+bestånd som planteras år 0. Andra tillväxtkurvor och åldersstrukturer
+(tillvaxtmodell, aldersstruktur) ingår inte och ignoreras som andra okända namn.
+
+Villkoret "vid" betyder att målet ska vara uppfyllt just år ar (t.ex. vid
+LCA-periodens slut), "senast" att det ska ha uppnåtts något år t ≤ ar.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from modell import (
+    REGLAGEINTERVALL,
+    STANDARDVARDEN,
+    grundstorheter,
+    klimatneutralitetsserie,
+    skogsserie,
+)
+
+MAL = 100.0
+VILLKOR = ("senast", "vid")
+RUTNATSPUNKTER = 257
+BISEKTIONSSTEG = 60
+
+# Parametrar som kan lösas ut; skogsareal_ha och ar saknar reglage och har ingen övre gräns
+MALPARAMETRAR = (
+    "virke_per_m2",
+    "klimatpåverkan_per_m2",
+    "rotation",
+    "bonitet",
+    "BTA",
+    "skogsareal_ha",
+    "ar",
+)
+MALINTERVALL = {**REGLAGEINTERVALL, "skogsareal_ha": (0.0, np.inf), "ar": (0, np.inf)}
+HELTALSPARAMETRAR = ("rotation", "ar")
+MODELLPARAMETRAR = ("BTA", "virke_per_m2", "bonitet", "rotation", "klimatpåverkan_per_m2")
+
+
+class Malresultat(NamedTuple):
+    parameter: str
+    minsta: np.ndarray  # NaN där målet inte kan nås inom intervallet
+    storsta: np.ndarray
+    mojlig: np.ndarray
+
+
+def klimatneutralitet_vid(ar, villkor="senast", skogsareal_ha=None, **parametrar):
+    """Klimatneutraliteten år ar ("vid") eller den högsta för något år t ≤ ar ("senast").
+
+    Om skogsareal_ha anges används den i stället för arealen som krävs för
+    husets virke, t.ex. när en given skogsfastighet ska klimatbalansera huset.
+    """
+    p = {n: np.asarray(parametrar.get(n, STANDARDVARDEN[n])) for n in MODELLPARAMETRAR}
+    _, skogsareal, klimatpåverkan_total = grundstorheter(
+        p["BTA"], p["virke_per_m2"], p["bonitet"], p["rotation"], p["klimatpåverkan_per_m2"]
+    )
+    if skogsareal_ha is not None:
+        skogsareal = np.asarray(skogsareal_ha, dtype=float)
+    ar = np.asarray(ar)
+    if villkor == "senast":
+        # Skogen är som störst året före avverkning, dvs. vid rotation - 1
+        tid = np.minimum(ar, p["rotation"] - 1)
+    elif villkor == "vid":
+        tid = ar
+    else:
+        raise ValueError(f"Okänt villkor: {villkor!r}, välj bland {VILLKOR}")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return klimatneutralitetsserie(
+            skogsserie(skogsareal, p["bonitet"], p["rotation"], tid), klimatpåverkan_total
+        )
+
+
+def _exponent(parameter, med_areal):
+    """Hur klimatneutraliteten skalar med parametern: +1, -1, 0 eller None (inget slutet uttryck)."""
+    if parameter == "skogsareal_ha":
+        return 1
+    if parameter == "klimatpåverkan_per_m2":
+        return -1
+    if parameter == "virke_per_m2":
+        return 0 if med_areal else 1
+    if parameter == "bonitet":
+        return 1 if med_areal else 0
+    if parameter == "BTA":
+        return -1 if med_areal else 0
+    return None
+
+
+def _heltalskorrigering(kandidat, uppfyllt, lag, hog):
+    """Flyttar ett avrundat gränsvärde ett steg om flyttalsfel gett fel sida om målet."""
+    kandidat = np.where((kandidat - 1 >= lag) & uppfyllt(kandidat - 1), kandidat - 1, kandidat)
+    kandidat = np.where(~uppfyllt(kandidat) & (kandidat < hog), kandidat + 1, kandidat)
+    return np.where(uppfyllt(kandidat), kandidat, np.nan)
+
+
+def _flyttalskorrigering(grans, uppfyllt, riktning, steg=8):
+    """Flyttar en sluten rot några ulp mot riktning om flyttalsfel gett fel sida om målet."""
+    grans = np.asarray(grans, dtype=float)
+    for _ in range(steg):
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            fel = np.isfinite(grans) & ~uppfyllt(grans)
+        if not fel.any():
+            break
+        grans = np.where(fel, np.nextafter(grans, riktning), grans)
+    return grans
+
+
+def _rutnatssok(utvardera, mal, lag, hog, heltal, form):
+    """Minsta och största värde i [lag, hog] där utvardera(v) >= mal, för alla rader på en gång."""
+    if heltal:
+        rutnat = np.arange(int(np.ceil(lag)), int(np.floor(hog)) + 1)
+    else:
+        rutnat = np.linspace(lag, hog, RUTNATSPUNKTER)
+    uppfyllt = np.broadcast_to(utvardera(rutnat) >= mal, form + rutnat.shape)
+    nagot = uppfyllt.any(axis=-1)
+    forsta = uppfyllt.argmax(axis=-1)
+    sista = len(rutnat) - 1 - uppfyllt[..., ::-1].argmax(axis=-1)
+    minsta = np.where(nagot, rutnat[forsta], np.nan)
+    storsta = np.where(nagot, rutnat[sista], np.nan)
+    if heltal:
+        return minsta, storsta
+
+    # Bisektion mellan sista ej uppfyllda och första uppfyllda rutnätspunkt
+    def bisektion(ej, ja):
+        for _ in range(BISEKTIONSSTEG):
+            mitt = (ej + ja) / 2
+            ok = utvardera(mitt[..., None])[..., 0] >= mal
+            ja, ej = np.where(ok, mitt, ja), np.where(ok, ej, mitt)
+        return ja
+
+    if np.any(nagot & (forsta > 0)):
+        fore = rutnat[np.maximum(forsta - 1, 0)]
+        minsta = np.where(nagot & (forsta > 0), bisektion(fore, np.nan_to_num(minsta)), minsta)
+    if np.any(nagot & (sista < len(rutnat) - 1)):
+        efter = rutnat[np.minimum(sista + 1, len(rutnat) - 1)]
+        storsta = np.where(
+            nagot & (sista < len(rutnat) - 1), bisektion(efter, np.nan_to_num(storsta)), storsta
+        )
+    return minsta, storsta
+
+
+def malsok(parameter, ar=None, mal=MAL, villkor="senast", intervall=None, **parametrar):
+    """Minsta och största värde på parameter som ger klimatneutralitet >= mal.
+
+    Övriga parametrar ges som skalärer eller arrayer (en rad per projekt) med
+    samma namn som i modell.simulera; saknade får reglagens standardvärden och
+    okända namn ignoreras, så en tabell från batch.tolka_block kan skickas in
+    direkt. ar är målåret och blir LCA-perioden om det inte anges. För
+    parameter="ar" är svaret första året då målet nås.
+
+    Med villkor="vid" kan de möjliga värdena för rotationen vara flera skilda
+    intervall; t.ex. ger rotation = ar noll, eftersom skogen just avverkats.
+    minsta och största är då de yttre gränserna, och värden mellan dem behöver
+    inte nå målet.
+    """
+    if parameter not in MALPARAMETRAR:
+        raise ValueError(f"Kan inte lösa ut {parameter!r}, välj bland {MALPARAMETRAR}")
+    lag, hog = {**MALINTERVALL, **(intervall or {})}[parameter]
+    if ar is None:
+        ar = parametrar.get("LCA_period", STANDARDVARDEN["LCA_period"])
+    skogsareal_ha = parametrar.get("skogsareal_ha")
+    med_areal = skogsareal_ha is not None
+    p = {n: np.asarray(parametrar.get(n, STANDARDVARDEN[n])) for n in MODELLPARAMETRAR}
+    form = np.broadcast_shapes(np.shape(ar), np.shape(skogsareal_ha), *(a.shape for a in p.values()))
+
+    def utvardera(varde):
+        # varde har en extra sista axel (rutnätet); övriga parametrar får en motsvarande axel
+        q = {n: a[..., None] for n, a in p.items()}
+        areal = None if skogsareal_ha is None else np.asarray(skogsareal_ha)[..., None]
+        if parameter == "skogsareal_ha":
+            areal = varde
+        else:
+            q[parameter] = varde
+        return klimatneutralitet_vid(np.asarray(ar)[..., None], villkor, areal, **q)
+
+    exponent = _exponent(parameter, med_areal)
+    if parameter == "ar":
+        # Klimatneutraliteten växer linjärt med tiden i rotationen; första året
+        # då målet nås är tiden som krävs, om den ryms före avverkningen
+        per_ar = klimatneutralitet_vid(1, "vid", skogsareal_ha, **p)
+        with np.errstate(divide="ignore"):
+            kandidat = np.ceil(mal / per_ar)
+        # Kan målet inte nås används rotationen, som alltid ger noll och alltså faller bort
+        kandidat = np.where(np.isfinite(kandidat), np.maximum(kandidat, lag), p["rotation"])
+
+        def uppfyllt(t):
+            return klimatneutralitet_vid(t, "vid", skogsareal_ha, **p) >= mal
+
+        minsta = _heltalskorrigering(kandidat, uppfyllt, lag, p["rotation"] - 1)
+        storsta = np.where(np.isnan(minsta), np.nan, hog)
+    elif exponent in (1, -1):
+        nuvarande = klimatneutralitet_vid(ar, villkor, skogsareal_ha, **p)
+        if parameter == "skogsareal_ha":
+            varde = np.asarray(skogsareal_ha) if med_areal else grundstorheter(
+                p["BTA"], p["virke_per_m2"], p["bonitet"], p["rotation"], p["klimatpåverkan_per_m2"]
+            )[1]
+        else:
+            varde = p[parameter]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            grans = varde * (mal / nuvarande) ** exponent
+        grans = np.where(nuvarande > 0, grans, np.inf if exponent == 1 else 0.0)
+        # Roten kontrolleras mot modellen så att gränsvärdet verkligen når målet
+        grans = _flyttalskorrigering(
+            grans, lambda v: utvardera(v[..., None])[..., 0] >= mal, np.inf * exponent
+        )
+        if exponent == 1:
+            minsta = np.where(np.isfinite(grans) & (grans <= hog), np.maximum(grans, lag), np.nan)
+            storsta = np.where(np.isnan(minsta), np.nan, hog)
+        else:
+            storsta = np.where(grans >= lag, np.minimum(grans, hog), np.nan)
+            minsta = np.where(np.isnan(storsta), np.nan, lag)
+    else:
+        minsta, storsta = _rutnatssok(
+            utvardera, mal, lag, hog, parameter in HELTALSPARAMETRAR, form
+        )
+
+    minsta = np.broadcast_to(minsta, form).astype(float)
+    storsta = np.broadcast_to(storsta, form).astype(float)
+    return Malresultat(parameter, minsta, storsta, ~np.isnan(minsta))
+
+
+def malsok_tabell(parametrar, malparametrar=MALPARAMETRAR, ar=None, mal=MAL, villkor="senast"):
+    """Löser ut varje parameter i malparametrar för alla rader i en projekttabell.
+
+    Returnerar kolumner <parameter>_min och <parameter>_max; om tabellen har en
+    kolumn id förs den vidare.
+    """
+    ut = {"id": parametrar["id"]} if "id" in parametrar else {}
+    for namn in malparametrar:
+        res = malsok(namn, ar=ar, mal=mal, villkor=villkor, **parametrar)
+        ut[f"{namn}_min"] = res.minsta
+        ut[f"{namn}_max"] = res.storsta
+    return ut
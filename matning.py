@@ -0,0 +1,350 @@
+"""Mätning av tid och allokeringar per steg i varje omkörning av apparna.
+
+En sida anropar matare.starta_omkorning() först och matare.avsluta_omkorning()
+sist; däremellan mäts varje steg med ``with matare.steg("namn"):``. Steg kan
+nästlas och får då sammansatta namn, t.ex. "figur:fig1/png" för PNG-kodningen
+i figuren fig1. Tiden som inte hamnar i något steg på översta nivån, dvs.
+Streamlits egna anrop och sidans övriga kod, redovisas som "övrigt".
+
+För varje steg sparas:
+
+- väggklockstid;
+- nettoförändringen av antalet allokerade minnesblock (sys.getallocatedblocks);
+- med KLIMAT_MATNING_TRACEMALLOC=1 även nettoförändringen i byte enligt
+  tracemalloc, som också räknar NumPys arrayer men gör allt långsammare.
+
+Ett steg kan också notera sitt cacheutfall med matare.notera("träff"), t.ex.
+noderna i beräkningsgrafen (berakningsgraf.py) och figurerna. Utfallen visas
+per steg i den senaste omkörningen och räknas ihop per sida och steg.
+
+Mätvärdena samlas processgemensamt i rullande fönster per sida och steg, och
+p50/p95/p99 räknas över fönstret. De kan läsas i sidornas felsökningspanel och
+exporteras i Prometheus textformat:
+
+- KLIMAT_METRIK_FIL=sökväg skriver filen efter omkörningarna (högst en gång
+  per sekund), t.ex. för node_exporters textfile-insamlare;
+- KLIMAT_METRIK_PORT=9464 startar en lokal HTTP-server på 127.0.0.1 som
+  svarar på /metrics.
+
+Utanför en påbörjad omkörning, t.ex. i batchjobb, är steg() utan verkan.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import NamedTuple
+
+import numpy as np
+
+FONSTER = int(os.environ.get("KLIMAT_MATNING_FONSTER", "1024"))
+PERCENTILER = (50, 95, 99)
+METRIK_FIL = os.environ.get("KLIMAT_METRIK_FIL")
+METRIK_PORT = os.environ.get("KLIMAT_METRIK_PORT")
+SKRIVINTERVALL = 1.0
+OMKORNING = "omkörning"
+OVRIGT = "övrigt"
+
+if os.environ.get("KLIMAT_MATNING_TRACEMALLOC") == "1" and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+class Steg(NamedTuple):
+    namn: str
+    sekunder: float
+    block: int
+    bytes: int  # 0 om tracemalloc inte är igång
+    djup: int
+    utfall: str = ""  # cacheutfall som steget noterat, t.ex. "träff" eller "miss"
+
+
+class Omkorning(NamedTuple):
+    sida: str
+    sekunder: float
+    steg: list
+
+
+def _minnesstand():
+    traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    return sys.getallocatedblocks(), traced
+
+
+class _Pagaende:
+    def __init__(self, sida):
+        self.sida = sida
+        self.start = time.perf_counter()
+        self.steg = []
+        self.stack = []
+        self.platser = []
+        self.utfall = {}
+
+
+class Matare:
+    def __init__(self, fonster=FONSTER, metrik_fil=METRIK_FIL):
+        self.fonster = fonster
+        self.metrik_fil = metrik_fil
+        self._tider = defaultdict(lambda: deque(maxlen=self.fonster))
+        self._block = defaultdict(lambda: deque(maxlen=self.fonster))
+        # Kumulativa summor för Prometheus _sum och _count
+        self._summa = defaultdict(float)
+        self._antal = defaultdict(int)
+        # Antal cacheutfall per (sida, steg, utfall) sedan start
+        self._utfall = defaultdict(int)
+        self._senast_skrivet = 0.0
+        self._las = threading.Lock()
+        # Streamlit kör varje sessions skript i en egen tråd
+        self._lokal = threading.local()
+
+    def starta_omkorning(self, sida):
+        """Påbörjar mätningen av en omkörning av sidan; en avbruten omkörning kastas."""
+        self._lokal.pagaende = _Pagaende(sida)
+
+    @contextmanager
+    def steg(self, namn):
+        pagaende = getattr(self._lokal, "pagaende", None)
+        if pagaende is None:
+            yield
+            return
+        pagaende.stack.append(namn)
+        fullt_namn = "/".join(pagaende.stack)
+        # Platsen reserveras här så att stegen listas i startordning även när de nästlas
+        plats = len(pagaende.steg)
+        pagaende.steg.append(None)
+        pagaende.platser.append(plats)
+        block, traced = _minnesstand()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            sekunder = time.perf_counter() - start
+            block_efter, traced_efter = _minnesstand()
+            pagaende.stack.pop()
+            pagaende.platser.pop()
+            pagaende.steg[plats] = Steg(
+                fullt_namn, sekunder, block_efter - block, traced_efter - traced,
+                len(pagaende.stack), pagaende.utfall.get(plats, ""),
+            )
+
+    def notera(self, utfall):
+        """Noterar det innersta pågående stegets cacheutfall, t.ex. "träff" eller "miss"."""
+        pagaende = getattr(self._lokal, "pagaende", None)
+        if pagaende is None or not pagaende.platser:
+            return
+        pagaende.utfall[pagaende.platser[-1]] = utfall
+
+    def avsluta_omkorning(self):
+        """Avslutar omkörningen, lägger in stegen i fönstren och returnerar en Omkorning."""
+        pagaende = getattr(self._lokal, "pagaende", None)
+        if pagaende is None:
+            return None
+        self._lokal.pagaende = None
+        sekunder = time.perf_counter() - pagaende.start
+        steg = [s for s in pagaende.steg if s is not None]
+        ovrigt = sekunder - sum(s.sekunder for s in steg if s.djup == 0)
+        steg.append(Steg(OVRIGT, max(ovrigt, 0.0), 0, 0, 0))
+        with self._las:
+            matningar = [(OMKORNING, sekunder, 0)] + [(s.namn, s.sekunder, s.block) for s in steg]
+            for namn, tid, block in matningar:
+                nyckel = (pagaende.sida, namn)
+                self._tider[nyckel].append(tid)
+                self._block[nyckel].append(block)
+                self._summa[nyckel] += tid
+                self._antal[nyckel] += 1
+            for s in steg:
+                if s.utfall:
+                    self._utfall[(pagaende.sida, s.namn, s.utfall)] += 1
+        self._skriv_fil()
+        return Omkorning(pagaende.sida, sekunder, steg)
+
+    def percentiler(self, sida=None):
+        """{(sida, steg): {"antal", "p50", "p95", "p99", "block_p50"}} över de rullande fönstren."""
+        with self._las:
+            fonster = {
+                n: (np.array(t), np.array(self._block[n]), self._summa[n], self._antal[n])
+                for n, t in self._tider.items() if sida is None or n[0] == sida
+            }
+        ut = {}
+        for nyckel, (tider, block, summa, antal) in sorted(fonster.items()):
+            p = np.percentile(tider, PERCENTILER)
+            ut[nyckel] = {
+                "antal": antal,
+                "summa": summa,
+                **{f"p{q}": float(v) for q, v in zip(PERCENTILER, p)},
+                "block_p50": float(np.percentile(block, 50)),
+            }
+        return ut
+
+    def cacheutfall(self, sida=None):
+        """{(sida, steg): {utfall: antal}} för stegen som noterat cacheutfall."""
+        with self._las:
+            rakningar = list(self._utfall.items())
+        ut = defaultdict(dict)
+        for (s, steg, utfall), antal in sorted(rakningar):
+            if sida is None or s == sida:
+                ut[(s, steg)][utfall] = antal
+        return dict(ut)
+
+    def prometheus(self):
+        """Mätvärdena i Prometheus textformat (summary per sida och steg)."""
+        from resultatcache import cache
+
+        rader = [
+            "# HELP klimat_steg_sekunder Tid per steg och omkörning, kvantiler över ett rullande fönster.",
+            "# TYPE klimat_steg_sekunder summary",
+        ]
+        percentiler = self.percentiler()
+        for (sida, steg), p in percentiler.items():
+            etiketter = f'sida="{_etikett(sida)}",steg="{_etikett(steg)}"'
+            for q in PERCENTILER:
+                rader.append(f'klimat_steg_sekunder{{{etiketter},quantile="{q / 100}"}} {p[f"p{q}"]:.9g}')
+            rader.append(f"klimat_steg_sekunder_sum{{{etiketter}}} {p['summa']:.9g}")
+            rader.append(f"klimat_steg_sekunder_count{{{etiketter}}} {p['antal']}")
+        rader += [
+            "# HELP klimat_steg_allokerade_block Median av nettoförändringen i allokerade minnesblock per steg.",
+            "# TYPE klimat_steg_allokerade_block gauge",
+        ]
+        for (sida, steg), p in percentiler.items():
+            rader.append(
+                f'klimat_steg_allokerade_block{{sida="{_etikett(sida)}",steg="{_etikett(steg)}"}} '
+                f"{p['block_p50']:.9g}"
+            )
+        rader += [
+            "# HELP klimat_steg_cacheutfall_total Cacheutfall per steg, t.ex. per nod i beräkningsgrafen.",
+            "# TYPE klimat_steg_cacheutfall_total counter",
+        ]
+        for (sida, steg), utfall in self.cacheutfall().items():
+            for namn, antal in utfall.items():
+                rader.append(
+                    f'klimat_steg_cacheutfall_total{{sida="{_etikett(sida)}",steg="{_etikett(steg)}",'
+                    f'utfall="{_etikett(namn)}"}} {antal}'
+                )
+        statistik = cache.statistik()
+        for namn, typ, varde in (
+            ("klimat_cache_traffar_total", "counter", statistik["träffar"]),
+            ("klimat_cache_missar_total", "counter", statistik["missar"]),
+            ("klimat_cache_utkastade_total", "counter", statistik["utkastade"]),
+            ("klimat_cache_poster", "gauge", statistik["poster"]),
+            ("klimat_cache_bytes", "gauge", statistik["bytes"]),
+        ):
+            rader += [f"# TYPE {namn} {typ}", f"{namn} {varde}"]
+        return "\n".join(rader) + "\n"
+
+    def _skriv_fil(self):
+        if not self.metrik_fil:
+            return
+        nu = time.monotonic()
+        with self._las:
+            if nu - self._senast_skrivet < SKRIVINTERVALL:
+                return
+            self._senast_skrivet = nu
+        # Skrivs atomärt så att insamlaren aldrig läser en halvskriven fil
+        tillfallig = f"{self.metrik_fil}.{os.getpid()}.tmp"
+        with open(tillfallig, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tillfallig, self.metrik_fil)
+
+    def rensa(self):
+        with self._las:
+            self._tider.clear()
+            self._block.clear()
+            self._summa.clear()
+            self._antal.clear()
+            self._utfall.clear()
+
+
+def _etikett(text):
+    return text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_server = None
+_server_las = threading.Lock()
+
+
+def starta_server(port):
+    """Startar en lokal HTTP-server för /metrics i en bakgrundstråd, en gång per process."""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Hanterare(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            kropp = matare.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(kropp)))
+            self.end_headers()
+            self.wfile.write(kropp)
+
+        def log_message(self, *args):
+            pass
+
+    with _server_las:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("127.0.0.1", int(port)), Hanterare)
+            except OSError:
+                # Porten är upptagen, t.ex. av en annan serverprocess på samma maskin
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
+
+
+def visa_panel(omkorning, sida=None):
+    """Felsökningspanel i Streamlit: senaste omkörningens steg och percentiler per steg."""
+    import streamlit as st
+
+    if omkorning is None:
+        return
+    with st.expander("⏱️ Prestandamätning"):
+        st.markdown(f"**Senaste omkörningen: {1000 * omkorning.sekunder:.1f} ms**")
+        st.dataframe(
+            {
+                "Steg": ["    " * s.djup + s.namn.split("/")[-1] for s in omkorning.steg],
+                "Tid (ms)": [round(1000 * s.sekunder, 2) for s in omkorning.steg],
+                "Allokerade block": [s.block for s in omkorning.steg],
+                "Cache": [s.utfall for s in omkorning.steg],
+                **({"Byte (tracemalloc)": [s.bytes for s in omkorning.steg]}
+                   if tracemalloc.is_tracing() else {}),
+            },
+            hide_index=True,
+        )
+        percentiler = matare.percentiler(sida or omkorning.sida)
+        st.markdown(f"**Rullande fönster (senaste {matare.fonster} per steg)**")
+        st.dataframe(
+            {
+                "Steg": [steg for _, steg in percentiler],
+                "Antal": [p["antal"] for p in percentiler.values()],
+                **{
+                    f"p{q} (ms)": [round(1000 * p[f"p{q}"], 2) for p in percentiler.values()]
+                    for q in PERCENTILER
+                },
+                "Block (p50)": [p["block_p50"] for p in percentiler.values()],
+            },
+            hide_index=True,
+        )
+        utfall = matare.cacheutfall(sida or omkorning.sida)
+        if utfall:
+            st.markdown("**Cacheutfall per steg sedan start**")
+            namn = sorted({u for antal in utfall.values() for u in antal})
+            st.dataframe(
+                {
+                    "Steg": [steg for _, steg in utfall],
+                    **{u: [antal.get(u, 0) for antal in utfall.values()] for u in namn},
+                },
+                hide_index=True,
+            )
+        st.caption(
+            "Samma mätvärden exporteras i Prometheus textformat med KLIMAT_METRIK_FIL "
+            "eller KLIMAT_METRIK_PORT (se matning.py)."
+        )
+
+
+# Delas av alla sessioner i serverprocessen
+matare = Matare()
+if METRIK_PORT:
+    starta_server(METRIK_PORT)
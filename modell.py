@@ -0,0 +1,277 @@
+"""Beräkningsmotor för klimatbalanserat trähus.
+
+Modulen innehåller samma modell som Streamlit-apparna men utan UI-beroenden,
+så att den kan anropas från batchjobb och andra skript. Alla serier beräknas
+med hela NumPy-arrayer i stället för en Python-loop per år, och funktionerna
+broadcastar så att parametrarna även kan ges som arrayer (ett scenario per rad).
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+kg_torrsubstans_per_m3 = 750
+kolandel = 0.5
+co2_per_kg_kol = 3.67
+co2_per_m3 = kg_torrsubstans_per_m3 * kolandel * co2_per_kg_kol / 1000
+
+VIRKES_HANTERINGAR = ("ateranvandning", "bioccs", "konventionell")
+# Alla kombinationer av virkes_hantering och bygg_igen, i den ordning simulera_varianter ger dem
+SLUTSKEDEN = tuple((vh, bi) for vh in VIRKES_HANTERINGAR for bi in (True, False))
+
+# Tillåtna intervall för parametrarna, samma som reglagen i apparna
+REGLAGEINTERVALL = {
+    "BTA": (100, 10000),
+    "virke_per_m2": (0.1, 1.0),
+    "bonitet": (4.0, 10.0),
+    "LCA_period": (30, 100),
+    "rotation": (50, 150),
+    "hus_livslangd": (20, 200),
+    "max_years": (50, 200),
+    "klimatpåverkan_per_m2": (0.150, 0.500),
+}
+
+# Reglagens standardvärden
+STANDARDVARDEN = {
+    "BTA": 150,
+    "virke_per_m2": 0.35,
+    "bonitet": 8.0,
+    "LCA_period": 50,
+    "rotation": 80,
+    "hus_livslangd": 100,
+    "max_years": 200,
+    "klimatpåverkan_per_m2": 0.250,
+    "virkes_hantering": "ateranvandning",
+    "bygg_igen": True,
+}
+
+
+class Resultat(NamedTuple):
+    years: np.ndarray
+    co2_i_skog: np.ndarray
+    co2_i_hus: np.ndarray
+    klimatneutralitet: np.ndarray
+    cum_co2_skog: np.ndarray
+    cum_co2_hus: np.ndarray
+    cum_co2_summa: np.ndarray
+    co2_total: float
+    skogsareal_ha: float
+    klimatpåverkan_total: float
+    klimatbalans_maxandel: float
+
+
+def grundstorheter(BTA, virke_per_m2, bonitet, rotation, klimatpåverkan_per_m2,
+                   tillvaxtmodell="linjar"):
+    """Returnerar (co2_total, skogsareal_ha, klimatpåverkan_total)."""
+    virkesvolym_total = BTA * virke_per_m2
+    kol_total = virkesvolym_total * kg_torrsubstans_per_m3 * kolandel
+    co2_total = kol_total * co2_per_kg_kol / 1000
+
+    if tillvaxtmodell == "linjar":
+        virke_per_ha_per_rotation = bonitet * rotation
+    else:
+        from tillvaxt import volym_per_ha
+
+        virke_per_ha_per_rotation = volym_per_ha(tillvaxtmodell, bonitet, rotation)
+    skogsareal_ha = virkesvolym_total / virke_per_ha_per_rotation
+    klimatpåverkan_total = BTA * klimatpåverkan_per_m2
+    return co2_total, skogsareal_ha, klimatpåverkan_total
+
+
+def maxandel(LCA_period, rotation):
+    """Max klimatbalanserbar andel (%) enligt policy: LCA-period ÷ rotationsperiod."""
+    return np.minimum(100 * LCA_period / rotation, 100)
+
+
+def skogsserie(skogsareal_ha, bonitet, rotation, years, tillvaxtmodell="linjar"):
+    # Skogen växer enligt tillväxtkurvan och nollställs vid varje ny rotation
+    if tillvaxtmodell == "linjar":
+        return skogsareal_ha * bonitet * co2_per_m3 * (years % rotation)
+    from tillvaxt import volym_per_ha
+
+    return skogsareal_ha * co2_per_m3 * volym_per_ha(tillvaxtmodell, bonitet, years % rotation)
+
+
+def husserie(co2_total, hus_livslangd, years, virkes_hantering, bygg_igen, livslangd="fast"):
+    # Parametrarna kan vara skalärer eller arrayer med formen (..., 1); years är
+    # den sista axeln. Varje scenario hör till exakt ett av fallen nedan, så
+    # serien fylls rad för rad per fall i stället för med nästlade np.where.
+    if not (isinstance(livslangd, str) and livslangd == "fast"):
+        # Spridda livslängder ger väntevärdet över överlevnadskurvan (livslangd.py)
+        from livslangd import huspool
+
+        return huspool(
+            co2_total, hus_livslangd, years, virkes_hantering, bygg_igen, livslangd
+        ).co2_i_hus
+    years = np.asarray(years)
+    co2_total, hus_livslangd, virkes_hantering, bygg_igen = np.broadcast_arrays(
+        np.asarray(co2_total, dtype=float),
+        np.asarray(hus_livslangd),
+        np.asarray(virkes_hantering),
+        np.asarray(bygg_igen, dtype=bool),
+    )
+    form = np.broadcast_shapes(co2_total.shape, years.shape)
+    co2_total = co2_total.reshape(-1, 1)
+    hus_livslangd = hus_livslangd.reshape(-1, 1)
+    virkes_hantering = virkes_hantering.ravel()
+    bygg_igen = bygg_igen.ravel()
+
+    konventionell = virkes_hantering == "konventionell"
+    lagrad = (virkes_hantering == "ateranvandning") | (virkes_hantering == "bioccs")
+    trappa = lagrad & bygg_igen
+    block = (lagrad & ~bygg_igen) | (konventionell & bygg_igen)
+    forsta_huset = konventionell & ~bygg_igen
+
+    co2_i_hus = np.zeros((co2_total.shape[0], years.shape[-1]))
+    # TRAPPA: virket lever vidare i varje nytt hus
+    antal_hus = years // hus_livslangd[trappa] + 1
+    co2_i_hus[trappa] = antal_hus * co2_total[trappa]
+    # BLOCK: inlagringen ligger kvar hela perioden
+    co2_i_hus[block] = co2_total[block]
+    # Konventionell förbränning utan nybygge: inlagringen försvinner vid rivning
+    co2_i_hus[forsta_huset] = np.where(
+        years < hus_livslangd[forsta_huset], co2_total[forsta_huset], 0.0
+    )
+    return co2_i_hus.reshape(form)
+
+
+def klimatneutralitetsserie(co2_i_skog, klimatpåverkan_total):
+    klimatpåverkan_total = np.asarray(klimatpåverkan_total, dtype=float)
+    if np.all(klimatpåverkan_total > 0):
+        return 100 * co2_i_skog / klimatpåverkan_total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        andel = 100 * co2_i_skog / klimatpåverkan_total
+    return np.where(klimatpåverkan_total > 0, andel, np.nan)
+
+
+def kumulativa_serier(co2_i_skog, co2_i_hus, rotation, years):
+    """Returnerar (cum_co2_skog, cum_co2_hus, cum_co2_summa) längs sista axeln."""
+    # Vid varje ny rotation läggs ett "varv" till det ackumulerade skogsupptaget,
+    # annars adderas årets förändring. np.cumsum summerar sekventiellt, vilket
+    # ger exakt samma flyttal som den tidigare år-för-år-loopen.
+    ny_rotation = (years[1:] % rotation) == 0
+    skog_steg = np.where(
+        ny_rotation, co2_i_skog[..., 1:], co2_i_skog[..., 1:] - co2_i_skog[..., :-1]
+    )
+    skog_steg = np.concatenate([co2_i_skog[..., :1], skog_steg], axis=-1)
+    hus_steg = np.concatenate(
+        [co2_i_hus[..., :1], co2_i_hus[..., 1:] - co2_i_hus[..., :-1]], axis=-1
+    )
+    cum_co2_skog = np.cumsum(skog_steg, axis=-1)
+    cum_co2_hus = np.cumsum(hus_steg, axis=-1)
+    return cum_co2_skog, cum_co2_hus, cum_co2_skog + cum_co2_hus
+
+
+def simulera(
+    BTA,
+    virke_per_m2,
+    bonitet,
+    rotation,
+    hus_livslangd,
+    max_years,
+    klimatpåverkan_per_m2,
+    virkes_hantering="ateranvandning",
+    bygg_igen=True,
+    LCA_period=50,
+    aldersstruktur="jamnarig",
+    tillvaxtmodell="linjar",
+    livslangd="fast",
+):
+    """Kör modellen för ett scenario och returnerar alla serier som ett Resultat.
+
+    Med aldersstruktur="jamnarig" är skogen ett enda bestånd som planteras år 0.
+    Annars beräknas skogen som ett landskap med åldersklasser i
+    skogslandskap.py, t.ex. "normalskog" eller arealandelar per ålder.
+    tillvaxtmodell väljer tillväxtkurvan i tillvaxt.py och livslangd husens
+    livslängdsfördelning i livslangd.py.
+    """
+    years = np.arange(max_years + 1)
+    co2_total, skogsareal_ha, klimatpåverkan_total = grundstorheter(
+        BTA, virke_per_m2, bonitet, rotation, klimatpåverkan_per_m2, tillvaxtmodell
+    )
+
+    co2_i_hus = husserie(co2_total, hus_livslangd, years, virkes_hantering, bygg_igen, livslangd)
+    if isinstance(aldersstruktur, str) and aldersstruktur == "jamnarig":
+        co2_i_skog = skogsserie(
+            skogsareal_ha, bonitet, rotation, years, tillvaxtmodell
+        ).astype(float)
+        cum_co2_skog, cum_co2_hus, cum_co2_summa = kumulativa_serier(
+            co2_i_skog, co2_i_hus, rotation, years
+        )
+    else:
+        from skogslandskap import aldersfordelat, simulera_landskap
+
+        landskap = simulera_landskap(
+            aldersfordelat(skogsareal_ha, bonitet, rotation, aldersstruktur), max_years,
+            tillvaxtmodell,
+        )
+        co2_i_skog, cum_co2_skog = landskap.co2_i_skog, landskap.cum_co2_skog
+        cum_co2_hus = kumulativa_serier(co2_i_skog, co2_i_hus, rotation, years)[1]
+        cum_co2_summa = cum_co2_skog + cum_co2_hus
+    klimatneutralitet = klimatneutralitetsserie(co2_i_skog, klimatpåverkan_total)
+
+    return Resultat(
+        years=years,
+        co2_i_skog=co2_i_skog,
+        co2_i_hus=co2_i_hus,
+        klimatneutralitet=klimatneutralitet,
+        cum_co2_skog=cum_co2_skog,
+        cum_co2_hus=cum_co2_hus,
+        cum_co2_summa=cum_co2_summa,
+        co2_total=co2_total,
+        skogsareal_ha=skogsareal_ha,
+        klimatpåverkan_total=klimatpåverkan_total,
+        klimatbalans_maxandel=min(100 * LCA_period / rotation, 100),
+    )
+
+
+def simulera_varianter(
+    BTA,
+    virke_per_m2,
+    bonitet,
+    rotation,
+    hus_livslangd,
+    max_years,
+    klimatpåverkan_per_m2,
+    LCA_period=50,
+    aldersstruktur="jamnarig",
+    tillvaxtmodell="linjar",
+    livslangd="fast",
+):
+    """Kör modellen för alla slutskeden i SLUTSKEDEN i ett anrop.
+
+    Skogen beror inte på vad som händer med virket, så skogsserierna och
+    klimatneutraliteten räknas en gång och har formen (år,). Husets serier
+    och cum_co2_summa har en rad per slutskede, formen (6, år).
+    """
+    hantering, bygg = zip(*SLUTSKEDEN)
+    return simulera(
+        BTA, virke_per_m2, bonitet, rotation, hus_livslangd, max_years, klimatpåverkan_per_m2,
+        virkes_hantering=np.array(hantering)[:, None], bygg_igen=np.array(bygg)[:, None],
+        LCA_period=LCA_period, aldersstruktur=aldersstruktur, tillvaxtmodell=tillvaxtmodell,
+        livslangd=livslangd,
+    )
+
+
+def valj_variant(varianter, virkes_hantering, bygg_igen):
+    """Resultatet för ett slutskede ur simulera_varianter, utan att räkna om något."""
+    rad = SLUTSKEDEN.index((virkes_hantering, bool(bygg_igen)))
+    return varianter._replace(
+        co2_i_hus=varianter.co2_i_hus[rad],
+        cum_co2_hus=varianter.cum_co2_hus[rad],
+        cum_co2_summa=varianter.cum_co2_summa[rad],
+    )
+
+
+def sammanfatta_varianter(varianter, LCA_period):
+    """Nyckeltal per slutskede: {namn: array med en rad per slutskede i SLUTSKEDEN}."""
+    ar = min(int(LCA_period), len(varianter.years) - 1)
+    lagrat = varianter.co2_i_skog + varianter.co2_i_hus
+    antal = len(SLUTSKEDEN)
+    return {
+        "klimatneutralitet_lca": np.full(antal, varianter.klimatneutralitet[ar]),
+        "max_co2_i_hus": varianter.co2_i_hus.max(axis=-1),
+        "max_co2_lagrat": lagrat.max(axis=-1),
+        "cum_co2_summa_lca": varianter.cum_co2_summa[:, ar],
+        "cum_co2_summa_slut": varianter.cum_co2_summa[:, -1],
+    }
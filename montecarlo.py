@@ -0,0 +1,208 @@
+"""Monte Carlo-analys av osäkerheten i klimatbalansmodellen.
+
+Osäkra parametrar dras från fördelningar kring reglagevärdena och modellen körs
+blockvis med svep.berakna_block(). Varje block reduceras direkt till ett
+histogram per år, så hela matrisen (stickprov × år) hålls aldrig i minnet.
+Percentilerna (t.ex. P5/P50/P95) läses sedan ut ur de sammanslagna histogrammen.
+
+Blocken har fast storlek och varje block får en egen slumpgenerator härledd ur
+fröet, och histogrammen slås ihop i blockordning. Resultatet blir därför
+identiskt oavsett hur många processer som används.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from modell import REGLAGEINTERVALL, co2_per_m3
+from svep import PARAMETRAR, STANDARDVARDEN, berakna_block, modellval
+
+MC_CHUNK = 16384
+BINS = 2048
+
+OSAKRA_PARAMETRAR = (
+    "bonitet",
+    "virke_per_m2",
+    "klimatpåverkan_per_m2",
+    "rotation",
+    "hus_livslangd",
+)
+HELTALSPARAMETRAR = ("rotation", "hus_livslangd")
+FORDELNINGAR = ("normal", "lognormal", "likformig", "triangel")
+MC_SERIER = ("klimatneutralitet", "co2_i_skog", "co2_i_hus")
+
+
+class MCResultat(NamedTuple):
+    years: np.ndarray
+    q: tuple
+    percentiler: dict  # serie -> array (len(q), år)
+    medel: dict  # serie -> array (år,)
+    antal: int
+
+
+class PercentilHistogram:
+    """Strömmande percentilberäkning per år med fasta histogramfack.
+
+    Facken täcker [0, ovre_grans]; värden utanför hamnar i första/sista facket.
+    Felet i en percentil är högst en fackbredd, ovre_grans / bins.
+    """
+
+    def __init__(self, antal_ar, ovre_grans, bins=BINS):
+        self.bins = bins
+        self.ovre_grans = float(ovre_grans)
+        self.antal = 0
+        self.summa = np.zeros(antal_ar)
+        self.rakning = np.zeros((antal_ar, bins), dtype=np.int64)
+
+    def rakna(self, varden):
+        """Histogram per år för ett block med formen (stickprov × år)."""
+        antal_ar = varden.shape[1]
+        fack = varden * (self.bins / self.ovre_grans)
+        np.fmax(fack, 0.0, out=fack)  # fmax ersätter även NaN med 0
+        np.minimum(fack, self.bins - 1, out=fack)
+        fack = fack.astype(np.intp)
+        fack += np.arange(antal_ar) * self.bins
+        rakning = np.bincount(fack.ravel(), minlength=antal_ar * self.bins)
+        return rakning.reshape(antal_ar, self.bins), varden.sum(axis=0), varden.shape[0]
+
+    def lagg_till(self, rakning, summa, antal):
+        self.rakning += rakning
+        self.summa += summa
+        self.antal += antal
+
+    def medel(self):
+        return self.summa / self.antal
+
+    def percentiler(self, q):
+        # Linjär interpolation inom facket där den kumulativa andelen passerar q
+        kumulativ = np.cumsum(self.rakning, axis=1)
+        bredd = self.ovre_grans / self.bins
+        ut = np.empty((len(q), kumulativ.shape[0]))
+        for i, p in enumerate(q):
+            mal = p / 100 * self.antal
+            fack = np.minimum((kumulativ < mal).sum(axis=1), self.bins - 1)
+            rader = np.arange(kumulativ.shape[0])
+            fore = np.where(fack > 0, kumulativ[rader, fack - 1], 0)
+            i_facket = self.rakning[rader, fack]
+            andel = np.where(i_facket > 0, (mal - fore) / np.maximum(i_facket, 1), 0.0)
+            ut[i] = (fack + np.clip(andel, 0.0, 1.0)) * bredd
+        return ut
+
+
+def dra_stickprov(rng, centrum, osakerhet, antal):
+    """Drar stickprov för de osäkra parametrarna kring centrumvärdena.
+
+    osakerhet mappar parameternamn till (fördelning, spridning), där spridningen
+    är relativ till centrumvärdet: standardavvikelse för "normal", sigma för
+    "lognormal" och halva intervallbredden för "likformig" och "triangel".
+    Stickproven klipps till REGLAGEINTERVALL.
+    """
+    stickprov = {}
+    for namn in OSAKRA_PARAMETRAR:
+        mitt = float(centrum[namn])
+        if namn not in osakerhet:
+            stickprov[namn] = np.full(antal, centrum[namn])
+            continue
+        fordelning, spridning = osakerhet[namn]
+        if fordelning == "normal":
+            varden = rng.normal(mitt, spridning * mitt, antal)
+        elif fordelning == "lognormal":
+            varden = mitt * rng.lognormal(0.0, spridning, antal)
+        elif fordelning == "likformig":
+            varden = rng.uniform(mitt * (1 - spridning), mitt * (1 + spridning), antal)
+        elif fordelning == "triangel":
+            varden = rng.triangular(mitt * (1 - spridning), mitt, mitt * (1 + spridning), antal)
+        else:
+            raise ValueError(f"Okänd fördelning för {namn}: {fordelning!r}")
+        varden = np.clip(varden, *REGLAGEINTERVALL[namn])
+        if namn in HELTALSPARAMETRAR:
+            varden = np.rint(varden).astype(np.int64)
+        stickprov[namn] = varden
+    return stickprov
+
+
+def ovre_granser(centrum, max_years):
+    """Övre gräns för varje serie givet REGLAGEINTERVALL, används för histogramfacken."""
+    virke_max = REGLAGEINTERVALL["virke_per_m2"][1]
+    # Skogen når som mest (rotation - 1) / rotation av husets virke före avverkning
+    co2_total_max = centrum["BTA"] * virke_max * co2_per_m3
+    antal_hus_max = max_years // REGLAGEINTERVALL["hus_livslangd"][0] + 1
+    return {
+        "klimatneutralitet": 100 * virke_max * co2_per_m3
+        / REGLAGEINTERVALL["klimatpåverkan_per_m2"][0],
+        "co2_i_skog": co2_total_max,
+        "co2_i_hus": antal_hus_max * co2_total_max,
+    }
+
+
+def _berakna_stickprov(frö, antal, centrum, osakerhet, max_years, serier):
+    # Ett block stickprov: de dragna parametrarna (m, 1) och modellens serier
+    rng = np.random.default_rng(frö)
+    p = {n: centrum.get(n, STANDARDVARDEN.get(n)) for n in PARAMETRAR}
+    p.update(dra_stickprov(rng, centrum, osakerhet, antal))
+    p = {n: np.broadcast_to(np.asarray(v), (antal,))[:, None] for n, v in p.items()}
+    return p, berakna_block(p, np.arange(max_years + 1), tuple(serier), **modellval(centrum))
+
+
+def _kor_block(uppgift):
+    frö, antal, centrum, osakerhet, max_years, granser, bins = uppgift
+    _, block = _berakna_stickprov(frö, antal, centrum, osakerhet, max_years, granser)
+    return {
+        namn: PercentilHistogram(max_years + 1, grans, bins).rakna(block[namn])
+        for namn, grans in granser.items()
+    }
+
+
+def _fron(antal, seed):
+    return np.random.SeedSequence(seed).spawn(-(-antal // MC_CHUNK))
+
+
+def monte_carlo(centrum, osakerhet, antal=10000, max_years=200, q=(5, 50, 95), seed=0,
+                arbetare=1, bins=BINS, serier=MC_SERIER):
+    """Kör Monte Carlo-analysen och returnerar percentilband och medelvärde per år.
+
+    centrum innehåller reglagevärdena (samma namn som i svep.PARAMETRAR) och
+    eventuellt modellvalen i svep.MODELLVAL, som gäller alla stickprov. Med
+    arbetare > 1 fördelas blocken över en processpool.
+    """
+    granser = {n: g for n, g in ovre_granser(centrum, max_years).items() if n in serier}
+    reducerare = {n: PercentilHistogram(max_years + 1, g, bins) for n, g in granser.items()}
+    frön = _fron(antal, seed)
+    uppgifter = (
+        (frö, min(MC_CHUNK, antal - i * MC_CHUNK), centrum, osakerhet, max_years, granser, bins)
+        for i, frö in enumerate(frön)
+    )
+
+    pool = ProcessPoolExecutor(max_workers=arbetare) if arbetare > 1 else None
+    try:
+        # map() ger resultaten i blockordning även när de räknas parallellt
+        for resultat in (pool.map if pool else map)(_kor_block, uppgifter):
+            for namn, delresultat in resultat.items():
+                reducerare[namn].lagg_till(*delresultat)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return MCResultat(
+        years=np.arange(max_years + 1),
+        q=tuple(q),
+        percentiler={n: r.percentiler(q) for n, r in reducerare.items()},
+        medel={n: r.medel() for n, r in reducerare.items()},
+        antal=antal,
+    )
+
+
+def stickprov(centrum, osakerhet, antal=10000, max_years=200, seed=0, serier=MC_SERIER):
+    """Generator med de enskilda stickproven som monte_carlo() reducerar bort.
+
+    Ger (slice, parametrar, serier) per block om MC_CHUNK stickprov, med samma
+    slumptal som monte_carlo() för samma frö. parametrar innehåller de osäkra
+    parametrarnas dragna värden och serier matriser (stickprov × år).
+    """
+    for i, frö in enumerate(_fron(antal, seed)):
+        del_ = slice(i * MC_CHUNK, min((i + 1) * MC_CHUNK, antal))
+        p, block = _berakna_stickprov(
+            frö, del_.stop - del_.start, centrum, osakerhet, max_years, serier
+        )
+        yield del_, {n: p[n][:, 0] for n in OSAKRA_PARAMETRAR}, {n: block[n] for n in serier}
@@ -0,0 +1,66 @@
+"""Gemensam beräkningsmotor för sidorna i app.py.
+
+Alla sidor körs i samma process och delar därför modulerna, resultatcachen och
+de förbyggda diagrammen i sessionens tillstånd. Simuleringen nycklas på samma
+sätt oavsett sida, så en parameterkombination som räknats fram på en sida är
+en cacheträff när användaren byter till en annan.
+
+Finns det förberäknade reglagegittret (gitter.py) läses simuleringen ur det i
+stället, på konstant tid och utan att gå via cachen.
+
+Annars räknas alla slutskeden (virkes_hantering × bygg_igen) i samma anrop via
+beräkningsgrafen i berakningsgraf.py, som bara räknar om noderna som påverkas
+av de ändrade parametrarna. Slutskedet ingår inte i nycklarna, så att byta
+alternativ för virket vid rivning är bara ett urval ur det cachade resultatet.
+"""
+
+import berakningsgraf
+from gitter import sla_upp
+from matning import matare
+from modell import STANDARDVARDEN, valj_variant
+from resultatcache import cache, normaliserad_nyckel
+
+
+def simulering(**parametrar):
+    """Läser simuleringen ur gittret eller väljer ut den ur varianter().
+
+    Returnerar (nyckel, resultat).
+    """
+    nyckel = normaliserad_nyckel(**parametrar)
+    with matare.steg("simulering"):
+        res = sla_upp(**parametrar)
+        if res is None:
+            res = valj_variant(
+                varianter(**parametrar)[1],
+                parametrar.get("virkes_hantering", STANDARDVARDEN["virkes_hantering"]),
+                parametrar.get("bygg_igen", STANDARDVARDEN["bygg_igen"]),
+            )
+    return nyckel, res
+
+
+def varianter(**parametrar):
+    """modell.simulera_varianter via den delade cachen; virkes_hantering och bygg_igen ignoreras.
+
+    Returnerar (nyckel, varianter) där nyckeln inte beror på slutskedet.
+    """
+    ovriga = {n: v for n, v in parametrar.items() if n not in ("virkes_hantering", "bygg_igen")}
+    with matare.steg("varianter"):
+        return normaliserad_nyckel(**ovriga), berakningsgraf.varianter(**ovriga)
+
+
+def delnyckel(noder, parametrar, *extra):
+    """Nyckel av parametrarna som noderna i beräkningsgrafen och extra beror på.
+
+    Används för figurer som bara visar några noder, så att de inte ritas om när
+    en parameter som inte påverkar dem ändras.
+    """
+    return berakningsgraf.MODELLGRAF.nyckel(noder, parametrar, *extra)
+
+
+def bild(namn, nyckel, rita):
+    """PNG för ett diagram, cachad per namn och nyckel; rita anropas bara vid cachemiss."""
+    with matare.steg(f"figur:{namn}"):
+        ritad = []
+        png = cache.hamta((namn,) + tuple(nyckel), lambda: ritad.append(True) or rita())
+        matare.notera("miss" if ritad else "träff")
+        return png
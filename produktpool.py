@@ -0,0 +1,127 @@
+"""Kolpooler i långlivade träprodukter (HWP, harvested wood products).
+
+Flödet av kol från skogen till produkter ges av avverkningarna vid varje ny
+rotation. Kolförrådet i produkterna beräknas i O(T) för två modeller:
+
+- rektangulär pool: kolet ligger kvar under hela produktens livslängd och
+  försvinner sedan, beräknat med en differensarray och kumulativ summa i
+  stället för en slice per avverkning;
+- första ordningens nedbrytning enligt IPCC (2019, vol. 4 kap. 12, ekv. 12.1),
+  med en halveringstid per produktkategori och den exakta rekursiva
+  uppdateringen C(i+1) = e^(-k) C(i) + (1 - e^(-k)) / k · inflöde(i).
+
+Alla funktioner broadcastar över ledande axlar, så flera pooler och många
+kombinationer av rotation och livslängd kan beräknas i samma anrop. Tiden är
+alltid den sista axeln.
+
+Båda modellerna lagrar hela det avverkade kolet, så förråden är direkt
+jämförbara. Den ursprungliga modellen i Inbyggt_virke.py lade i stället in
+uttaget / livslängden per år, dvs. en årlig andel (ton/år) och inte ett
+förråd. Den finns kvar som fordelad=True för golden-filerna och
+referensimplementationen i benchmarks/.
+"""
+
+import numpy as np
+
+# IPCC:s standardvärden för halveringstider (år) per produktkategori
+HALVERINGSTIDER = {
+    "sagade_travaror": 35.0,
+    "skivor": 25.0,
+    "papper": 2.0,
+}
+
+
+def kol_i_skog(rotations_period, kolinlagring_per_ar, ar):
+    return (ar % rotations_period) * kolinlagring_per_ar
+
+
+def skordeflode(rotations_period, kolinlagring_per_ar, andel_kol_i_virke, ar):
+    """Kol som förs över till produkter varje år; avverkning sker vid varje ny rotation."""
+    kol_uttaget = rotations_period * kolinlagring_per_ar * andel_kol_i_virke
+    avverkning = (ar % rotations_period == 0) & (ar != 0)
+    return np.where(avverkning, kol_uttaget, 0.0)
+
+
+def rektangular_pool(inflode, livslangd, fordelad=False):
+    """Förråd när varje inflöde ligger kvar i exakt livslangd år och sedan försvinner.
+
+    Med fordelad=True läggs inflöde / livslangd in i stället, som i den
+    ursprungliga modellen (se modulens dokumentation).
+    """
+    inflode = np.asarray(inflode, dtype=float)
+    livslangd = np.asarray(livslangd)
+    per_ar = inflode / livslangd if fordelad else inflode
+    per_ar = np.broadcast_to(per_ar, np.broadcast_shapes(inflode.shape, livslangd.shape))
+
+    # Differensarray: +inflöde när produkten tas i bruk, -inflöde livslangd år senare
+    kalla = np.arange(inflode.shape[-1]) - livslangd
+    utflode = np.take_along_axis(
+        per_ar, np.broadcast_to(np.maximum(kalla, 0), per_ar.shape), axis=-1
+    )
+    utflode = np.where(kalla >= 0, utflode, 0.0)
+    return np.cumsum(per_ar - utflode, axis=-1)
+
+
+def forsta_ordningens_pool(inflode, halveringstid):
+    """Förråd vid första ordningens nedbrytning (IPCC Tier 2).
+
+    halveringstid broadcastas mot inflode.shape[:-1]. Värdet för år t är
+    förrådet vid årets slut, dvs. inklusive årets inflöde.
+    """
+    inflode = np.asarray(inflode, dtype=float)
+    k = np.log(2) / np.asarray(halveringstid, dtype=float)
+    kvar = np.exp(-k)
+    tillskott = (1 - kvar) / k
+
+    form = np.broadcast_shapes(inflode.shape[:-1], k.shape)
+    inflode = np.broadcast_to(inflode, form + inflode.shape[-1:])
+    forrad = np.empty(inflode.shape)
+    foregaende = np.zeros(form)
+    # Rekursionen är sekventiell i tiden men vektoriserad över alla pooler och scenarier
+    for t in range(inflode.shape[-1]):
+        foregaende = kvar * foregaende + tillskott * inflode[..., t]
+        forrad[..., t] = foregaende
+    return forrad
+
+
+def produktpooler(inflode, andelar, halveringstider=None):
+    """Fördelar inflödet på produktkategorier och beräknar varje pool.
+
+    andelar mappar kategori till andel av inflödet. Returnerar en dict med
+    förrådet per kategori; alla kategorier beräknas i samma rekursion.
+    """
+    halveringstider = {**HALVERINGSTIDER, **(halveringstider or {})}
+    kategorier = list(andelar)
+    inflode = np.asarray(inflode, dtype=float)
+    # Kategorierna läggs på en ny axel näst sist: (..., kategori, år)
+    andel = np.array([andelar[k] for k in kategorier])[:, None]
+    halvering = np.array([halveringstider[k] for k in kategorier])
+    halvering = halvering.reshape((1,) * (inflode.ndim - 1) + halvering.shape)
+    forrad = forsta_ordningens_pool(inflode[..., None, :] * andel, halvering)
+    return {k: forrad[..., i, :] for i, k in enumerate(kategorier)}
+
+
+def kolbalans(rotations_period, produkt_livslangd, kolinlagring_per_ar, andel_kol_i_virke, tidsperiod,
+              fordelad=False):
+    """Dynamisk kolbalans med rektangulär produktpool (fordelad, se rektangular_pool)."""
+    ar = np.arange(tidsperiod)
+    skog = kol_i_skog(rotations_period, kolinlagring_per_ar, ar)
+    inflode = skordeflode(rotations_period, kolinlagring_per_ar, andel_kol_i_virke, ar)
+    kol_i_produkt = rektangular_pool(inflode, produkt_livslangd, fordelad)
+    netto_kolbalans = skog + kol_i_produkt
+    return ar, skog, kol_i_produkt, netto_kolbalans
+
+
+def kolbalans_nedbrytning(rotations_period, kolinlagring_per_ar, andel_kol_i_virke, tidsperiod,
+                          andelar, halveringstider=None):
+    """Dynamisk kolbalans med första ordningens nedbrytning per produktkategori.
+
+    Returnerar (ar, kol_i_skog, pooler, netto_kolbalans) där pooler är en dict
+    med förrådet per kategori.
+    """
+    ar = np.arange(tidsperiod)
+    skog = kol_i_skog(rotations_period, kolinlagring_per_ar, ar)
+    inflode = skordeflode(rotations_period, kolinlagring_per_ar, andel_kol_i_virke, ar)
+    pooler = produktpooler(inflode, andelar, halveringstider)
+    netto_kolbalans = skog + sum(pooler.values())
+    return ar, skog, pooler, netto_kolbalans
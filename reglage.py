@@ -0,0 +1,109 @@
+"""Reglage som delas mellan sidorna i app.py.
+
+I en flersidig app rensar Streamlit tillståndet för reglage som inte ritas på
+den aktuella sidan, och samma nyckel på en annan sida är en ny widget. Värdet
+sparas därför också under en egen nyckel i sessionens tillstånd och läggs
+tillbaka varje gång reglaget ritas, så att samma parametrar följer med när
+användaren byter sida.
+"""
+
+import streamlit as st
+
+from modell import STANDARDVARDEN
+
+VIRKES_ALTERNATIV = {
+    "Återanvänds till nytt hus": "ateranvandning",
+    "Energiåtervinns med bio-CCS (koldioxidlagring)": "bioccs",
+    "Bränns konventionellt (släpper ut all CO₂)": "konventionell"
+}
+
+TILLVAXT_ALTERNATIV = {
+    "Linjär (bonitet varje år)": "linjar",
+    "Chapman-Richards": "chapman_richards",
+    "Chapman-Richards, platsanpassad efter bonitet": "platsanpassad",
+}
+
+LIVSLANGD_ALTERNATIV = {
+    "Fast: alla hus rivs vid livslängden": "fast",
+    "Weibullfördelad kring livslängden": "weibull",
+    "Lognormalfördelad kring livslängden": "lognormal",
+}
+
+ALDERSSTRUKTUR_ALTERNATIV = {
+    "Ett jämnårigt bestånd, planterat år 0": "jamnarig",
+    "Landskap i normalskog (jämn åldersfördelning)": "normalskog",
+}
+
+
+def _spara(nyckel):
+    st.session_state[nyckel] = st.session_state["_reglage_" + nyckel]
+
+
+def delat_reglage(widget, etikett, nyckel, standard, *args, **kwargs):
+    """Ritar widget (t.ex. st.sidebar.slider) med ett värde som delas mellan sidorna."""
+    widgetnyckel = "_reglage_" + nyckel
+    # Ändringar sparas i on_change, som körs före skriptet; här läggs det sparade
+    # värdet alltid tillbaka, eftersom widgetens tillstånd inte följer med mellan sidor
+    st.session_state[widgetnyckel] = st.session_state.setdefault(nyckel, standard)
+    return widget(etikett, *args, key=widgetnyckel, on_change=_spara, args=(nyckel,), **kwargs)
+
+
+def modellreglage(plats=st.sidebar):
+    """Reglagen för trähusmodellen; returnerar parametrarna till modell.simulera."""
+    s = STANDARDVARDEN
+    parametrar = dict(
+        BTA=delat_reglage(plats.slider, "Bostadsyta (BTA), m²", "BTA", s["BTA"], 100, 10000),
+        virke_per_m2=delat_reglage(
+            plats.slider, "Mängd stomvirke (m³/m² BTA)", "virke_per_m2", s["virke_per_m2"], 0.1, 1.0
+        ),
+        bonitet=delat_reglage(
+            plats.slider, "Bonitet (m³ virke/ha/år)", "bonitet", s["bonitet"], 4.0, 10.0, step=0.1
+        ),
+        LCA_period=delat_reglage(
+            plats.slider, "LCA-period (år, analys)", "LCA_period", s["LCA_period"], 30, 100
+        ),
+        rotation=delat_reglage(
+            plats.slider, "Skogens rotationsperiod (år)", "rotation", s["rotation"], 50, 150
+        ),
+        hus_livslangd=delat_reglage(
+            plats.slider, "Husets livslängd (år)", "hus_livslangd", s["hus_livslangd"], 20, 200
+        ),
+        max_years=delat_reglage(
+            plats.slider, "Total tidsperiod (år)", "max_years", s["max_years"], 50, 200
+        ),
+        klimatpåverkan_per_m2=delat_reglage(
+            plats.slider, "Husets klimatpåverkan (ton CO₂/m² BTA)", "klimatpåverkan_per_m2",
+            s["klimatpåverkan_per_m2"], 0.150, 0.500,
+        ),
+    )
+    valt_svar = delat_reglage(
+        plats.selectbox, "Vad händer med virket efter husets rivning?", "virkes_hantering_val",
+        next(k for k, v in VIRKES_ALTERNATIV.items() if v == s["virkes_hantering"]),
+        options=list(VIRKES_ALTERNATIV.keys()),
+    )
+    parametrar["virkes_hantering"] = VIRKES_ALTERNATIV[valt_svar]
+    parametrar["bygg_igen"] = delat_reglage(
+        plats.checkbox, "Bygg nytt hus efter livslängd?", "bygg_igen", s["bygg_igen"]
+    )
+    fordelning = delat_reglage(
+        plats.selectbox, "Husens livslängd", "livslangd_val",
+        next(iter(LIVSLANGD_ALTERNATIV)), options=list(LIVSLANGD_ALTERNATIV),
+        help="Med en fördelning rivs husen utspritt kring den valda livslängden (medelvärdet) "
+             "och kurvan för CO₂ i husen är väntevärdet över alla hus (livslangd.py).",
+    )
+    parametrar["livslangd"] = LIVSLANGD_ALTERNATIV[fordelning]
+    struktur = delat_reglage(
+        plats.selectbox, "Skogens åldersstruktur", "aldersstruktur_val",
+        next(iter(ALDERSSTRUKTUR_ALTERNATIV)), options=list(ALDERSSTRUKTUR_ALTERNATIV),
+        help="Normalskog: skogsarealen är jämnt fördelad över åldrarna 0 till rotationsperioden "
+             "och en lika stor del avverkas varje år (skogslandskap.py).",
+    )
+    parametrar["aldersstruktur"] = ALDERSSTRUKTUR_ALTERNATIV[struktur]
+    kurva = delat_reglage(
+        plats.selectbox, "Skogens tillväxtkurva", "tillvaxtmodell_val",
+        next(iter(TILLVAXT_ALTERNATIV)), options=list(TILLVAXT_ALTERNATIV),
+        help="Med Chapman-Richards växer ung skog långsammare; boniteten är den högsta "
+             "medeltillväxten (tillvaxt.py).",
+    )
+    parametrar["tillvaxtmodell"] = TILLVAXT_ALTERNATIV[kurva]
+    return parametrar
@@ -0,0 +1,112 @@
+"""Återanvändbara diagram som ritas med Agg utan pyplots globala tillstånd.
+
+plt.subplots() registrerar varje figur i pyplot, som håller kvar den tills den
+stängs explicit. I en långlivad Streamlit-process växer då minnet för varje
+omkörning. Här skapas i stället figurerna direkt med matplotlib.figure.Figure
+och en FigureCanvasAgg. Varje session får en uppsättning diagram som byggs en
+gång; vid omkörning uppdateras bara linjedata, vertikala linjer och gränser.
+Diagrammen lagras i sessionens tillstånd och frigörs av skräpsamlingen när
+sessionen avslutas, eftersom inget globalt register håller kvar dem.
+
+matplotlib importeras först när ett diagram skapas. En omkörning där alla
+bilder är cacheträffar, eller en sida utan diagram, laddar aldrig matplotlib.
+"""
+
+import io
+
+import numpy as np
+
+from matning import matare
+
+SAVEFIG_ALTERNATIV = {"format": "png", "dpi": 200, "bbox_inches": "tight"}
+
+
+class Diagram:
+    """En figur med en axel vars linjer skapas första gången och sedan uppdateras."""
+
+    def __init__(self, figsize, forbered=None):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.fig = Figure(figsize=figsize)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        self._artister = {}
+        self._legend = None
+        if forbered is not None:
+            forbered(self.ax)
+
+    def linje(self, namn, x, y, **stil):
+        if namn in self._artister:
+            self._artister[namn].set_data(x, y)
+        else:
+            (self._artister[namn],) = self.ax.plot(x, y, **stil)
+
+    def vlinje(self, namn, x, **stil):
+        if namn in self._artister:
+            self._artister[namn].set_xdata([x, x])
+        else:
+            self._artister[namn] = self.ax.axvline(x, **stil)
+
+    def hlinje(self, namn, y, **stil):
+        if namn in self._artister:
+            self._artister[namn].set_ydata([y, y])
+        else:
+            self._artister[namn] = self.ax.axhline(y, **stil)
+
+    def vlinjer(self, namn, positioner, **stil):
+        """Flera vertikala linjer över hela axelhöjden som en enda Line2D."""
+        positioner = np.asarray(positioner, dtype=float)
+        x = np.repeat(positioner, 3)
+        x[2::3] = np.nan
+        y = np.tile([0.0, 1.0, np.nan], len(positioner))
+        if namn in self._artister:
+            self._artister[namn].set_data(x, y)
+        else:
+            stil.setdefault("label", "_" + namn)
+            (self._artister[namn],) = self.ax.plot(
+                x, y, transform=self.ax.get_xaxis_transform(), scalex=False, **stil
+            )
+
+    def band(self, namn, x, undre, ovre, **stil):
+        # fill_between saknar set_data i äldre matplotlib, så bandet ersätts
+        self.ta_bort(namn)
+        self._artister[namn] = self.ax.fill_between(x, undre, ovre, **stil)
+
+    def staplar(self, namn, y, bredd, **stil):
+        """Liggande staplar, t.ex. för ett tornadodiagram; ersätts vid varje anrop."""
+        self.ta_bort(namn)
+        self._artister[namn] = self.ax.barh(y, bredd, **stil)
+
+    def ta_bort(self, namn):
+        artist = self._artister.pop(namn, None)
+        if artist is not None:
+            # Felstaplarna till barh() ligger i en egen container
+            if getattr(artist, "errorbar", None) is not None:
+                artist.errorbar.remove()
+            artist.remove()
+
+    def png(self, legend=None):
+        """Skalar om axlarna efter nya data och renderar figuren till PNG-bytes."""
+        self.ax.relim()
+        self.ax.autoscale_view()
+        if legend is not None:
+            self._legend = self.ax.legend(**legend)
+        buf = io.BytesIO()
+        with matare.steg("png"):
+            self.fig.savefig(buf, **SAVEFIG_ALTERNATIV)
+        return buf.getvalue()
+
+
+def hamta_diagram(lagring, namn, figsize, forbered=None):
+    """Returnerar sessionens diagram med namnet namn och skapar det vid behov.
+
+    lagring är en föränderlig mappning som lever lika länge som sessionen,
+    t.ex. st.session_state.
+    """
+    if "_diagram" not in lagring:
+        lagring["_diagram"] = {}
+    diagrammen = lagring["_diagram"]
+    if namn not in diagrammen:
+        diagrammen[namn] = Diagram(figsize, forbered)
+    return diagrammen[namn]
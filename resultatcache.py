@@ -0,0 +1,143 @@
+"""Processgemensam resultatcache för Streamlit-apparna.
+
+Streamlit kör om hela skriptet vid varje interaktion, men importerade moduler
+lever kvar i serverprocessen. Cachen här delas därför mellan alla sessioner:
+samma parameterkombination simuleras och ritas bara en gång, oavsett hur många
+användare som efterfrågar den. Minnet begränsas av en budget i byte och de
+minst nyligen använda posterna kastas först (LRU).
+
+Budgeten sätts med miljövariabeln KLIMAT_CACHE_MB (standard 256 MB).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+MAX_BYTES = int(float(os.environ.get("KLIMAT_CACHE_MB", "256")) * 1024 * 1024)
+
+
+def storlek(varde):
+    """Ungefärlig minnesåtgång i byte för arrayer, bytes och behållare av dessa."""
+    if isinstance(varde, np.ndarray):
+        return varde.nbytes
+    if isinstance(varde, (bytes, bytearray)):
+        return len(varde)
+    if isinstance(varde, dict):
+        return sum(storlek(v) for v in varde.values()) + 64 * len(varde)
+    if isinstance(varde, (tuple, list)):
+        return sum(storlek(v) for v in varde) + 8 * len(varde)
+    return 32
+
+
+def _skrivskydda(varde):
+    # Cachade arrayer delas mellan sessioner och får inte ändras på plats
+    if isinstance(varde, np.ndarray):
+        varde.flags.writeable = False
+    elif isinstance(varde, dict):
+        for v in varde.values():
+            _skrivskydda(v)
+    elif isinstance(varde, (tuple, list)):
+        for v in varde:
+            _skrivskydda(v)
+    return varde
+
+
+def normaliserad_nyckel(**parametrar):
+    """Gör en hashbar nyckel av parametrarna, oberoende av ordning och flyttalsbrus."""
+    def normalisera(v):
+        if isinstance(v, (bool, np.bool_)):
+            return bool(v)
+        if isinstance(v, (int, np.integer)):
+            return int(v)
+        if isinstance(v, (float, np.floating)):
+            return round(float(v), 10)
+        if isinstance(v, dict):
+            return tuple(sorted((k, normalisera(x)) for k, x in v.items()))
+        if isinstance(v, (tuple, list)):
+            return tuple(normalisera(x) for x in v)
+        return v
+    return tuple(sorted((k, normalisera(v)) for k, v in parametrar.items()))
+
+
+class LRUCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.traffar = 0
+        self.missar = 0
+        self.utkastade = 0
+        self._poster = OrderedDict()
+        self._las = threading.Lock()
+
+    def __len__(self):
+        return len(self._poster)
+
+    def __contains__(self, nyckel):
+        return nyckel in self._poster
+
+    def hamta(self, nyckel, berakna):
+        """Returnerar det cachade värdet för nyckeln, eller beräknar och sparar det."""
+        with self._las:
+            if nyckel in self._poster:
+                self._poster.move_to_end(nyckel)
+                self.traffar += 1
+                return self._poster[nyckel][0]
+            self.missar += 1
+
+        # Beräkningen görs utanför låset så att andra sessioner inte blockeras
+        varde = _skrivskydda(berakna())
+        self.spara(nyckel, varde)
+        return varde
+
+    def hamta_om_finns(self, nyckel, standard=None, rakna=True):
+        """Det cachade värdet för nyckeln, eller standard utan att något beräknas.
+
+        Med rakna=False räknas uppslaget inte som träff eller miss, t.ex. när en
+        beräkning som redan räknats som miss i hamta() letar efter ett närliggande
+        resultat att utgå från.
+        """
+        with self._las:
+            if nyckel in self._poster:
+                self._poster.move_to_end(nyckel)
+                self.traffar += rakna
+                return self._poster[nyckel][0]
+            self.missar += rakna
+            return standard
+
+    def spara(self, nyckel, varde):
+        post_storlek = storlek(varde)
+        if post_storlek > self.max_bytes:
+            return
+        with self._las:
+            if nyckel in self._poster:
+                self.bytes -= self._poster.pop(nyckel)[1]
+            self._poster[nyckel] = (varde, post_storlek)
+            self.bytes += post_storlek
+            while self.bytes > self.max_bytes:
+                _, (_, kastad_storlek) = self._poster.popitem(last=False)
+                self.bytes -= kastad_storlek
+                self.utkastade += 1
+
+    def rensa(self):
+        with self._las:
+            self._poster.clear()
+            self.bytes = 0
+
+    def statistik(self):
+        with self._las:
+            forfragningar = self.traffar + self.missar
+            return {
+                "träffar": self.traffar,
+                "missar": self.missar,
+                "träffgrad": self.traffar / forfragningar if forfragningar else 0.0,
+                "poster": len(self._poster),
+                "utkastade": self.utkastade,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Delas av alla sessioner i serverprocessen
+cache = LRUCache()
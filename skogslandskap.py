@@ -0,0 +1,255 @@
+"""Skogslandskap med åldersklasser i stället för ett enda jämnårigt bestånd.
+
+Landskapet beskrivs av en arealmatris (bestånd × åldersklass, ha per ettårig
+åldersklass) och bonitet och rotationsperiod per bestånd. Varje år:
+
+1. avverkas arealen som når rotationsåldern, med den volym den har (ha ×
+   volym per ha för åldern), och återplanteras samma år i åldersklass 0;
+2. åldras övrig areal ett år och växer enligt tillväxtkurvan.
+
+Avverkningsåret räknas utan tillväxt, precis som i modell.skogsserie. Ett
+enda bestånd som planteras år 0 ger därför samma serie som den ursprungliga
+modellen, areal · bonitet · co2_per_m3 · (t mod rotation).
+
+Volymen per ha är bonitet · tillväxtkurvan för åldern (tillvaxt.py), som
+standard linjär som i modellen. Förloppet är linjärt i arealen, och alla
+bestånd med samma rotation (och för den platsanpassade kurvan samma
+bonitetsklass) avverkas vid samma ålder och växer efter samma kurva.
+All areal som började i samma åldersklass inom en rotation har därför
+samma ålder varje år. Bestånden summeras först till en bonitetsviktad
+arealmatris per rotation. Sedan stegas bara åldern för varje ursprunglig
+åldersklass fram år för år (rotationer × åldersklasser), och förrådet läses
+ur tillväxttabellerna. Det är exakt, och ett landskap med 10^5 bestånd
+kostar en summering över matrisen plus T små steg.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from modell import co2_per_m3
+from tillvaxt import BONITETSKLASS, bonitetsklass, tabell
+
+ALDERSSTRUKTURER = ("jamnarig", "normalskog")
+
+
+class Landskap(NamedTuple):
+    areal: np.ndarray     # (bestånd, åldersklass), ha
+    bonitet: np.ndarray   # (bestånd,), m³ virke/ha/år
+    rotation: np.ndarray  # (bestånd,), år
+
+
+class Landskapsresultat(NamedTuple):
+    years: np.ndarray
+    co2_i_skog: np.ndarray       # stående förråd som CO₂ (ton)
+    cum_co2_skog: np.ndarray     # summerat upptag sedan år 0, dvs. tillväxten
+    avverkning_co2: np.ndarray   # avverkad volym som CO₂ (ton) per år
+    avverkad_areal: np.ndarray   # ha per år
+    virkesforrad: np.ndarray     # m³
+
+
+def jamnarigt(areal_ha, bonitet, rotation, alder=0):
+    """Landskap där varje bestånd är jämnårigt med åldern alder (år 0)."""
+    areal_ha, bonitet, rotation, alder = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(areal_ha, dtype=float)), np.asarray(bonitet, dtype=float),
+        np.asarray(rotation), np.asarray(alder),
+    )
+    alder = alder.astype(np.intp)
+    areal = np.zeros((len(areal_ha), int(alder.max()) + 1))
+    areal[np.arange(len(areal_ha)), alder] = areal_ha
+    return Landskap(areal, bonitet.copy(), rotation.astype(np.intp))
+
+
+def normalskog(areal_ha, bonitet, rotation):
+    """Landskap där varje bestånds areal är jämnt fördelad över åldrarna 0 … rotation - 1."""
+    areal_ha, bonitet, rotation = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(areal_ha, dtype=float)), np.asarray(bonitet, dtype=float),
+        np.asarray(rotation),
+    )
+    rotation = rotation.astype(np.intp)
+    alder = np.arange(int(rotation.max()))
+    areal = np.where(alder < rotation[:, None], (areal_ha / rotation)[:, None], 0.0)
+    return Landskap(areal, bonitet.copy(), rotation)
+
+
+def aldersfordelat(areal_ha, bonitet, rotation, aldersstruktur):
+    """Landskap från en åldersstruktur: "jamnarig", "normalskog" eller arealandelar per ålder.
+
+    Andelarna (ålder 0, 1, …) normeras så att summan blir 1 och gäller för
+    alla bestånd.
+    """
+    if isinstance(aldersstruktur, str):
+        if aldersstruktur == "jamnarig":
+            return jamnarigt(areal_ha, bonitet, rotation)
+        if aldersstruktur == "normalskog":
+            return normalskog(areal_ha, bonitet, rotation)
+        raise ValueError(f"Okänd åldersstruktur: {aldersstruktur!r}, välj bland {ALDERSSTRUKTURER}")
+    andelar = np.asarray(aldersstruktur, dtype=float)
+    areal_ha, bonitet, rotation = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(areal_ha, dtype=float)), np.asarray(bonitet, dtype=float),
+        np.asarray(rotation),
+    )
+    return Landskap(
+        areal_ha[:, None] * andelar / andelar.sum(), bonitet.copy(), rotation.astype(np.intp)
+    )
+
+
+def _per_grupp(landskap, tillvaxtmodell):
+    """Summerar arealen och den bonitetsviktade arealen per grupp av likadana bestånd.
+
+    En grupp är alla bestånd med samma rotation och, för den platsanpassade
+    kurvan, samma bonitetsklass. Grupperna sorteras efter rotation.
+    Returnerar (rotationer, bonitetsklasser, areal, viktad areal) med en rad
+    per grupp.
+    """
+    areal = np.asarray(landskap.areal, dtype=float)
+    bonitet = np.broadcast_to(np.asarray(landskap.bonitet, dtype=float), (areal.shape[0],))
+    rotation = np.broadcast_to(np.asarray(landskap.rotation), (areal.shape[0],)).astype(np.int64)
+    if np.any(rotation < 1):
+        raise ValueError("Rotationsperioden måste vara minst 1 år")
+    nyckel = rotation << 32
+    if tillvaxtmodell == "platsanpassad":
+        # Den platsanpassade kurvan har olika form per bonitetsklass
+        nyckel = nyckel + np.rint(bonitetsklass(bonitet) / BONITETSKLASS).astype(np.int64)
+    nycklar, grupp = np.unique(nyckel, return_inverse=True)
+    ordning = np.argsort(grupp, kind="stable")
+    starter = np.searchsorted(grupp[ordning], np.arange(len(nycklar)))
+
+    # Åldersklasserna räcker till den längsta rotationen; äldre areal avverkas första året
+    k = max(int(rotation.max()), areal.shape[1])
+    sorterad = areal[ordning]
+    summerad = np.zeros((2, len(nycklar), k))
+    summerad[0, :, :areal.shape[1]] = np.add.reduceat(sorterad, starter, axis=0)
+    sorterad *= bonitet[ordning, None]
+    summerad[1, :, :areal.shape[1]] = np.add.reduceat(sorterad, starter, axis=0)
+    klasser = (nycklar & (2**32 - 1)) * BONITETSKLASS
+    return nycklar >> 32, klasser, summerad[0], summerad[1]
+
+
+def simulera_landskap(landskap, max_years, tillvaxtmodell="linjar"):
+    """Stegar landskapet år för år och returnerar ett Landskapsresultat för år 0 … max_years."""
+    grupprotation, klasser, areal, viktad = _per_grupp(landskap, tillvaxtmodell)
+    rotationer, forsta = np.unique(grupprotation, return_index=True)
+    k = areal.shape[1]
+    # All areal som började i samma åldersklass inom en rotation har samma ålder
+    # varje år. Det räcker därför att stega åldern för varje (rotation,
+    # ursprunglig åldersklass); arealen och volymkurvan vägs in via matriser.
+    ytor = np.add.reduceat(areal, forsta, axis=0)
+    if tillvaxtmodell == "platsanpassad":
+        # volym[r, a, b]: förrådet om arealen från åldersklass b har åldern a,
+        # summerat över bonitetsklasserna i rotationen r
+        tabeller = np.stack([tabell(tillvaxtmodell, b, k)[:k] for b in klasser])
+        slut = np.append(forsta[1:], len(klasser))
+        volym = np.stack([tabeller[f:s].T @ viktad[f:s] for f, s in zip(forsta, slut)])
+        r = np.arange(len(rotationer))[:, None]
+        b = np.arange(k)[None, :]
+
+        def forrad_per_klass(alder):
+            return volym[r, alder, b]
+    else:
+        kurva = tabell(tillvaxtmodell, langd=k)[:k]
+        vikter = np.add.reduceat(viktad, forsta, axis=0)
+
+        def forrad_per_klass(alder):
+            return kurva[alder] * vikter
+
+    alder = np.tile(np.arange(k), (len(rotationer), 1))
+    # Areal som når rotationsåldern under året avverkas
+    avverkas_fran = rotationer[:, None] - 1
+
+    forrad = np.empty(max_years + 1)
+    avverkat = np.zeros(max_years + 1)
+    avverkad_areal = np.zeros(max_years + 1)
+    per_klass = forrad_per_klass(alder)
+    forrad[0] = per_klass.sum()
+    for t in range(1, max_years + 1):
+        skord = alder >= avverkas_fran
+        avverkat[t] = per_klass[skord].sum()
+        avverkad_areal[t] = ytor[skord].sum()
+        alder = np.where(skord, 0, alder + 1)
+        per_klass = forrad_per_klass(alder)
+        forrad[t] = per_klass.sum()
+
+    co2_i_skog = forrad * co2_per_m3
+    avverkning_co2 = avverkat * co2_per_m3
+    # Upptaget är förändringen i förrådet plus det som avverkats under året
+    upptag = np.concatenate([[0.0], np.diff(co2_i_skog) + avverkning_co2[1:]])
+    return Landskapsresultat(
+        years=np.arange(max_years + 1),
+        co2_i_skog=co2_i_skog,
+        cum_co2_skog=np.cumsum(upptag),
+        avverkning_co2=avverkning_co2,
+        avverkad_areal=avverkad_areal,
+        virkesforrad=forrad,
+    )
+
+
+def _per_bestand(landskap, max_years, tillvaxtmodell):
+    # Som simulera_landskap men med en serie per bestånd i stället för summan
+    areal = np.asarray(landskap.areal, dtype=float)
+    bonitet = np.asarray(landskap.bonitet, dtype=float)
+    rotation = np.asarray(landskap.rotation).astype(np.intp)
+    antal = areal.shape[0]
+    k = max(int(rotation.max()), areal.shape[1])
+    viktad = np.zeros((antal, k))
+    viktad[:, :areal.shape[1]] = areal * bonitet[:, None]
+    if tillvaxtmodell == "platsanpassad":
+        tabeller = np.stack([tabell(tillvaxtmodell, b, k)[:k] for b in bonitet])
+        rader = np.arange(antal)[:, None]
+
+        def forrad_per_klass(alder):
+            return tabeller[rader, alder] * viktad
+    else:
+        kurva = tabell(tillvaxtmodell, langd=k)[:k]
+
+        def forrad_per_klass(alder):
+            return kurva[alder] * viktad
+
+    alder = np.tile(np.arange(k), (antal, 1))
+    avverkas_fran = rotation[:, None] - 1
+    forrad = np.empty((antal, max_years + 1))
+    avverkat = np.zeros((antal, max_years + 1))
+    per_klass = forrad_per_klass(alder)
+    forrad[:, 0] = per_klass.sum(axis=1)
+    for t in range(1, max_years + 1):
+        skord = alder >= avverkas_fran
+        avverkat[:, t] = np.where(skord, per_klass, 0.0).sum(axis=1)
+        alder = np.where(skord, 0, alder + 1)
+        per_klass = forrad_per_klass(alder)
+        forrad[:, t] = per_klass.sum(axis=1)
+
+    co2_i_skog = forrad * co2_per_m3
+    upptag = np.zeros_like(co2_i_skog)
+    upptag[:, 1:] = np.diff(co2_i_skog, axis=1) + avverkat[:, 1:] * co2_per_m3
+    return co2_i_skog, np.cumsum(upptag, axis=1)
+
+
+def landskapsserier(skogsareal_ha, bonitet, rotation, years, aldersstruktur,
+                    tillvaxtmodell="linjar"):
+    """(co2_i_skog, cum_co2_skog) när varje scenario är ett eget landskap med åldersstrukturen.
+
+    Parametrarna broadcastas mot varandra (ett scenario per element) och years
+    mot dem, t.ex. (m, 1) mot (T,) eller (m, 1) med ett eget år per scenario.
+    Förloppet är linjärt i areal · bonitet, så ett landskap med enhetsareal
+    stegas en gång per förekommande rotation (och för den platsanpassade
+    kurvan bonitetsklass) och skalas sedan per scenario.
+    """
+    skogsareal_ha, bonitet, rotation = np.broadcast_arrays(
+        np.asarray(skogsareal_ha, dtype=float), np.asarray(bonitet, dtype=float),
+        np.asarray(rotation),
+    )
+    years = np.asarray(years)
+    if tillvaxtmodell == "platsanpassad":
+        klass = bonitetsklass(bonitet)
+    else:
+        klass = np.ones(bonitet.shape)
+    grupper, index = np.unique(
+        np.stack([rotation.ravel().astype(float), klass.ravel()]), axis=1, return_inverse=True
+    )
+    enhet = aldersfordelat(
+        np.ones(grupper.shape[1]), grupper[1], grupper[0].astype(np.intp), aldersstruktur
+    )
+    co2_i_skog, cum_co2_skog = _per_bestand(enhet, int(years.max()), tillvaxtmodell)
+    index = np.ravel(index).reshape(rotation.shape)
+    skala = skogsareal_ha * bonitet / klass
+    return skala * co2_i_skog[index, years], skala * cum_co2_skog[index, years]
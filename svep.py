@@ -0,0 +1,164 @@
+"""Scenariosvep: kör modellen för tusentals parameteruppsättningar på en gång.
+
+Parametrarna ges som arrayer (ett värde per scenario, eller skalärer som
+broadcastas) och resultatet blir matriser med formen (scenario × år). Beräkningen
+görs i block om ``chunk_storlek`` scenarier så att minnesåtgången hålls konstant
+oavsett hur många scenarier som svepas.
+"""
+
+import itertools
+
+import numpy as np
+
+from modell import (
+    grundstorheter,
+    husserie,
+    klimatneutralitetsserie,
+    kumulativa_serier,
+    skogsserie,
+)
+
+CHUNK_STORLEK = 4096
+
+PARAMETRAR = (
+    "BTA",
+    "virke_per_m2",
+    "bonitet",
+    "rotation",
+    "hus_livslangd",
+    "klimatpåverkan_per_m2",
+    "virkes_hantering",
+    "bygg_igen",
+)
+SERIER = (
+    "co2_i_skog",
+    "co2_i_hus",
+    "klimatneutralitet",
+    "cum_co2_skog",
+    "cum_co2_hus",
+    "cum_co2_summa",
+)
+SKALARER = ("co2_total", "skogsareal_ha", "klimatpåverkan_total")
+
+STANDARDVARDEN = {
+    "virkes_hantering": "ateranvandning",
+    "bygg_igen": True,
+}
+# Modellval som gäller alla scenarier i ett block, med standardvärden
+MODELLVAL = {"tillvaxtmodell": "linjar", "livslangd": "fast", "aldersstruktur": "jamnarig"}
+
+
+def rutnat(**axlar):
+    """Kartesisk produkt av parameteraxlar, t.ex. rutnat(BTA=[150, 500], rotation=[60, 80]).
+
+    Returnerar en dict med platta arrayer som kan skickas direkt till svep().
+    """
+    namn = list(axlar)
+    kombinationer = list(itertools.product(*(np.atleast_1d(axlar[n]) for n in namn)))
+    return {n: np.array([k[i] for k in kombinationer]) for i, n in enumerate(namn)}
+
+
+def modellval(parametrar):
+    """Modellvalen i parametrarna (se MODELLVAL), kompletterade med standardvärden."""
+    return {n: parametrar.get(n, standard) for n, standard in MODELLVAL.items()}
+
+
+def _parametrar(parametrar):
+    saknas = [n for n in PARAMETRAR if n not in parametrar and n not in STANDARDVARDEN]
+    if saknas:
+        raise ValueError(f"Parametrar saknas i svepet: {', '.join(saknas)}")
+    okanda = set(parametrar) - set(PARAMETRAR)
+    if okanda:
+        raise ValueError(f"Okända parametrar: {', '.join(sorted(okanda))}")
+    alla = {**STANDARDVARDEN, **parametrar}
+    arrayer = np.broadcast_arrays(*(np.atleast_1d(alla[n]) for n in PARAMETRAR))
+    return {n: np.ravel(a) for n, a in zip(PARAMETRAR, arrayer)}
+
+
+def berakna_block(p, years, serier=SERIER, tillvaxtmodell="linjar", livslangd="fast",
+                  aldersstruktur="jamnarig"):
+    """Beräknar serierna för ett block scenarier. p innehåller arrayer med formen (m, 1).
+
+    Med en annan aldersstruktur än "jamnarig" är varje scenario ett eget
+    skogslandskap (skogslandskap.landskapsserier).
+    """
+    co2_total, skogsareal_ha, klimatpåverkan_total = grundstorheter(
+        p["BTA"], p["virke_per_m2"], p["bonitet"], p["rotation"], p["klimatpåverkan_per_m2"],
+        tillvaxtmodell,
+    )
+    kumulativa = {"cum_co2_skog", "cum_co2_hus", "cum_co2_summa"} & set(serier)
+    landskap = not (isinstance(aldersstruktur, str) and aldersstruktur == "jamnarig")
+    if landskap:
+        from skogslandskap import landskapsserier
+
+        co2_i_skog, cum_co2_skog = landskapsserier(
+            skogsareal_ha, p["bonitet"], p["rotation"], years, aldersstruktur, tillvaxtmodell
+        )
+    else:
+        co2_i_skog = skogsserie(skogsareal_ha, p["bonitet"], p["rotation"], years, tillvaxtmodell)
+    ut = {"co2_i_skog": co2_i_skog}
+    if "co2_i_hus" in serier or kumulativa:
+        co2_i_hus = husserie(
+            co2_total, p["hus_livslangd"], years, p["virkes_hantering"], p["bygg_igen"],
+            livslangd,
+        )
+        ut["co2_i_hus"] = co2_i_hus
+    if "klimatneutralitet" in serier:
+        ut["klimatneutralitet"] = klimatneutralitetsserie(co2_i_skog, klimatpåverkan_total)
+    if kumulativa:
+        ut["cum_co2_skog"], ut["cum_co2_hus"], ut["cum_co2_summa"] = kumulativa_serier(
+            co2_i_skog, co2_i_hus, p["rotation"], years
+        )
+        if landskap:
+            # Landskapets upptag räknas med avverkningen, som i modell.simulera
+            ut["cum_co2_skog"] = cum_co2_skog
+            ut["cum_co2_summa"] = cum_co2_skog + ut["cum_co2_hus"]
+    ut = {namn: ut[namn] for namn in serier}
+    ut["co2_total"] = co2_total[:, 0]
+    ut["skogsareal_ha"] = skogsareal_ha[:, 0]
+    ut["klimatpåverkan_total"] = klimatpåverkan_total[:, 0]
+    return ut
+
+
+def svep_chunkar(max_years=200, chunk_storlek=CHUNK_STORLEK, dtype=np.float64,
+                 serier=SERIER, tillvaxtmodell="linjar", livslangd="fast",
+                 aldersstruktur="jamnarig", **parametrar):
+    """Generator som ger (slice, resultat) för ett block scenarier i taget.
+
+    Används när hela resultatmatrisen inte får plats i minnet, t.ex. när
+    blocken skrivs direkt till fil.
+    """
+    p = _parametrar(parametrar)
+    antal = len(p["BTA"])
+    years = np.arange(max_years + 1)
+    for start in range(0, antal, chunk_storlek):
+        del_ = slice(start, min(start + chunk_storlek, antal))
+        block = berakna_block(
+            {n: a[del_, None] for n, a in p.items()}, years, serier, tillvaxtmodell, livslangd,
+            aldersstruktur,
+        )
+        yield del_, {n: np.asarray(a, dtype=dtype) for n, a in block.items()}
+
+
+def svep(max_years=200, chunk_storlek=CHUNK_STORLEK, dtype=np.float64, serier=SERIER,
+         tillvaxtmodell="linjar", livslangd="fast", aldersstruktur="jamnarig", **parametrar):
+    """Kör modellen över alla scenarier och returnerar en dict med matriser (scenario × år).
+
+    Alla parametrar i PARAMETRAR kan ges som arrayer eller skalärer; virkes_hantering
+    och bygg_igen har standardvärden. tillvaxtmodell (se tillvaxt.py),
+    livslangd (se livslangd.py) och aldersstruktur (se skogslandskap.py) gäller
+    alla scenarier. Med dtype=np.float32
+    beräknas varje block i float64 men lagras i float32, vilket halverar
+    minnet för resultatet.
+    """
+    p = _parametrar(parametrar)
+    antal = len(p["BTA"])
+    ut = {n: np.empty((antal, max_years + 1), dtype=dtype) for n in serier}
+    ut.update({n: np.empty(antal, dtype=dtype) for n in SKALARER})
+    for del_, block in svep_chunkar(
+        max_years, chunk_storlek, dtype, serier, tillvaxtmodell, livslangd, aldersstruktur, **p
+    ):
+        for namn, varden in block.items():
+            ut[namn][del_] = varden
+    ut["years"] = np.arange(max_years + 1)
+    return ut
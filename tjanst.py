@@ -0,0 +1,432 @@
+"""Lokal JSON-tjänst över HTTP för klimatbalans- och kolbalansmodellerna.
+
+    python tjanst.py                          # 127.0.0.1:8765
+    python tjanst.py --port 9000 --arbetare 4
+    python benchmarks/last.py --starta        # lastgenerator mot en egen server
+
+Endpoints (JSON in och ut):
+
+- POST /klimatbalans: ett scenario med samma parametrar som batch.py, t.ex.
+  {"BTA": 500, "rotation": 90}. Saknade parametrar får reglagens
+  standardvärden och "serier": true lägger till klimatneutraliteten per år.
+  Svaret har samma nyckeltal som batch.py.
+- POST /klimatbalans/batch: {"scenarier": [...]} eller en lista med scenarier.
+- POST /kolbalans: produktpool.kolbalans med rotations_period,
+  produkt_livslangd, kolinlagring_per_ar, andel_kol_i_virke och tidsperiod.
+  Med "andelar" (och eventuellt "halveringstider"), objekt med kategorierna i
+  produktpool.HALVERINGSTIDER, används första ordningens nedbrytning i stället.
+- POST /kolbalans/batch: som /klimatbalans/batch.
+- GET /halsa och GET /statistik.
+
+Servern är en asyncio-server med HTTP/1.1 och keep-alive. Beräkningarna körs
+i en arbetspool, så händelseloopen blir aldrig blockerad av NumPy. Samtidiga
+enskilda förfrågningar till samma modell samlas i mikrobatcher: den första
+startar ett fönster på BATCH_FONSTER sekunder, och allt som kommer in under
+fönstret (högst BATCH_STORLEK) beräknas i ett vektoriserat anrop. Svaren
+cachas som färdiga JSON-bytes i en LRU-cache nycklad på sökväg och
+förfrågningens kropp, så en upprepad förfrågan besvaras utan beräkning.
+
+max_years, LCA_period och tidsperiod får vara högst MAX_AR år (samma som
+reglagen), så att en enda förfrågan inte kan spränga minnet för hela sin
+mikrobatch.
+
+Tjänsten lyssnar som standard bara på 127.0.0.1 och har ingen autentisering.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from batch import berakna_scenarier, tolka_poster
+from modell import REGLAGEINTERVALL, VIRKES_HANTERINGAR
+from produktpool import HALVERINGSTIDER, kolbalans, kolbalans_nedbrytning
+from resultatcache import LRUCache
+
+VARD = os.environ.get("KLIMAT_TJANST_VARD", "127.0.0.1")
+PORT = int(os.environ.get("KLIMAT_TJANST_PORT", "8765"))
+BATCH_STORLEK = 512
+BATCH_FONSTER = 0.002
+SVARSCACHE_MB = 64
+MAX_KROPP = 16 * 1024 * 1024
+MAX_BATCH = 100000
+# Längsta tidsperiod per scenario, samma som reglagen; en mikrobatch räknas till
+# den längsta horisonten bland sina scenarier
+MAX_AR = REGLAGEINTERVALL["max_years"][1]
+
+KOLBALANSPARAMETRAR = {
+    "rotations_period": 80,
+    "produkt_livslangd": 50,
+    "kolinlagring_per_ar": 1.5,
+    "andel_kol_i_virke": 0.5,
+    "tidsperiod": 150,
+}
+STATUSTEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+              413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class Felaktig(ValueError):
+    """Fel i förfrågan; besvaras med 400."""
+
+
+def _json(varde):
+    """JSON-bytes där NumPy-värden blir listor och tal och NaN och ±inf blir null."""
+    def rensa(v):
+        if isinstance(v, np.ndarray):
+            v = v.tolist()
+        if isinstance(v, (np.integer, np.floating, np.bool_)):
+            v = v.item()
+        if isinstance(v, float):
+            return v if math.isfinite(v) else None
+        if isinstance(v, dict):
+            return {k: rensa(x) for k, x in v.items()}
+        if isinstance(v, (list, tuple)):
+            return [rensa(x) for x in v]
+        return v
+    return json.dumps(rensa(varde), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _kontrollera_klimatbalans(p):
+    okanda = set(p["virkes_hantering"]) - set(VIRKES_HANTERINGAR)
+    if okanda:
+        raise Felaktig(f"Okänd virkes_hantering: {', '.join(sorted(okanda))}")
+    for namn in ("rotation", "hus_livslangd"):
+        if np.any(p[namn] < 1):
+            raise Felaktig(f"{namn} måste vara minst 1")
+    # Noll eller mindre ger oändlig skogsareal eller klimatneutralitet
+    for namn in ("BTA", "virke_per_m2", "bonitet", "klimatpåverkan_per_m2"):
+        if not np.all(np.isfinite(p[namn]) & (p[namn] > 0)):
+            raise Felaktig(f"{namn} måste vara ett positivt tal")
+    for namn in ("max_years", "LCA_period"):
+        if np.any(p[namn] < 0):
+            raise Felaktig(f"{namn} får inte vara negativ")
+        if np.any(p[namn] > MAX_AR):
+            raise Felaktig(f"{namn} får vara högst {MAX_AR}")
+
+
+def klimatbalans_poster(poster):
+    """Nyckeltalen för en lista scenarier (dicts); ett svar per scenario."""
+    if not all(isinstance(post, dict) for post in poster):
+        raise Felaktig("Varje scenario ska vara ett JSON-objekt")
+    med_serier = [bool(post.get("serier")) for post in poster]
+    try:
+        p = tolka_poster([{k: v for k, v in post.items() if k != "serier"} for post in poster])
+    except (TypeError, ValueError) as fel:
+        raise Felaktig(f"Ogiltigt parametervärde: {fel}") from None
+    _kontrollera_klimatbalans(p)
+    kolumner = berakna_scenarier(p, med_serier=any(med_serier))
+    svar = []
+    for i, post in enumerate(poster):
+        rad = {"id": post["id"]} if "id" in post else {}
+        rad.update({
+            "skogsareal_ha": kolumner["skogsareal_ha"][i],
+            "klimatbalans_maxandel": kolumner["klimatbalans_maxandel"][i],
+            "klimatneutralitet_vid_LCA": kolumner["klimatneutralitet_vid_LCA"][i],
+            "ar_till_100_procent": kolumner["ar_till_100_procent"][i],
+        })
+        if med_serier[i]:
+            rad["klimatneutralitet"] = kolumner["klimatneutralitet"][i]
+        svar.append(rad)
+    return svar
+
+
+def _produktkategorier(namn, varden):
+    # andelar och halveringstider: ett objekt med kända kategorier och ändliga tal
+    if not isinstance(varden, dict):
+        raise Felaktig(f"{namn} ska vara ett objekt med produktkategorier")
+    okanda = set(varden) - set(HALVERINGSTIDER)
+    if okanda:
+        raise Felaktig(f"Okända produktkategorier i {namn}: {', '.join(sorted(okanda))}")
+    if not all(
+        isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v)
+        for v in varden.values()
+    ):
+        raise Felaktig(f"{namn} ska vara tal")
+    return varden
+
+
+def kolbalans_poster(poster):
+    """produktpool.kolbalans (eller kolbalans_nedbrytning) per scenario."""
+    svar = []
+    for post in poster:
+        if not isinstance(post, dict):
+            raise Felaktig("Varje scenario ska vara ett JSON-objekt")
+        okanda = set(post) - set(KOLBALANSPARAMETRAR) - {"id", "andelar", "halveringstider"}
+        if okanda:
+            raise Felaktig(f"Okända parametrar: {', '.join(sorted(okanda))}")
+        try:
+            p = {n: float(post.get(n, standard)) for n, standard in KOLBALANSPARAMETRAR.items()}
+            for namn in ("rotations_period", "produkt_livslangd", "tidsperiod"):
+                p[namn] = int(p[namn])
+        except (TypeError, ValueError, OverflowError) as fel:
+            raise Felaktig(f"Ogiltigt parametervärde: {fel}") from None
+        for namn in ("kolinlagring_per_ar", "andel_kol_i_virke"):
+            if not math.isfinite(p[namn]):
+                raise Felaktig(f"{namn} måste vara ett ändligt tal")
+        for namn in ("rotations_period", "produkt_livslangd"):
+            if p[namn] < 1:
+                raise Felaktig(f"{namn} måste vara minst 1")
+        if p["tidsperiod"] < 0:
+            raise Felaktig("tidsperiod får inte vara negativ")
+        if p["tidsperiod"] > MAX_AR:
+            raise Felaktig(f"tidsperiod får vara högst {MAX_AR}")
+        rad = {"id": post["id"]} if "id" in post else {}
+        if "andelar" in post:
+            andelar = _produktkategorier("andelar", post["andelar"])
+            halveringstider = _produktkategorier("halveringstider", post.get("halveringstider") or {})
+            if not andelar:
+                raise Felaktig("andelar måste ha minst en produktkategori")
+            if any(v < 0 for v in andelar.values()):
+                raise Felaktig("andelar får inte vara negativa")
+            if any(v <= 0 for v in halveringstider.values()):
+                raise Felaktig("halveringstider måste vara positiva")
+            ar, skog, pooler, netto = kolbalans_nedbrytning(
+                p["rotations_period"], p["kolinlagring_per_ar"], p["andel_kol_i_virke"],
+                p["tidsperiod"], andelar, halveringstider,
+            )
+            rad.update(ar=ar, kol_i_skog=skog, pooler=pooler, netto_kolbalans=netto)
+        else:
+            ar, skog, produkt, netto = kolbalans(*p.values())
+            rad.update(ar=ar, kol_i_skog=skog, kol_i_produkt=produkt, netto_kolbalans=netto)
+        svar.append(rad)
+    return svar
+
+
+def _berakna_var_for_sig(funktion, poster):
+    # Körs i arbetspoolen. Ett fel i ett scenario får inte fälla resten av
+    # mikrobatchen, så vid fel räknas scenarierna om ett och ett.
+    try:
+        return [(200, _json(svar)) for svar in funktion(poster)]
+    except Exception:
+        resultat = []
+        for post in poster:
+            try:
+                resultat.append((200, _json(funktion([post])[0])))
+            except Felaktig as fel:
+                resultat.append((400, _json({"fel": str(fel)})))
+            except Exception as fel:
+                resultat.append((500, _json({"fel": f"{type(fel).__name__}: {fel}"})))
+        return resultat
+
+
+def _berakna_batch(funktion, poster):
+    try:
+        return 200, _json(funktion(poster))
+    except Felaktig as fel:
+        return 400, _json({"fel": str(fel)})
+
+
+class Mikrobatchare:
+    """Samlar samtidiga enskilda förfrågningar och beräknar dem i ett anrop."""
+
+    def __init__(self, funktion, pool, storlek=BATCH_STORLEK, fonster=BATCH_FONSTER):
+        self.funktion = funktion
+        self.pool = pool
+        self.storlek = storlek
+        self.fonster = fonster
+        self._vantande = []
+        self._timer = None
+        self.batcher = 0
+        self.scenarier = 0
+
+    async def berakna(self, post):
+        loop = asyncio.get_running_loop()
+        framtid = loop.create_future()
+        self._vantande.append((post, framtid))
+        if len(self._vantande) >= self.storlek:
+            self._tom()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.fonster, self._tom)
+        return await framtid
+
+    def _tom(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        vantande, self._vantande = self._vantande, []
+        if vantande:
+            self.batcher += 1
+            self.scenarier += len(vantande)
+            asyncio.ensure_future(self._kor(vantande))
+
+    async def _kor(self, vantande):
+        poster = [post for post, _ in vantande]
+        try:
+            resultat = await asyncio.get_running_loop().run_in_executor(
+                self.pool, _berakna_var_for_sig, self.funktion, poster
+            )
+        except Exception as fel:
+            resultat = [(500, _json({"fel": f"{type(fel).__name__}: {fel}"}))] * len(vantande)
+        for (_, framtid), svar in zip(vantande, resultat):
+            if not framtid.done():
+                framtid.set_result(svar)
+
+
+class Tjanst:
+    def __init__(self, arbetare=1, batch_storlek=BATCH_STORLEK, batch_fonster=BATCH_FONSTER,
+                 svarscache_mb=SVARSCACHE_MB):
+        # Med en arbetare räcker en tråd; NumPy släpper GIL:en i de tunga delarna
+        self.pool = (ProcessPoolExecutor(max_workers=arbetare) if arbetare > 1
+                     else ThreadPoolExecutor(max_workers=1))
+        self.svarscache = LRUCache(max_bytes=int(svarscache_mb * 1024 * 1024))
+        self.batchare = {
+            "/klimatbalans": Mikrobatchare(klimatbalans_poster, self.pool, batch_storlek, batch_fonster),
+            "/kolbalans": Mikrobatchare(kolbalans_poster, self.pool, batch_storlek, batch_fonster),
+        }
+        self.batchfunktioner = {
+            "/klimatbalans/batch": klimatbalans_poster,
+            "/kolbalans/batch": kolbalans_poster,
+        }
+        self.forfragningar = 0
+        self.start = time.time()
+
+    def statistik(self):
+        return {
+            "förfrågningar": self.forfragningar,
+            "drifttid_s": round(time.time() - self.start, 3),
+            "mikrobatcher": {
+                sokvag: {
+                    "batcher": b.batcher,
+                    "scenarier": b.scenarier,
+                    "medelstorlek": b.scenarier / b.batcher if b.batcher else 0.0,
+                }
+                for sokvag, b in self.batchare.items()
+            },
+            "svarscache": self.svarscache.statistik(),
+        }
+
+    async def hantera(self, metod, sokvag, kropp):
+        """Returnerar (status, JSON-bytes) för en förfrågan."""
+        self.forfragningar += 1
+        sokvag = sokvag.split("?")[0].rstrip("/") or "/"
+        if sokvag == "/halsa":
+            return 200, b'{"status":"ok"}'
+        if sokvag == "/statistik":
+            return 200, _json(self.statistik())
+        if sokvag not in self.batchare and sokvag not in self.batchfunktioner:
+            return 404, _json({"fel": f"Okänd sökväg: {sokvag}"})
+        if metod != "POST":
+            return 405, _json({"fel": "Använd POST"})
+
+        nyckel = (sokvag, kropp)
+        cachat = self.svarscache.hamta_om_finns(nyckel)
+        if cachat is not None:
+            return cachat
+        try:
+            data = json.loads(kropp or b"{}")
+        except ValueError as fel:
+            return 400, _json({"fel": f"Ogiltig JSON: {fel}"})
+
+        if sokvag in self.batchare:
+            if not isinstance(data, dict):
+                return 400, _json({"fel": "Scenariot ska vara ett JSON-objekt"})
+            status, svar = await self.batchare[sokvag].berakna(data)
+        else:
+            poster = data.get("scenarier") if isinstance(data, dict) else data
+            if not isinstance(poster, list) or not poster:
+                return 400, _json({"fel": "Ange en icke-tom lista i \"scenarier\""})
+            if len(poster) > MAX_BATCH:
+                return 400, _json({"fel": f"Högst {MAX_BATCH} scenarier per förfrågan"})
+            status, svar = await asyncio.get_running_loop().run_in_executor(
+                self.pool, _berakna_batch, self.batchfunktioner[sokvag], poster
+            )
+        if status == 200:
+            self.svarscache.spara(nyckel, (status, svar))
+        return status, svar
+
+    async def anslutning(self, lasare, skrivare):
+        """HTTP/1.1 med keep-alive: läser förfrågningar tills klienten stänger."""
+        try:
+            while True:
+                try:
+                    huvud = await lasare.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                rader = huvud.decode("latin-1").split("\r\n")
+                try:
+                    metod, sokvag, version = rader[0].split(" ", 2)
+                except ValueError:
+                    await self._svara(skrivare, 400, _json({"fel": "Ogiltig förfrågan"}), False)
+                    return
+                rubriker = {}
+                for rad in rader[1:]:
+                    namn, _, varde = rad.partition(":")
+                    if namn:
+                        rubriker[namn.strip().lower()] = varde.strip()
+                langd = rubriker.get("content-length", "0") or "0"
+                if not (langd.isascii() and langd.isdigit()):
+                    await self._svara(skrivare, 400, _json({"fel": "Ogiltig Content-Length"}), False)
+                    return
+                langd = int(langd)
+                if langd > MAX_KROPP:
+                    await self._svara(skrivare, 413, _json({"fel": "För stor kropp"}), False)
+                    return
+                kropp = await lasare.readexactly(langd) if langd else b""
+                anslutning = rubriker.get("connection", "").lower()
+                behall = anslutning != "close" and (version != "HTTP/1.0" or anslutning == "keep-alive")
+                try:
+                    status, svar = await self.hantera(metod, sokvag, kropp)
+                except Exception as fel:
+                    status, svar = 500, _json({"fel": f"{type(fel).__name__}: {fel}"})
+                await self._svara(skrivare, status, svar, behall)
+                if not behall:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            skrivare.close()
+
+    @staticmethod
+    async def _svara(skrivare, status, kropp, behall):
+        skrivare.write(
+            f"HTTP/1.1 {status} {STATUSTEXT.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(kropp)}\r\n"
+            f"Connection: {'keep-alive' if behall else 'close'}\r\n\r\n".encode("latin-1") + kropp
+        )
+        await skrivare.drain()
+
+    async def kor(self, vard=VARD, port=PORT, klar=None):
+        server = await asyncio.start_server(self.anslutning, vard, port, limit=MAX_KROPP)
+        if klar is not None:
+            klar(server)
+        async with server:
+            await server.serve_forever()
+
+    def stang(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vard", default=VARD)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--arbetare", type=int, default=1,
+                        help="antal arbetsprocesser för beräkningarna (1 = en tråd)")
+    parser.add_argument("--batch-storlek", type=int, default=BATCH_STORLEK)
+    parser.add_argument("--batch-fonster-ms", type=float, default=1000 * BATCH_FONSTER)
+    parser.add_argument("--svarscache-mb", type=float, default=SVARSCACHE_MB)
+    args = parser.parse_args(argv)
+
+    tjanst = Tjanst(args.arbetare, args.batch_storlek, args.batch_fonster_ms / 1000,
+                    args.svarscache_mb)
+
+    def klar(server):
+        vard, port = server.sockets[0].getsockname()[:2]
+        print(f"Lyssnar på http://{vard}:{port}", flush=True)
+
+    try:
+        asyncio.run(tjanst.kor(args.vard, args.port, klar))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tjanst.stang()
+
+
+if __name__ == "__main__":
+    main()